@@ -1,132 +1,284 @@
-from flask import Flask, request, abort, jsonify, Response
+from flask import Flask, request, abort, jsonify, Response, g
 from flask_cors import CORS, cross_origin
-from threading import Lock
 import datetime
-from collections import defaultdict, Counter
+import atexit
 import os
 import requests as pyrequests
 from werkzeug.middleware.proxy_fix import ProxyFix  # <-- Add this import
+from counter_store import BlockCounter
+from geoip import GeoIPIndex, is_local
+from bounded_store import LRUTTLCache, pack_ip
+from country_tally import CountryTally, load_counts
+from log_writer import LogWriter
+from shared_state import SharedStateDB, SharedBlockCounter, SharedCountryTally, SharedRateStore
+from rate_limiter import TokenBucketLimiter, SlidingWindowLimiter, rate_limit_headers
+from stage_timer import StageTimer
+import ipaddress
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)  # <-- Add this line
-CORS(app, origins=["https://uuixd.machandler.com"])  # Restrict CORS to your frontend domain
+CORS(
+    app,
+    origins=["https://uuixd.machandler.com"],  # Restrict CORS to your frontend domain
+    expose_headers=['Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining', 'X-RateLimit-Reset'],
+)
 
 COUNTER_FILE = 'recent_uuid.log'
 COUNTRY_FILE = 'country_counts.log'
+# Country increments are flushed to COUNTRY_FILE's delta log this often (seconds)
+COUNTRY_FLUSH_INTERVAL = float(os.environ.get('UUIXD_COUNTRY_FLUSH_INTERVAL', 1.0))
+# Ids are leased in blocks; the counter file is only rewritten once per block
+COUNTER_BLOCK_SIZE = int(os.environ.get('UUIXD_COUNTER_BLOCK_SIZE', 1000))
+COUNTER_DURABILITY = os.environ.get('UUIXD_COUNTER_DURABILITY', 'rename')  # 'rename' or 'append'
+# 'local' keeps state in this process; 'sqlite' shares it between worker processes
+# (e.g. gunicorn -w N, without --preload so each worker starts its own threads)
+STATE_BACKEND = os.environ.get('UUIXD_STATE_BACKEND', 'local')
+STATE_DB_FILE = os.environ.get('UUIXD_STATE_DB', 'uuixd_state.db')
+# Set UUIXD_PROFILE=1 to collect per-stage handler timings (reported by /stats)
+PROFILE = os.environ.get('UUIXD_PROFILE') == '1'
+# Local IP range -> country dataset (start_ip,end_ip,country or cidr,country rows),
+# built by build_geoip.py (see setup.sh)
+GEOIP_FILE = os.environ.get('UUIXD_GEOIP_FILE', 'geoip.csv')
+# Opt-in remote lookup for when there is no dataset, e.g. https://ipapi.co/{ip}/country_name/.
+# It puts an HTTP call on the request path for every uncached IP.
+GEOIP_REMOTE_URL = os.environ.get('UUIXD_GEOIP_REMOTE_URL', '')
 
-def load_counter():
-    if os.path.exists(COUNTER_FILE):
-        try:
-            with open(COUNTER_FILE, 'r') as f:
-                return int(f.read().strip())
-        except Exception:
-            return 0
-    return 0
+def load_geoip_index():
+    if os.path.exists(GEOIP_FILE):
+        return GeoIPIndex.from_csv(GEOIP_FILE)
+    if not GEOIP_REMOTE_URL:
+        raise RuntimeError(
+            f"GeoIP dataset {GEOIP_FILE} not found. Build it with build_geoip.py (see setup.sh), "
+            "or set UUIXD_GEOIP_REMOTE_URL to look countries up remotely instead.")
+    return None
 
-def save_counter(value):
-    try:
-        with open(COUNTER_FILE, 'w') as f:
-            f.write(str(value))
-    except Exception:
-        pass
+# Offline geo index; None only when the remote lookup was explicitly configured
+geoip_index = load_geoip_index()
 
-def load_country_counts():
-    if os.path.exists(COUNTRY_FILE):
-        try:
-            with open(COUNTRY_FILE, 'r') as f:
-                lines = f.readlines()
-                return Counter({line.split(',')[0]: int(line.split(',')[1]) for line in lines if ',' in line})
-        except Exception:
-            return Counter()
-    return Counter()
-
-def save_country_counts(counter):
+# IP to country cache; 'Unknown' results expire quickly so they get retried
+GEO_CACHE_SIZE = int(os.environ.get('UUIXD_GEO_CACHE_SIZE', 50000))
+GEO_CACHE_TTL = int(os.environ.get('UUIXD_GEO_CACHE_TTL', 86400))
+GEO_NEGATIVE_TTL = int(os.environ.get('UUIXD_GEO_NEGATIVE_TTL', 300))
+ip_country_cache = LRUTTLCache(
+    maxsize=GEO_CACHE_SIZE,
+    ttl=GEO_CACHE_TTL,
+    negative_ttl=GEO_NEGATIVE_TTL,
+    is_negative=lambda country: country == 'Unknown',
+)
+
+def lookup_country_remote(ip):
     try:
-        with open(COUNTRY_FILE, 'w') as f:
-            for country, count in counter.items():
-                f.write(f"{country},{count}\n")
+        resp = pyrequests.get(GEOIP_REMOTE_URL.format(ip=ip), timeout=2)
+        if resp.status_code == 200:
+            return resp.text.strip() or 'Unknown'
     except Exception:
         pass
-
-# IP to country cache
-ip_country_cache = {}
+    return 'Unknown'
 
 def get_country(ip):
     # Check cache first
-    if ip in ip_country_cache:
-        return ip_country_cache[ip]
-    if ip == '127.0.0.1' or ip.startswith('192.168.') or ip.startswith('10.') or ip.startswith('172.'):
-        ip_country_cache[ip] = 'Local'
-        return 'Local'
+    cached = ip_country_cache.get(ip)
+    if cached is not None:
+        return cached
     try:
-        resp = pyrequests.get(f'https://ipapi.co/{ip}/country_name/', timeout=2)
-        if resp.status_code == 200:
-            country = resp.text.strip() or 'Unknown'
-            ip_country_cache[ip] = country
-            return country
-    except Exception:
-        pass
-    ip_country_cache[ip] = 'Unknown'
-    return 'Unknown'
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        ip_country_cache.set(ip, 'Unknown')
+        return 'Unknown'
+    if is_local(addr):
+        country = 'Local'
+    elif geoip_index is not None:
+        country = geoip_index.lookup(addr) or 'Unknown'
+    else:
+        country = lookup_country_remote(ip)
+    ip_country_cache.set(ip, country)
+    return country
+
+RATE_LIMIT = 10000
 
-uuid_int = load_counter()
-uuid_lock = Lock()
+if STATE_BACKEND == 'sqlite':
+    state_db = SharedStateDB(STATE_DB_FILE)
+    # Existing single-process state seeds the database the first time it is created,
+    # and the counter file keeps tracking the shared high-water mark
+    local_counter = BlockCounter(COUNTER_FILE, durability=COUNTER_DURABILITY)
+    uuid_counter = SharedBlockCounter(
+        state_db, block_size=COUNTER_BLOCK_SIZE, initial=local_counter.next_value, mirror=local_counter)
+    country_counts = SharedCountryTally(state_db, initial=load_counts(COUNTRY_FILE)[1])
+    # Daily quota shared across workers, on top of the per-process limiters below
+    ip_requests = SharedRateStore(state_db, RATE_LIMIT)
+    ip_requests.start_sweeper()
+elif STATE_BACKEND == 'local':
+    uuid_counter = BlockCounter(COUNTER_FILE, block_size=COUNTER_BLOCK_SIZE, durability=COUNTER_DURABILITY)
+    country_counts = CountryTally(COUNTRY_FILE)
+    ip_requests = None
+else:
+    raise ValueError(f"Unknown UUIXD_STATE_BACKEND: {STATE_BACKEND}")
 
-country_counts = load_country_counts()
-country_lock = Lock()
+uuid_lock = uuid_counter.lock
+country_counts.start_flusher(COUNTRY_FLUSH_INTERVAL)
+atexit.register(country_counts.close)
 
 LOG_FILE = 'requests.log'
-
-# Track requests per IP per day
-ip_requests = defaultdict(lambda: {'date': datetime.date.today(), 'count': 0})
-RATE_LIMIT = 10000
+# Request log lines are written by a background thread in batches
+LOG_QUEUE_SIZE = int(os.environ.get('UUIXD_LOG_QUEUE_SIZE', 100000))
+LOG_QUEUE_POLICY = os.environ.get('UUIXD_LOG_QUEUE_POLICY', 'drop')  # 'drop' or 'block'
+LOG_ROTATE_BYTES = int(os.environ.get('UUIXD_LOG_ROTATE_BYTES', 100 * 1024 * 1024))
+LOG_ROTATE_SECONDS = int(os.environ.get('UUIXD_LOG_ROTATE_SECONDS', 0)) or None
+request_log = LogWriter(
+    LOG_FILE,
+    max_queue=LOG_QUEUE_SIZE,
+    policy=LOG_QUEUE_POLICY,
+    rotate_bytes=LOG_ROTATE_BYTES,
+    rotate_interval=LOG_ROTATE_SECONDS,
+)
+atexit.register(request_log.close)
 
 def log_request(req):
-    with open(LOG_FILE, 'a') as f:
-        f.write(f"{datetime.datetime.now().isoformat()} {req.remote_addr} {req.method} {req.path}\n")
-
-def check_rate_limit(ip):
-    today = datetime.date.today()
-    record = ip_requests[ip]
-    # Ensure 'date' is a date and 'count' is an int
-    if not isinstance(record.get('date'), datetime.date) or record['date'] != today:
-        record['date'] = today
-        record['count'] = 0
-    if not isinstance(record['count'], int):
-        record['count'] = 0
-    record['count'] += 1
-    if record['count'] > RATE_LIMIT:
-        return False
-    return True
+    request_log.write(f"{datetime.datetime.now().isoformat()} {req.remote_addr} {req.method} {req.path}\n")
+
+def check_rate_limit(ip, cost=1):
+    # Per-process limits are enforced in before_request; this is the cross-worker daily quota
+    return ip_requests is None or ip_requests.hit(ip, cost)
+
+# Largest number of ids a single /uuixd?count=N request can reserve
+MAX_BATCH = 1000
+LOW_MASK = (1 << 48) - 1
+
+def uuid_prefix(high):
+    # First four groups of the uuid, i.e. everything above the low 48 bits
+    h = '%020x' % high
+    return f'{h[0:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-'
+
+def format_uuid(value):
+    return uuid_prefix(value >> 48) + '%012x' % (value & LOW_MASK)
+
+def format_uuid_range(start, count):
+    """Yield uuid strings for [start, start + count), reformatting the prefix only when it changes"""
+    high = start >> 48
+    prefix = uuid_prefix(high)
+    for value in range(start, start + count):
+        if value >> 48 != high:
+            high = value >> 48
+            prefix = uuid_prefix(high)
+        yield prefix + '%012x' % (value & LOW_MASK)
+
+def get_client_ip(req):
+    xff = req.headers.get('X-Forwarded-For')
+    if xff:
+        return xff.split(',')[0].strip()
+    return req.remote_addr
+
+# /uuixd: bursts of up to RATE_LIMIT_BURST ids, refilled at RATE_LIMIT ids per day
+RATE_LIMIT_MODE = os.environ.get('UUIXD_RATE_LIMIT_MODE', 'token_bucket')  # or 'sliding_window'
+RATE_LIMIT_BURST = int(os.environ.get('UUIXD_RATE_LIMIT_BURST', MAX_BATCH))
+LEADERBOARD_RATE_LIMIT = int(os.environ.get('UUIXD_LEADERBOARD_RATE_LIMIT', 120))  # per minute
+
+if RATE_LIMIT_MODE == 'token_bucket':
+    uuid_limiter = TokenBucketLimiter(RATE_LIMIT_BURST, RATE_LIMIT / 86400)
+elif RATE_LIMIT_MODE == 'sliding_window':
+    uuid_limiter = SlidingWindowLimiter(RATE_LIMIT, 86400)
+else:
+    raise ValueError(f"Unknown UUIXD_RATE_LIMIT_MODE: {RATE_LIMIT_MODE}")
+
+# Keyed by Flask endpoint name
+route_limiters = {
+    'increment_uuid': uuid_limiter,
+    'leaderboard': SlidingWindowLimiter(LEADERBOARD_RATE_LIMIT, 60),
+    'stats': SlidingWindowLimiter(LEADERBOARD_RATE_LIMIT, 60),
+}
+for limiter in route_limiters.values():
+    limiter.start_sweeper()
+
+def requested_count():
+    """Return (count, batch) for /uuixd; aborts with 400 if count is out of range"""
+    count = request.args.get('count', type=int)
+    if count is None:
+        return 1, False
+    if count < 1 or count > MAX_BATCH:
+        abort(400, description=f"count must be between 1 and {MAX_BATCH}.")
+    return count, True
+
+def request_cost():
+    if request.endpoint == 'increment_uuid':
+        # Validated before anything is charged, so a bad count costs nothing
+        return requested_count()[0]
+    return 1
+
+stage_timer = StageTimer(enabled=PROFILE)
+
+@app.before_request
+def enforce_rate_limit():
+    # Runs before logging, geo lookup and any disk writes
+    g.trace = stage_timer.start()
+    limiter = route_limiters.get(request.endpoint)
+    if limiter is None:
+        return None
+    decision = limiter.check(pack_ip(get_client_ip(request)), request_cost())
+    g.rate_limit = decision
+    g.trace.mark('rate_limit')
+    if not decision.allowed:
+        return Response("Rate limit exceeded. Please wait and try again.", status=429, mimetype='text/plain')
+    return None
+
+@app.after_request
+def add_rate_limit_headers(response):
+    decision = g.get('rate_limit')
+    if decision is not None:
+        response.headers.update(rate_limit_headers(decision))
+    trace = g.get('trace')
+    if trace is not None:
+        trace.mark('respond')
+        trace.finish()
+    return response
 
 @app.route('/uuixd', methods=['GET'])
 def increment_uuid():
-    global uuid_int
-    xff = request.headers.get('X-Forwarded-For')
-    if xff:
-        ip = xff.split(',')[0].strip()
-    else:
-        ip = request.remote_addr
-    if not check_rate_limit(ip):
+    count, batch = requested_count()
+    trace = g.trace
+    ip = get_client_ip(request)
+    # The whole batch is charged against the daily quota in one check
+    if not check_rate_limit(ip, count):
         abort(429, description=f"Rate limit exceeded: {RATE_LIMIT} requests per IP per day.")
+    trace.mark('quota')
     log_request(request)
+    trace.mark('log')
     country = get_country(ip)
-    with country_lock:
-        country_counts[country] += 1
-        save_country_counts(country_counts)
-    with uuid_lock:
-        value = uuid_int
-        uuid_int += 1
-        save_counter(uuid_int)
-    hex_str = f'{value:032x}'
-    uuid_str = f'{hex_str[0:8]}-{hex_str[8:12]}-{hex_str[12:16]}-{hex_str[16:20]}-{hex_str[20:32]}'
-    return jsonify({"uuid": uuid_str})
+    trace.mark('geo')
+    country_counts.add(country, count)
+    trace.mark('tally')
+    # One lock acquisition reserves the whole contiguous range
+    start = uuid_counter.take(count)
+    trace.mark('counter')
+    if not batch:
+        uuid_str = format_uuid(start)
+        trace.mark('format')
+        return jsonify({"uuid": uuid_str})
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for uuid_str in format_uuid_range(start, count):
+                yield f'{{"uuid":"{uuid_str}"}}\n'
+        return Response(generate(), mimetype='application/x-ndjson')
+    uuids = list(format_uuid_range(start, count))
+    trace.mark('format')
+    return jsonify({"uuids": uuids})
 
 @app.route('/leaderboard', methods=['GET'])
 def leaderboard():
-    with country_lock:
-        top = country_counts.most_common(3)
-    return jsonify([{ 'country': c, 'count': n } for c, n in top])
+    # Served from pre-serialized bytes; never touches the tally lock
+    body, etag = country_counts.leaderboard
+    if etag in request.if_none_match:
+        return Response(status=304, headers={'ETag': f'"{etag}"'})
+    return Response(body, mimetype='application/json', headers={'ETag': f'"{etag}"'})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'geo_cache': ip_country_cache.stats(),
+        'rate_limits': {endpoint: limiter.stats() for endpoint, limiter in route_limiters.items()},
+        'shared_quota': ip_requests.stats() if ip_requests is not None else None,
+        'request_log': request_log.stats(),
+        'stages': stage_timer.stats() if stage_timer.enabled else None,
+    })
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002)
@@ -0,0 +1,195 @@
+"""Load benchmark for the uuixd backend.
+
+Serves app.py on a local threaded werkzeug server, with a local stand-in for
+ipapi.co, drives /uuixd and /leaderboard from concurrent client threads and
+writes throughput, latency percentiles and the per-stage breakdown from the
+handler's timing hooks to a JSON file.
+
+    python benchmark.py --concurrency 16 --duration 10 --output bench.json
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+COUNTRIES = ['United States', 'Germany', 'Japan', 'Brazil', 'India', 'France']
+
+
+def start_geo_stub(delay):
+    """Stand-in for ipapi.co's /<ip>/country_name/ endpoint."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            body = random.choice(COUNTRIES).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_app(geo_port):
+    # app.py reads its configuration at import time and writes state to the cwd
+    os.environ.update({
+        'UUIXD_PROFILE': '1',
+        'UUIXD_GEOIP_FILE': os.path.join(os.getcwd(), 'no-geoip.csv'),
+        'UUIXD_GEOIP_REMOTE_URL': f'http://127.0.0.1:{geo_port}/{{ip}}/country_name/',
+        'UUIXD_RATE_LIMIT_BURST': str(10 ** 9),
+        'UUIXD_LEADERBOARD_RATE_LIMIT': str(10 ** 9),
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import app as uuixd
+    from werkzeug.serving import make_server
+
+    # One access log line per request would be measured along with the app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, uuixd.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return uuixd, server
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        # Status codes are ints, failed connections are 'error'
+        'statuses': {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+            'max': round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+    }
+
+
+def run_load(port, args):
+    ips = [f'{random.randint(1, 223)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}'
+           for _ in range(args.distinct_ips)]
+    uuixd_path = '/uuixd' if args.count is None else f'/uuixd?count={args.count}'
+    results = {'uuixd': ([], {}), 'leaderboard': ([], {})}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker():
+        rng = random.Random()
+        local = {'uuixd': ([], {}), 'leaderboard': ([], {})}
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while time.perf_counter() < deadline:
+            name = 'leaderboard' if rng.random() < args.leaderboard_ratio else 'uuixd'
+            path = '/leaderboard' if name == 'leaderboard' else uuixd_path
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers={'X-Forwarded-For': rng.choice(ips)})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            except (OSError, http.client.HTTPException):
+                status = 'error'
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            latencies, statuses = local[name]
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+        conn.close()
+        with lock:
+            for name, (latencies, statuses) in local.items():
+                results[name][0].extend(latencies)
+                for status, n in statuses.items():
+                    results[name][1][status] = results[name][1].get(status, 0) + n
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    report = {name: summarize(latencies, statuses, elapsed) for name, (latencies, statuses) in results.items()}
+    total = sum(r['requests'] for r in report.values())
+    report['total'] = {'requests': total, 'throughput_rps': round(total / elapsed, 1), 'elapsed_s': round(elapsed, 3)}
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    parser.add_argument('--leaderboard-ratio', type=float, default=0.1,
+                        help='fraction of requests sent to /leaderboard')
+    parser.add_argument('--count', type=int, default=None, help='use /uuixd?count=N batches')
+    parser.add_argument('--distinct-ips', type=int, default=1000, help='size of the client IP pool')
+    parser.add_argument('--geo-delay-ms', type=float, default=0.0, help='latency of the ipapi.co stand-in')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    geo = start_geo_stub(args.geo_delay_ms / 1000)
+    with tempfile.TemporaryDirectory(prefix='uuixd-bench-') as workdir:
+        os.chdir(workdir)
+        uuixd, server = start_app(geo.server_address[1])
+        report = run_load(server.server_port, args)
+        stats = uuixd.app.test_client().get('/stats').get_json()
+        server.shutdown()
+        uuixd.request_log.close()
+        uuixd.country_counts.close()
+        os.chdir(BACKEND_DIR)
+    geo.shutdown()
+
+    result = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': git_revision(),
+        'config': vars(args),
+        'results': report,
+        'stages_us': stats.get('stages'),
+        'geo_cache': stats.get('geo_cache'),
+    }
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    for name in ('uuixd', 'leaderboard'):
+        r = report[name]
+        lat = r['latency_ms']
+        print(f"{name:12s} {r['requests']:8d} req  {r['throughput_rps']:9.1f} req/s  "
+              f"p50 {lat['p50']} ms  p95 {lat['p95']} ms  p99 {lat['p99']} ms")
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import ipaddress
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLCache:
+    """Size-bounded LRU cache whose entries expire after a TTL.
+
+    Values matching `is_negative` (e.g. 'Unknown') use the shorter
+    `negative_ttl`, so failed lookups are retried sooner.
+    """
+
+    def __init__(self, maxsize=50000, ttl=86400, negative_ttl=300, is_negative=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.is_negative = is_negative or (lambda value: False)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if self.is_negative(value) else self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            approx_bytes = sys.getsizeof(self._data) + sum(
+                sys.getsizeof(k) + sys.getsizeof(v[0]) for k, v in self._data.items())
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'approx_bytes': approx_bytes,
+            }
+
+
+def pack_ip(ip):
+    """Pack an address into one int; IPv4 is stored as its IPv4-mapped IPv6 value."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    if addr.version == 4:
+        return 0xFFFF00000000 | int(addr)
+    return int(addr)
@@ -0,0 +1,82 @@
+"""Build geoip.csv for app.py from MaxMind's GeoLite2 Country CSV database.
+
+Either pass the downloaded GeoLite2-Country-CSV zip, or a license key to
+download it:
+
+    python3 build_geoip.py --zip GeoLite2-Country-CSV_20240101.zip
+    MAXMIND_LICENSE_KEY=... python3 build_geoip.py
+
+Writes one `cidr,country` row per network, the format GeoIPIndex.from_csv reads.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import urllib.request
+import zipfile
+
+DOWNLOAD_URL = ('https://download.maxmind.com/app/geoip_download'
+                '?edition_id=GeoLite2-Country-CSV&license_key={key}&suffix=zip')
+
+
+def _member(archive, suffix):
+    for name in archive.namelist():
+        if name.endswith(suffix):
+            return name
+    raise ValueError(f"{suffix} not found in the archive")
+
+
+def _read_csv(archive, suffix):
+    with archive.open(_member(archive, suffix)) as f:
+        yield from csv.DictReader(io.TextIOWrapper(f, encoding='utf-8'))
+
+
+def convert(zip_path, output):
+    """Write cidr,country rows for every network in the GeoLite2 zip; returns the row count"""
+    with zipfile.ZipFile(zip_path) as archive:
+        countries = {row['geoname_id']: row['country_name']
+                     for row in _read_csv(archive, 'Country-Locations-en.csv') if row['country_name']}
+        rows = 0
+        tmp = output + '.tmp'
+        with open(tmp, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.writer(out)
+            writer.writerow(['network', 'country'])
+            for suffix in ('Country-Blocks-IPv4.csv', 'Country-Blocks-IPv6.csv'):
+                for row in _read_csv(archive, suffix):
+                    # Anycast/satellite networks carry only a registered country
+                    country = countries.get(row['geoname_id'] or row['registered_country_geoname_id'])
+                    if country:
+                        writer.writerow([row['network'], country])
+                        rows += 1
+        os.replace(tmp, output)
+    return rows
+
+
+def download(license_key, directory):
+    path = os.path.join(directory, 'GeoLite2-Country-CSV.zip')
+    urllib.request.urlretrieve(DOWNLOAD_URL.format(key=license_key), path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--zip', help='a GeoLite2-Country-CSV zip that is already downloaded')
+    parser.add_argument('--license-key', default=os.environ.get('MAXMIND_LICENSE_KEY'),
+                        help='MaxMind license key used to download the zip (default: $MAXMIND_LICENSE_KEY)')
+    parser.add_argument('--output', default=os.environ.get('UUIXD_GEOIP_FILE', 'geoip.csv'))
+    args = parser.parse_args()
+
+    if args.zip:
+        rows = convert(args.zip, args.output)
+    elif args.license_key:
+        with tempfile.TemporaryDirectory() as directory:
+            rows = convert(download(args.license_key, directory), args.output)
+    else:
+        sys.exit('Pass --zip or --license-key (or set MAXMIND_LICENSE_KEY)')
+    print(f"Wrote {rows} networks to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def uuixd(tmp_path, monkeypatch):
+    """A fresh import of app.py whose state files live in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    geoip = tmp_path / 'geoip.csv'
+    geoip.write_text('network,country\n8.8.8.0/24,United States\n')
+    monkeypatch.setenv('UUIXD_GEOIP_FILE', str(geoip))
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    module.app.config['TESTING'] = True
+    yield module
+    module.request_log.close()
+    module.country_counts.close()
+    sys.modules.pop('app', None)
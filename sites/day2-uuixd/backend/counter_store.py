@@ -0,0 +1,137 @@
+import fcntl
+import os
+from threading import Lock
+
+
+class CounterStoreError(Exception):
+    pass
+
+
+class BlockCounter:
+    """Monotonic id counter that persists a high-water mark once per block of ids.
+
+    The file only ever holds a limit that no issued id has reached, so after a
+    restart the counter resumes at that limit. Ids left over from the last
+    block are skipped, never reused.
+
+    durability='rename' rewrites the file through a temp file + os.replace.
+    durability='append' appends one line per lease and compacts now and then.
+    """
+
+    COMPACT_EVERY = 1000
+
+    def __init__(self, path, block_size=1000, durability='rename'):
+        if block_size < 1:
+            raise ValueError('block_size must be >= 1')
+        if durability not in ('rename', 'append'):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.path = path
+        self.block_size = block_size
+        self.durability = durability
+        self.lock = Lock()
+        self._appended = 0
+        self._next = self._load()
+        # Nothing is leased until the first id is taken
+        self._limit = self._next
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, 'r') as f:
+                data = f.read()
+        except OSError as e:
+            raise CounterStoreError(f"Could not read {self.path}: {e}") from e
+        marks = []
+        for line in data.splitlines():
+            line = line.strip()
+            if line.isdigit():
+                marks.append(int(line))
+        if not marks:
+            if data.strip():
+                # Refuse to restart from 0 and hand out ids a second time
+                raise CounterStoreError(f"No valid high-water mark in {self.path}")
+            return 0
+        return max(marks)
+
+    def _fsync_dir(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _write_atomic(self, value):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"{value}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._fsync_dir()
+        self._appended = 0
+
+    def _write_append(self, value):
+        if self._appended >= self.COMPACT_EVERY:
+            self._write_atomic(value)
+            return
+        with open(self.path, 'a') as f:
+            f.write(f"{value}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._appended += 1
+
+    def _persist(self, limit):
+        if self.durability == 'append':
+            self._write_append(limit)
+        else:
+            self._write_atomic(limit)
+        self._limit = limit
+
+    def _lease(self, needed):
+        # Round up to a whole block past what this call needs
+        limit = needed + self.block_size - 1
+        limit -= limit % self.block_size
+        self._persist(limit)
+
+    def take(self, count=1):
+        """Reserve `count` consecutive ids and return the first one."""
+        if count < 1:
+            raise ValueError('count must be >= 1')
+        with self.lock:
+            start = self._next
+            end = start + count
+            if end > self._limit:
+                # Persist before handing anything out so a crash can't reuse ids
+                self._lease(end)
+            self._next = end
+            return start
+
+    def advance(self, value):
+        """Skip every id below `value` (issued elsewhere) and persist it as the high-water mark.
+
+        Safe to call from several processes at once: the file is re-read under
+        an exclusive lock, so a late, smaller value never overwrites a larger one.
+        """
+        with self.lock, open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            value = max(value, self._load())
+            if value > self._limit:
+                self._persist(value)
+            self._next = max(self._next, value)
+
+    @property
+    def next_value(self):
+        with self.lock:
+            return self._next
+
+    @property
+    def persisted_limit(self):
+        with self.lock:
+            return self._limit
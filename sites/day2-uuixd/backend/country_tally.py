@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from log_writer import LogWriter
+
+logger = logging.getLogger(__name__)
+
+
+def delta_path(snapshot_path, generation):
+    return f"{snapshot_path}.delta.{generation}"
+
+
+def load_counts(snapshot_path):
+    """Read a tally's snapshot and current delta log; returns (generation, counts)."""
+    generation = 0
+    counts = Counter()
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'r') as f:
+            for lineno, line in enumerate(f, 1):
+                try:
+                    if line.startswith('#gen '):
+                        generation = int(line[5:])
+                    elif ',' in line:
+                        country, count = line.rsplit(',', 1)
+                        counts[country] = int(count)
+                except ValueError:
+                    logger.warning(f"Skipping malformed line {lineno} of {snapshot_path}: {line!r}")
+    delta = delta_path(snapshot_path, generation)
+    if os.path.exists(delta):
+        with open(delta, 'r') as f:
+            for lineno, line in enumerate(f, 1):
+                # A torn final line from a crash has no trailing newline
+                if not line.endswith('\n') or ',' not in line:
+                    continue
+                country, count = line.rsplit(',', 1)
+                try:
+                    counts[country] += int(count)
+                except ValueError:
+                    logger.warning(f"Skipping malformed line {lineno} of {delta}: {line!r}")
+    return generation, counts
+
+
+class CountryTally:
+    """Per-country counts persisted as a snapshot plus an append-only delta log.
+
+    Increments are buffered in memory and handed to a LogWriter for the delta
+    log by `flush()`; every `compact_every` flushes the counts are written out as a
+    new snapshot. The snapshot's first line carries a generation number and
+    only the delta log of that generation is replayed, so a crash between
+    writing a snapshot and removing the old delta log can't double count.
+
+    The top-N leaderboard is kept up to date on every add and stored as
+    pre-serialized JSON bytes with an ETag, so readers never take the lock.
+    """
+
+    def __init__(self, snapshot_path, top_n=3, compact_every=60):
+        self.snapshot_path = snapshot_path
+        self.top_n = top_n
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pending = Counter()
+        self._flushes = 0
+        self._flusher = None
+        self._stop = threading.Event()
+        self._closed = False
+        self.generation, self.counts = self._load()
+        self._delta = LogWriter(self._delta_path(self.generation), policy='block', fsync=True)
+        self._top = self.counts.most_common(top_n)
+        self._publish()
+
+    def _delta_path(self, generation):
+        return delta_path(self.snapshot_path, generation)
+
+    def _load(self):
+        return load_counts(self.snapshot_path)
+
+    def _publish(self):
+        body = json.dumps([{'country': c, 'count': n} for c, n in self._top]).encode('utf-8')
+        etag = hashlib.md5(body).hexdigest()
+        # One tuple swap so readers always see a matching body and etag
+        self.leaderboard = (body, etag)
+
+    def add(self, country, amount=1):
+        with self.lock:
+            self.counts[country] += amount
+            self._pending[country] += amount
+            count = self.counts[country]
+            top = self._top
+            if (len(top) < self.top_n or count > top[-1][1]
+                    or any(c == country for c, _ in top)):
+                # Counts only grow, so only the incremented country can move into the top
+                candidates = {c: self.counts[c] for c, _ in top}
+                candidates[country] = count
+                self._top = sorted(candidates.items(), key=lambda item: -item[1])[:self.top_n]
+                if self._top != top:
+                    self._publish()
+        if self._closed:
+            self.flush()
+
+    def most_common(self, n=None):
+        with self.lock:
+            return self.counts.most_common(n)
+
+    def flush(self):
+        """Append buffered increments to the delta log, compacting periodically."""
+        with self._io_lock:
+            self._flushes += 1
+            if self._flushes >= self.compact_every and not self._closed:
+                self._compact()
+                return
+            with self.lock:
+                pending, self._pending = self._pending, Counter()
+            if pending:
+                self._write_delta(''.join(f"{country},{count}\n" for country, count in pending.items()))
+
+    def _write_delta(self, text):
+        if not self._closed:
+            self._delta.write(text)
+            return
+        # Increments that arrive after close() (e.g. a request finishing during
+        # shutdown) are appended directly instead of going to the stopped writer
+        with open(self._delta_path(self.generation), 'a') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        """Stop the flusher, write out everything buffered and close the delta log."""
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        with self._io_lock:
+            if self._closed:
+                return
+            # The final flush only appends; compacting here would just slow shutdown
+            with self.lock:
+                pending, self._pending = self._pending, Counter()
+            if pending:
+                self._delta.write(''.join(f"{country},{count}\n" for country, count in pending.items()))
+            self._delta.close()
+            self._closed = True
+
+    def _compact(self):
+        self._flushes = 0
+        # Queued deltas must land in the old log, which the new snapshot supersedes
+        self._delta.flush()
+        with self.lock:
+            counts = Counter(self.counts)
+            self._pending = Counter()
+        old_delta = self._delta_path(self.generation)
+        generation = self.generation + 1
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"#gen {generation}\n")
+            for country, count in counts.items():
+                f.write(f"{country},{count}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self.generation = generation
+        self._delta.reopen(self._delta_path(generation))
+        if os.path.exists(old_delta):
+            os.remove(old_delta)
+
+    def start_flusher(self, interval=1.0):
+        if self._flusher is not None or self._closed:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        self._flusher = threading.Thread(target=run, name='country-tally-flusher', daemon=True)
+        self._flusher.start()
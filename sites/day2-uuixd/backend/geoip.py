@@ -0,0 +1,92 @@
+import csv
+import ipaddress
+from array import array
+from bisect import bisect_right
+
+
+class GeoIPIndex:
+    """Offline IP -> country lookup over sorted, non-overlapping ranges.
+
+    Rows in the CSV are either `start_ip,end_ip,country` or `cidr,country`;
+    blank lines and lines starting with '#' are skipped. IPv4 ranges live in
+    compact unsigned int arrays, IPv6 ranges in sorted int lists, and lookups
+    are a single binary search.
+    """
+
+    def __init__(self):
+        self.countries = []
+        self._v4_starts = array('I')
+        self._v4_ends = array('I')
+        self._v4_country = array('H')
+        self._v6_starts = []
+        self._v6_ends = []
+        self._v6_country = array('H')
+
+    def __len__(self):
+        return len(self._v4_starts) + len(self._v6_starts)
+
+    @classmethod
+    def from_csv(cls, path):
+        index = cls()
+        country_ids = {}
+        v4, v6 = [], []
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#'):
+                    continue
+                try:
+                    if len(row) == 2:
+                        net = ipaddress.ip_network(row[0].strip(), strict=False)
+                        start, end = net[0], net[-1]
+                        country = row[1].strip()
+                    else:
+                        start = ipaddress.ip_address(row[0].strip())
+                        end = ipaddress.ip_address(row[1].strip())
+                        country = row[2].strip()
+                except ValueError:
+                    # Header rows and malformed lines
+                    continue
+                if start.version != end.version or int(end) < int(start) or not country:
+                    continue
+                cid = country_ids.setdefault(country, len(country_ids))
+                (v4 if start.version == 4 else v6).append((int(start), int(end), cid))
+        index.countries = [None] * len(country_ids)
+        for country, cid in country_ids.items():
+            index.countries[cid] = country
+        for start, end, cid in sorted(v4):
+            index._v4_starts.append(start)
+            index._v4_ends.append(end)
+            index._v4_country.append(cid)
+        for start, end, cid in sorted(v6):
+            index._v6_starts.append(start)
+            index._v6_ends.append(end)
+            index._v6_country.append(cid)
+        return index
+
+    def lookup(self, ip):
+        """Return the country for `ip` (str or ipaddress object), or None if no range covers it."""
+        if isinstance(ip, str):
+            try:
+                ip = ipaddress.ip_address(ip)
+            except ValueError:
+                return None
+        if ip.version == 6 and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        value = int(ip)
+        if ip.version == 4:
+            starts, ends, country = self._v4_starts, self._v4_ends, self._v4_country
+        else:
+            starts, ends, country = self._v6_starts, self._v6_ends, self._v6_country
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return self.countries[country[i]]
+        return None
+
+
+def is_local(ip):
+    """True for loopback, private, link-local and other non-routable addresses."""
+    if isinstance(ip, str):
+        ip = ipaddress.ip_address(ip)
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_unspecified
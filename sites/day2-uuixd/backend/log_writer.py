@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class LogWriter:
+    """Background line writer.
+
+    `write()` appends a line to a deque and returns immediately; producers
+    take no lock (deque.append is atomic). A writer thread drains the deque
+    into one large buffered write whenever roughly `batch_bytes` worth of
+    lines are queued or `flush_interval` seconds pass. The writer thread does
+    the byte accounting: it turns `batch_bytes` into a line count from the
+    average line size it has written, which producers compare with the queue
+    length.
+
+    When the queue is full, policy='drop' discards the line and counts it,
+    policy='block' waits for the writer to catch up. Files are rotated to
+    `path.1`, `path.2`, ... after `rotate_bytes` bytes or `rotate_interval`
+    seconds (either may be None to disable). `close()` drains everything
+    still queued; later writes are rejected.
+    """
+
+    def __init__(self, path, max_queue=100000, policy='drop', batch_bytes=64 * 1024,
+                 flush_interval=0.5, rotate_bytes=None, rotate_interval=None,
+                 backups=5, fsync=False):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.path = path
+        self.max_queue = max_queue
+        self.policy = policy
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_interval = rotate_interval
+        self.backups = backups
+        self.fsync = fsync
+        self.written = 0
+        self.errors = 0
+        self._dropped = 0
+        # One entry per dropped line; the writer thread folds them into _dropped
+        self._drops = deque()
+        self._queue = deque()
+        # Lines per batch, re-estimated by the writer from the bytes it writes
+        self._batch_lines = max(1, batch_bytes // 100)
+        self._wake = threading.Event()
+        self._space = threading.Event()
+        self._flushed = threading.Condition()
+        self._written_seq = 0
+        self._closed = False
+        self._file = None
+        self._opened_at = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{path}", daemon=True)
+        self._thread.start()
+
+    @property
+    def dropped(self):
+        return self._dropped + len(self._drops)
+
+    def write(self, line):
+        """Queue `line` for writing; return False if it was dropped or the writer is closed."""
+        queue = self._queue
+        while True:
+            if self._closed:
+                return False
+            if len(queue) < self.max_queue:
+                break
+            if self.policy == 'drop':
+                self._drops.append(None)
+                return False
+            self._space.clear()
+            self._wake.set()
+            self._space.wait(self.flush_interval)
+        queue.append(line)
+        if self._closed:
+            # close() may have finished its final drain before the append landed
+            self._drain_after_close()
+        elif len(queue) >= self._batch_lines:
+            self._wake.set()
+        return True
+
+    def qsize(self):
+        return len(self._queue)
+
+    def flush(self, timeout=None):
+        """Block until every line queued before this call has been written."""
+        if not self._thread.is_alive():
+            return not self._queue
+        with self._flushed:
+            # The writer pops and writes under this lock, so nothing is in flight here
+            target = self._written_seq + len(self._queue)
+            self._wake.set()
+            return self._flushed.wait_for(lambda: self._written_seq >= target, timeout)
+
+    def reopen(self, path):
+        """Write subsequent lines to `path`; lines already queued still go to the old file."""
+        self.flush()
+        with self._flushed:
+            self.path = path
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+
+    def _drain_after_close(self):
+        with self._flushed:
+            self._write_batch()
+            self._close_file()
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', buffering=1024 * 1024)
+        self._opened_at = time.monotonic()
+
+    def _should_rotate(self):
+        if self.rotate_bytes and self._file.tell() >= self.rotate_bytes:
+            return True
+        if self.rotate_interval and time.monotonic() - self._opened_at >= self.rotate_interval:
+            return self._file.tell() > 0
+        return False
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _write_batch(self):
+        queue = self._queue
+        with self._flushed:
+            drops = self._drops
+            for _ in range(len(drops)):
+                drops.popleft()
+                self._dropped += 1
+            if not queue:
+                return
+            lines = []
+            while queue:
+                lines.append(queue.popleft())
+            self._space.set()
+            data = ''.join(lines)
+            self._batch_lines = max(1, self.batch_bytes * len(lines) // max(1, len(data)))
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write(data)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+                self.written += len(lines)
+                if self._should_rotate():
+                    self._rotate()
+            except OSError:
+                self.errors += 1
+            self._written_seq += len(lines)
+            self._flushed.notify_all()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._write_batch()
+            if self._closed:
+                # Producers that read _closed as False before close() set it have appended by
+                # now or will see it set after appending and drain their own line
+                self._drain_after_close()
+                break
+
+    def stats(self):
+        return {
+            'queued': len(self._queue),
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
@@ -0,0 +1,172 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# reset: seconds until the key is back to its full allowance
+# retry_after: seconds until a rejected request of the same cost could pass (None if allowed)
+RateLimitDecision = namedtuple('RateLimitDecision', 'allowed limit remaining reset retry_after')
+
+
+def rate_limit_headers(decision):
+    headers = {
+        'X-RateLimit-Limit': str(decision.limit),
+        'X-RateLimit-Remaining': str(decision.remaining),
+        'X-RateLimit-Reset': str(math.ceil(decision.reset)),
+    }
+    if decision.retry_after is not None and math.isfinite(decision.retry_after):
+        headers['Retry-After'] = str(max(1, math.ceil(decision.retry_after)))
+    return headers
+
+
+class _Limiter(ABC):
+    """Shared bookkeeping: one small state object per active key, dropped once idle."""
+
+    def __init__(self, clock=time.monotonic, sweep_interval=60):
+        self.clock = clock
+        self.sweep_interval = sweep_interval
+        self._state = {}
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.allowed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @abstractmethod
+    def _is_idle(self, state, now):
+        """True once `state` is back to a fresh key's, so dropping it changes nothing."""
+
+    @abstractmethod
+    def check(self, key, cost=1):
+        """Charge `cost` units to `key` if they fit; returns a RateLimitDecision."""
+
+    def sweep(self):
+        now = self.clock()
+        with self._lock:
+            idle = [k for k, s in self._state.items() if self._is_idle(s, now)]
+            for k in idle:
+                del self._state[k]
+            self.expired += len(idle)
+        return len(idle)
+
+    def start_sweeper(self):
+        if self._sweeper is not None:
+            return
+
+        def run():
+            event = threading.Event()
+            while not event.wait(self.sweep_interval):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name=f"{type(self).__name__}-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def __len__(self):
+        return len(self._state)
+
+    def stats(self):
+        return {
+            'type': type(self).__name__,
+            'active_keys': len(self._state),
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+        }
+
+
+class _Bucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class TokenBucketLimiter(_Limiter):
+    """Allows bursts of up to `capacity`, refilled at `rate` tokens per second."""
+
+    def __init__(self, capacity, rate, **kwargs):
+        super().__init__(**kwargs)
+        self.capacity = capacity
+        self.rate = rate
+
+    def _is_idle(self, bucket, now):
+        return bucket.tokens + (now - bucket.updated) * self.rate >= self.capacity
+
+    def check(self, key, cost=1):
+        now = self.clock()
+        with self._lock:
+            bucket = self._state.get(key)
+            if bucket is None:
+                bucket = self._state[key] = _Bucket(self.capacity, now)
+            else:
+                bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+            if cost <= bucket.tokens:
+                bucket.tokens -= cost
+                allowed, retry_after = True, None
+                self.allowed += 1
+            else:
+                allowed = False
+                retry_after = (cost - bucket.tokens) / self.rate if cost <= self.capacity else math.inf
+                self.rejected += 1
+            tokens = bucket.tokens
+        reset = (self.capacity - tokens) / self.rate
+        return RateLimitDecision(allowed, self.capacity, int(tokens), reset, retry_after)
+
+
+class _Window:
+    __slots__ = ('start', 'current', 'previous')
+
+    def __init__(self, start):
+        self.start = start
+        self.current = 0
+        self.previous = 0
+
+
+class SlidingWindowLimiter(_Limiter):
+    """At most `limit` units per `window` seconds, using the weighted two-window estimate."""
+
+    def __init__(self, limit, window, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.window = window
+
+    def _is_idle(self, state, now):
+        return now - state.start >= 2 * self.window
+
+    def check(self, key, cost=1):
+        now = self.clock()
+        window = self.window
+        with self._lock:
+            state = self._state.get(key)
+            if state is None:
+                state = self._state[key] = _Window(now)
+            elapsed = now - state.start
+            if elapsed >= window:
+                # Roll forward; after two windows nothing carries over
+                state.previous = state.current if elapsed < 2 * window else 0
+                state.current = 0
+                state.start += window * (elapsed // window)
+                elapsed = now - state.start
+            weight = 1 - elapsed / window
+            used = state.previous * weight + state.current
+            if used + cost <= self.limit:
+                state.current += cost
+                used += cost
+                allowed, retry_after = True, None
+                self.allowed += 1
+            else:
+                allowed = False
+                room = self.limit - state.current - cost
+                if cost > self.limit:
+                    retry_after = math.inf
+                elif room >= 0 and state.previous:
+                    # Wait until the previous window's weight has decayed enough
+                    retry_after = window * (1 - room / state.previous) - elapsed
+                else:
+                    retry_after = window - elapsed
+                self.rejected += 1
+            reset = window - elapsed + (window if state.current else 0)
+        return RateLimitDecision(allowed, self.limit, max(0, int(self.limit - used)), reset, retry_after)
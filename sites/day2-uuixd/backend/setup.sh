@@ -1,2 +1,6 @@
 pip3 install flask
-pip3 install flask-cors
\ No newline at end of file
+pip3 install flask-cors
+# Offline IP -> country dataset read by app.py (needs a free MaxMind license key,
+# or pass --zip with a GeoLite2-Country-CSV download). Without it the app refuses
+# to start unless UUIXD_GEOIP_REMOTE_URL is set.
+python3 build_geoip.py --license-key "$MAXMIND_LICENSE_KEY"
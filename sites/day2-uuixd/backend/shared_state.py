@@ -0,0 +1,287 @@
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import Counter
+
+from bounded_store import pack_ip
+
+
+class SharedStateDB:
+    """SQLite (WAL mode) file shared by every worker process on the host.
+
+    Each thread gets its own connection. Writers serialize on SQLite's file
+    lock, so the id counter, country tally and rate limits stay consistent
+    across gunicorn workers.
+    """
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self.connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS country_counts (country TEXT PRIMARY KEY, count INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                ip_key TEXT PRIMARY KEY, day INTEGER NOT NULL, count INTEGER NOT NULL);
+        ''')
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+
+class SharedBlockCounter:
+    """Id counter whose blocks are leased from the shared database.
+
+    Ids are unique across processes and increasing within each process;
+    with block_size=1 they are also globally ordered, at one transaction per id.
+
+    With a `mirror` (the single-process BlockCounter), every lease also
+    advances its counter file before any of its ids are handed out, so
+    switching back to the local backend never reissues ids handed out here.
+    The file is written after COMMIT, so its fsync doesn't hold the database
+    write lock; the mirror keeps the largest value when workers race.
+    """
+
+    def __init__(self, db, name='uuid', block_size=1000, initial=0, mirror=None):
+        self.db = db
+        self.name = name
+        self.block_size = block_size
+        self.mirror = mirror
+        self.lock = threading.Lock()
+        # Start past the single-process counter file, whichever of the two has gone further
+        db.connection().execute(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)', (name, initial))
+        self._next = 0
+        self._limit = 0
+
+    def _lease(self, count):
+        size = max(count, self.block_size)
+        conn = self.db.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            start = conn.execute('SELECT value FROM counters WHERE name = ?', (self.name,)).fetchone()[0]
+            conn.execute('UPDATE counters SET value = ? WHERE name = ?', (start + size, self.name))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if self.mirror is not None:
+            self.mirror.advance(start + size)
+        self._next = start
+        self._limit = start + size
+
+    def take(self, count=1):
+        """Reserve `count` consecutive ids and return the first one."""
+        if count < 1:
+            raise ValueError('count must be >= 1')
+        with self.lock:
+            if self._next + count > self._limit:
+                # The rest of the current block is abandoned so the range stays contiguous
+                self._lease(count)
+            start = self._next
+            self._next += count
+            return start
+
+
+class SharedCountryTally:
+    """Country tally stored in the shared database.
+
+    Increments are buffered per process and added to the table by `flush()`;
+    the flusher also reloads the top-N so each worker serves a leaderboard no
+    older than one flush interval.
+    """
+
+    def __init__(self, db, top_n=3, initial=None):
+        self.db = db
+        self.top_n = top_n
+        self.lock = threading.Lock()
+        self._pending = Counter()
+        self._flusher = None
+        if initial:
+            conn = db.connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('SELECT COUNT(*) FROM country_counts').fetchone()[0] == 0:
+                    conn.executemany('INSERT INTO country_counts (country, count) VALUES (?, ?)',
+                                     list(initial.items()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        self._refresh()
+
+    def _refresh(self):
+        top = self.db.connection().execute(
+            'SELECT country, count FROM country_counts ORDER BY count DESC LIMIT ?',
+            (self.top_n,)).fetchall()
+        body = json.dumps([{'country': c, 'count': n} for c, n in top]).encode('utf-8')
+        self.leaderboard = (body, hashlib.md5(body).hexdigest())
+
+    def add(self, country, amount=1):
+        with self.lock:
+            self._pending[country] += amount
+
+    def most_common(self, n=None):
+        sql = 'SELECT country, count FROM country_counts ORDER BY count DESC'
+        if n is not None:
+            return self.db.connection().execute(sql + ' LIMIT ?', (n,)).fetchall()
+        return self.db.connection().execute(sql).fetchall()
+
+    def flush(self):
+        with self.lock:
+            pending, self._pending = self._pending, Counter()
+        if pending:
+            conn = self.db.connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    'INSERT INTO country_counts (country, count) VALUES (?, ?) '
+                    'ON CONFLICT(country) DO UPDATE SET count = count + excluded.count',
+                    list(pending.items()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                with self.lock:
+                    self._pending.update(pending)
+                raise
+        self._refresh()
+
+    def close(self):
+        self.flush()
+
+    def start_flusher(self, interval=1.0):
+        if self._flusher is not None:
+            return
+
+        def run():
+            event = threading.Event()
+            while not event.wait(interval):
+                try:
+                    self.flush()
+                except sqlite3.Error:
+                    pass
+
+        self._flusher = threading.Thread(target=run, name='shared-tally-flusher', daemon=True)
+        self._flusher.start()
+
+
+class SharedRateStore:
+    """Per-IP daily request counts in the shared database, for quotas that span worker processes.
+
+    Like SharedBlockCounter, each worker leases a slice of an IP's daily budget
+    (`lease_size` requests, or the request's cost if larger) in one transaction
+    and spends it locally, so most hits never touch the database. Leased
+    requests count against the budget whether or not they are used, so a
+    busy IP can come in up to (workers - 1) leases under the limit. Once the
+    budget is used up the worker remembers that until the day changes.
+    """
+
+    def __init__(self, db, limit, sweep_interval=600, lease_size=None, max_leases=100000):
+        self.db = db
+        self.limit = limit
+        self.sweep_interval = sweep_interval
+        self.lease_size = lease_size if lease_size is not None else max(1, min(100, limit // 50))
+        self.max_leases = max_leases
+        self.expired = 0
+        self.leases = 0
+        self.lock = threading.Lock()
+        # ip_key -> (day, tokens left, exhausted)
+        self._local = {}
+        self._sweeper = None
+
+    def _take_lease(self, key, today, needed):
+        size = max(needed, self.lease_size)
+        conn = self.db.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT day, count FROM rate_limits WHERE ip_key = ?', (key,)).fetchone()
+            used = row[1] if row is not None and row[0] == today else 0
+            granted = min(size, max(0, self.limit - used))
+            if granted:
+                conn.execute(
+                    'INSERT INTO rate_limits (ip_key, day, count) VALUES (?, ?, ?) '
+                    'ON CONFLICT(ip_key) DO UPDATE SET '
+                    'count = CASE WHEN day = excluded.day THEN count + excluded.count ELSE excluded.count END, '
+                    'day = excluded.day',
+                    (key, today, granted))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return granted, used + granted >= self.limit
+
+    def hit(self, ip, cost=1):
+        today = datetime.date.today().toordinal()
+        # Text key: packed IPv6 values don't fit in a 64-bit SQLite integer
+        key = str(pack_ip(ip))
+        with self.lock:
+            day, tokens, exhausted = self._local.get(key, (today, 0, False))
+            if day != today:
+                tokens, exhausted = 0, False
+            if tokens >= cost:
+                self._local[key] = (today, tokens - cost, exhausted)
+                return True
+            if exhausted:
+                return False
+        granted, exhausted = self._take_lease(key, today, cost - tokens)
+        with self.lock:
+            self.leases += 1
+            day, tokens, _ = self._local.pop(key, (today, 0, False))
+            if day != today:
+                tokens = 0
+            tokens += granted
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            if len(self._local) >= self.max_leases:
+                # Oldest first; whatever was left of that lease is forfeited
+                del self._local[next(iter(self._local))]
+            self._local[key] = (today, tokens, exhausted)
+        return allowed
+
+    def sweep(self):
+        today = datetime.date.today().toordinal()
+        with self.lock:
+            self._local = {key: lease for key, lease in self._local.items() if lease[0] == today}
+        removed = self.db.connection().execute('DELETE FROM rate_limits WHERE day != ?', (today,)).rowcount
+        self.expired += removed
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper is not None:
+            return
+
+        def run():
+            event = threading.Event()
+            while not event.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except sqlite3.Error:
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name='shared-rate-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def __len__(self):
+        return self.db.connection().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'limit': self.limit,
+            'expired': self.expired,
+            'leases': self.leases,
+            'local_keys': len(self._local),
+            'backend': 'sqlite',
+        }
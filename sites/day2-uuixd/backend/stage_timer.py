@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import deque
+
+
+class _NullTrace:
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+    def finish(self):
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+
+
+class _Trace:
+    __slots__ = ('timer', 'last', 'stages')
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.last = time.perf_counter_ns()
+        self.stages = []
+
+    def mark(self, stage):
+        """Record the time since the previous mark (or start) under `stage`."""
+        now = time.perf_counter_ns()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self):
+        self.timer._record(self.stages)
+
+
+class StageTimer:
+    """Opt-in per-stage latency breakdown for a request handler.
+
+    `start()` returns a trace whose `mark(stage)` calls split the handler into
+    stages. When disabled, `start()` returns a shared no-op trace, so the
+    hooks cost one attribute lookup and call each.
+    """
+
+    def __init__(self, enabled=False, samples=10000):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._samples = samples
+        self._stages = {}
+
+    def start(self):
+        if not self.enabled:
+            return _NULL_TRACE
+        return _Trace(self)
+
+    def _record(self, stages):
+        with self._lock:
+            for stage, ns in stages:
+                entry = self._stages.get(stage)
+                if entry is None:
+                    entry = self._stages[stage] = [0, 0, deque(maxlen=self._samples)]
+                entry[0] += 1
+                entry[1] += ns
+                entry[2].append(ns)
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+
+    def stats(self):
+        """Per-stage count, mean and p50/p95/p99 over the most recent samples, in microseconds."""
+        with self._lock:
+            snapshot = {stage: (count, total, sorted(samples))
+                        for stage, (count, total, samples) in self._stages.items()}
+        result = {}
+        for stage, (count, total, samples) in snapshot.items():
+            def pct(p):
+                return round(samples[min(len(samples) - 1, int(p * len(samples)))] / 1000, 1)
+            result[stage] = {
+                'count': count,
+                'mean_us': round(total / count / 1000, 1),
+                'p50_us': pct(0.50),
+                'p95_us': pct(0.95),
+                'p99_us': pct(0.99),
+            }
+        return result
@@ -0,0 +1,84 @@
+import importlib
+import sys
+
+import pytest
+
+
+def test_single_uuid(uuixd):
+    response = uuixd.app.test_client().get('/uuixd')
+    assert response.status_code == 200
+    assert response.json == {'uuid': '00000000-0000-0000-0000-000000000000'}
+
+
+def test_batch_uuids_are_consecutive(uuixd):
+    client = uuixd.app.test_client()
+    client.get('/uuixd')
+    response = client.get('/uuixd?count=3')
+    assert response.json == {'uuids': [
+        '00000000-0000-0000-0000-000000000001',
+        '00000000-0000-0000-0000-000000000002',
+        '00000000-0000-0000-0000-000000000003',
+    ]}
+
+
+def test_out_of_range_count_is_rejected_without_charging(uuixd):
+    client = uuixd.app.test_client()
+    for count in (0, -1, uuixd.MAX_BATCH + 1, 5000):
+        response = client.get(f'/uuixd?count={count}')
+        assert response.status_code == 400
+        assert 'Retry-After' not in response.headers
+    # The whole burst is still available
+    response = client.get(f'/uuixd?count={uuixd.RATE_LIMIT_BURST}')
+    assert response.status_code == 200
+    assert response.headers['X-RateLimit-Remaining'] == '0'
+
+
+def test_batch_is_charged_by_size(uuixd):
+    client = uuixd.app.test_client()
+    response = client.get('/uuixd?count=10')
+    assert int(response.headers['X-RateLimit-Remaining']) == uuixd.RATE_LIMIT_BURST - 10
+    response = client.get(f'/uuixd?count={uuixd.RATE_LIMIT_BURST}')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_leaderboard_etag(uuixd):
+    client = uuixd.app.test_client()
+    client.get('/uuixd')
+    response = client.get('/leaderboard')
+    assert response.json == [{'country': 'Local', 'count': 1}]
+    etag = response.headers['ETag']
+    assert client.get('/leaderboard', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_batch_as_ndjson(uuixd):
+    client = uuixd.app.test_client()
+    response = client.get('/uuixd?count=2&format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.get_data(as_text=True).splitlines() == [
+        '{"uuid":"00000000-0000-0000-0000-000000000000"}',
+        '{"uuid":"00000000-0000-0000-0000-000000000001"}',
+    ]
+
+
+def test_uuid_range_crosses_the_low_48_bits(uuixd):
+    start = (1 << 48) - 1
+    assert list(uuixd.format_uuid_range(start, 2)) == [
+        uuixd.format_uuid(start), uuixd.format_uuid(start + 1)]
+    assert uuixd.format_uuid(start + 1) == '00000000-0000-0000-0001-000000000000'
+
+
+def test_countries_come_from_the_dataset(uuixd, monkeypatch):
+    monkeypatch.setattr(uuixd, 'lookup_country_remote', lambda ip: pytest.fail('remote lookup'))
+    assert uuixd.get_country('8.8.8.8') == 'United States'
+    assert uuixd.get_country('9.9.9.9') == 'Unknown'
+
+
+def test_missing_dataset_fails_at_startup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('UUIXD_GEOIP_FILE', str(tmp_path / 'missing.csv'))
+    monkeypatch.delenv('UUIXD_GEOIP_REMOTE_URL', raising=False)
+    sys.modules.pop('app', None)
+    with pytest.raises(RuntimeError, match='build_geoip.py'):
+        importlib.import_module('app')
+    sys.modules.pop('app', None)
@@ -0,0 +1,40 @@
+from benchmark import percentile, summarize
+from stage_timer import StageTimer
+
+
+def test_summarize_mixed_statuses():
+    report = summarize([0.003, 0.001, 0.002], {200: 2, 'error': 1, 429: 1}, elapsed=1.0)
+    assert report['statuses'] == {'200': 2, '429': 1, 'error': 1}
+    assert report['requests'] == 3
+    assert report['latency_ms']['p50'] == 2.0
+    assert report['latency_ms']['max'] == 3.0
+
+
+def test_summarize_without_requests():
+    report = summarize([], {}, elapsed=1.0)
+    assert report['requests'] == 0
+    assert report['latency_ms']['p99'] is None
+    assert percentile([], 0.5) is None
+
+
+def test_stage_timer_is_a_no_op_when_disabled():
+    timer = StageTimer()
+    trace = timer.start()
+    trace.mark('geo')
+    trace.finish()
+    assert timer.stats() == {}
+
+
+def test_stage_timer_breaks_down_stages():
+    timer = StageTimer(enabled=True, samples=3)
+    for _ in range(5):
+        trace = timer.start()
+        trace.mark('rate_limit')
+        trace.mark('issue')
+        trace.finish()
+    stats = timer.stats()
+    assert set(stats) == {'rate_limit', 'issue'}
+    assert stats['issue']['count'] == 5
+    assert stats['issue']['p99_us'] >= stats['issue']['p50_us'] >= 0
+    timer.reset()
+    assert timer.stats() == {}
@@ -0,0 +1,38 @@
+import time
+
+from bounded_store import LRUTTLCache, pack_ip
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUTTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_negative_results_expire_sooner(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = LRUTTLCache(ttl=100, negative_ttl=10, is_negative=lambda value: value == 'Unknown')
+    cache.set('1.2.3.4', 'Peru')
+    cache.set('5.6.7.8', 'Unknown')
+    now[0] += 11
+    assert cache.get('5.6.7.8') is None
+    assert cache.get('1.2.3.4') == 'Peru'
+    now[0] += 90
+    assert cache.get('1.2.3.4', 'gone') == 'gone'
+    stats = cache.stats()
+    assert stats['expirations'] == 2
+    assert stats['size'] == 0
+    assert stats['hit_rate'] == round(1 / 3, 4)
+
+
+def test_pack_ip():
+    assert pack_ip('1.2.3.4') == pack_ip('::ffff:1.2.3.4')
+    assert pack_ip('2001:db8::1') == 0x20010db8000000000000000000000001
+    # Anything that isn't an address is kept as is
+    assert pack_ip('unknown') == 'unknown'
@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+from counter_store import BlockCounter, CounterStoreError
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().split()
+
+
+@pytest.mark.parametrize('durability', ['rename', 'append'])
+def test_restart_resumes_past_the_leased_block(tmp_path, durability):
+    path = str(tmp_path / 'recent_uuid.log')
+    counter = BlockCounter(path, block_size=100, durability=durability)
+    assert [counter.take() for _ in range(3)] == [0, 1, 2]
+    assert counter.persisted_limit == 100
+
+    restarted = BlockCounter(path, block_size=100, durability=durability)
+    assert restarted.take() == 100
+
+
+def test_batches_lease_whole_blocks(tmp_path):
+    path = str(tmp_path / 'recent_uuid.log')
+    counter = BlockCounter(path, block_size=10)
+    assert counter.take(25) == 0
+    assert counter.persisted_limit == 30
+    assert counter.take() == 25
+    assert read(path) == ['30']
+
+
+def test_append_mode_compacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(BlockCounter, 'COMPACT_EVERY', 3)
+    path = str(tmp_path / 'recent_uuid.log')
+    counter = BlockCounter(path, block_size=1, durability='append')
+    for _ in range(3):
+        counter.take()
+    assert read(path) == ['1', '2', '3']
+    counter.take()
+    assert read(path) == ['4']
+
+
+def test_advance_skips_ids_issued_elsewhere(tmp_path):
+    path = str(tmp_path / 'recent_uuid.log')
+    counter = BlockCounter(path, block_size=10)
+    counter.take()
+    counter.advance(500)
+    assert counter.take() == 500
+    assert BlockCounter(path).take() >= 510
+
+
+def test_unreadable_file_is_refused(tmp_path):
+    path = tmp_path / 'recent_uuid.log'
+    path.write_text('garbage\n')
+    with pytest.raises(CounterStoreError):
+        BlockCounter(str(path))
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        BlockCounter(str(tmp_path / 'c'), block_size=0)
+    with pytest.raises(ValueError):
+        BlockCounter(str(tmp_path / 'c'), durability='fsync')
+    with pytest.raises(ValueError):
+        BlockCounter(str(tmp_path / 'c')).take(0)
+
+
+def test_concurrent_takes_are_unique(tmp_path):
+    counter = BlockCounter(str(tmp_path / 'recent_uuid.log'), block_size=7)
+    issued = []
+    lock = threading.Lock()
+
+    def run():
+        ids = [counter.take() for _ in range(500)]
+        with lock:
+            issued.extend(ids)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(issued) == list(range(2000))
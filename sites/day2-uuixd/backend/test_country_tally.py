@@ -0,0 +1,67 @@
+import os
+
+from country_tally import CountryTally
+
+
+def test_counts_survive_restart(tmp_path):
+    path = str(tmp_path / 'counts.log')
+    tally = CountryTally(path)
+    tally.add('France', 3)
+    tally.add('Peru')
+    tally.close()
+
+    reloaded = CountryTally(path)
+    assert reloaded.counts == {'France': 3, 'Peru': 1}
+    reloaded.close()
+
+
+def test_malformed_lines_are_skipped(tmp_path):
+    path = str(tmp_path / 'counts.log')
+    with open(path, 'w') as f:
+        f.write('#gen 0\nFrance,4\nPeru,not-a-number\nChile,2\n')
+    with open(f'{path}.delta.0', 'w') as f:
+        f.write('France,1\nbroken,\nChile,x\n')
+
+    tally = CountryTally(path)
+    assert tally.counts == {'France': 5, 'Chile': 2}
+    tally.close()
+
+
+def test_close_stops_flusher_and_writes_pending(tmp_path):
+    path = str(tmp_path / 'counts.log')
+    tally = CountryTally(path)
+    tally.start_flusher(interval=0.01)
+    for _ in range(100):
+        tally.add('Japan')
+    tally.close()
+    assert tally._flusher is None
+
+    assert CountryTally(path).counts == {'Japan': 100}
+
+
+def test_adds_after_close_are_persisted(tmp_path):
+    path = str(tmp_path / 'counts.log')
+    tally = CountryTally(path)
+    tally.add('Kenya')
+    tally.close()
+    tally.add('Kenya', 2)
+    tally.close()
+
+    assert os.path.exists(f'{path}.delta.0')
+    assert CountryTally(path).counts == {'Kenya': 3}
+
+
+def test_compaction_keeps_counts(tmp_path):
+    path = str(tmp_path / 'counts.log')
+    tally = CountryTally(path, compact_every=2)
+    tally.add('Chile')
+    tally.flush()
+    tally.add('Chile')
+    tally.flush()
+    tally.add('Chile')
+    tally.close()
+
+    reloaded = CountryTally(path)
+    assert reloaded.generation == 1
+    assert reloaded.counts == {'Chile': 3}
+    reloaded.close()
@@ -0,0 +1,77 @@
+import ipaddress
+import zipfile
+
+import build_geoip
+from geoip import GeoIPIndex, is_local
+
+
+def build(tmp_path, rows):
+    path = tmp_path / 'geoip.csv'
+    path.write_text('\n'.join(rows) + '\n')
+    return GeoIPIndex.from_csv(str(path))
+
+
+def test_ranges_and_cidrs(tmp_path):
+    index = build(tmp_path, [
+        '# start,end,country',
+        'start_ip,end_ip,country',
+        '1.0.0.0,1.0.0.255,Australia',
+        '8.8.8.0/24,United States',
+        '2001:db8::/32,Testland',
+        '',
+        'not-an-ip,2.0.0.0,Broken',
+        '5.0.0.10,5.0.0.1,Backwards',
+        '6.0.0.0,::1,Mixed',
+    ])
+    assert len(index) == 3
+    assert index.lookup('1.0.0.0') == 'Australia'
+    assert index.lookup('1.0.0.255') == 'Australia'
+    assert index.lookup('1.0.1.0') is None
+    assert index.lookup('8.8.8.8') == 'United States'
+    assert index.lookup(ipaddress.ip_address('2001:db8::1')) == 'Testland'
+    assert index.lookup('5.0.0.5') is None
+    assert index.lookup('bogus') is None
+
+
+def test_ipv4_mapped_addresses_use_the_ipv4_ranges(tmp_path):
+    index = build(tmp_path, ['1.0.0.0,1.0.0.255,Australia'])
+    assert index.lookup('::ffff:1.0.0.7') == 'Australia'
+
+
+def test_unsorted_input(tmp_path):
+    index = build(tmp_path, ['9.0.0.0/8,Nine', '3.0.0.0/8,Three', '6.0.0.0/8,Six'])
+    assert [index.lookup(f'{n}.1.2.3') for n in (3, 6, 9, 7)] == ['Three', 'Six', 'Nine', None]
+
+
+def test_is_local():
+    assert is_local('127.0.0.1')
+    assert is_local('10.1.2.3')
+    assert is_local('::ffff:192.168.0.1')
+    assert is_local('fe80::1')
+    assert not is_local('8.8.8.8')
+
+
+def test_build_geoip_converts_geolite2(tmp_path):
+    archive = tmp_path / 'GeoLite2-Country-CSV_20240101.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('GeoLite2-Country-CSV_20240101/GeoLite2-Country-Locations-en.csv',
+                   'geoname_id,locale_code,continent_code,continent_name,country_iso_code,country_name,is_in_european_union\n'
+                   '2077456,en,OC,Oceania,AU,Australia,0\n'
+                   '6255148,en,EU,Europe,,,0\n')
+        z.writestr('GeoLite2-Country-CSV_20240101/GeoLite2-Country-Blocks-IPv4.csv',
+                   'network,geoname_id,registered_country_geoname_id,represented_country_geoname_id,'
+                   'is_anonymous_proxy,is_satellite_provider\n'
+                   '1.0.0.0/24,2077456,2077456,,0,0\n'
+                   '1.0.1.0/24,,2077456,,0,1\n'
+                   '2.0.0.0/24,6255148,6255148,,0,0\n')
+        z.writestr('GeoLite2-Country-CSV_20240101/GeoLite2-Country-Blocks-IPv6.csv',
+                   'network,geoname_id,registered_country_geoname_id,represented_country_geoname_id,'
+                   'is_anonymous_proxy,is_satellite_provider\n'
+                   '2001:db8::/32,2077456,2077456,,0,0\n')
+    output = tmp_path / 'geoip.csv'
+    assert build_geoip.convert(str(archive), str(output)) == 3
+    index = GeoIPIndex.from_csv(str(output))
+    assert index.lookup('1.0.0.1') == 'Australia'
+    assert index.lookup('1.0.1.1') == 'Australia'
+    assert index.lookup('2.0.0.1') is None
+    assert index.lookup('2001:db8::1') == 'Australia'
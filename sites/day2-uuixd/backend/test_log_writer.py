@@ -0,0 +1,74 @@
+import threading
+
+from log_writer import LogWriter
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_close_writes_everything_queued(tmp_path):
+    path = str(tmp_path / 'requests.log')
+    writer = LogWriter(path, flush_interval=10)
+    for i in range(1000):
+        assert writer.write(f"line {i}\n")
+    writer.close()
+    assert read_lines(path) == [f"line {i}" for i in range(1000)]
+
+
+def test_writes_after_close_are_rejected(tmp_path):
+    path = str(tmp_path / 'requests.log')
+    writer = LogWriter(path)
+    writer.write("before\n")
+    writer.close()
+    assert writer.write("after\n") is False
+    assert read_lines(path) == ["before"]
+
+
+def test_no_accepted_line_is_lost_when_closing_under_load(tmp_path):
+    path = str(tmp_path / 'requests.log')
+    writer = LogWriter(path, flush_interval=0.001, batch_bytes=64)
+    accepted = []
+    started = threading.Event()
+
+    def produce(n):
+        for i in range(20000):
+            line = f"{n}-{i}\n"
+            if writer.write(line):
+                accepted.append(line.strip())
+            if i == 100:
+                started.set()
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    writer.close()
+    for thread in threads:
+        thread.join()
+    assert sorted(read_lines(path)) == sorted(accepted)
+
+
+def test_drop_policy_counts_dropped_lines(tmp_path):
+    writer = LogWriter(str(tmp_path / 'requests.log'), max_queue=2, flush_interval=10, batch_bytes=1 << 20)
+    results = [writer.write("x\n") for _ in range(5)]
+    assert results[:2] == [True, True]
+    assert writer.dropped == results.count(False)
+    writer.close()
+
+
+def test_dropped_lines_stay_counted_after_the_writer_drains(tmp_path):
+    writer = LogWriter(str(tmp_path / 'requests.log'), max_queue=1, flush_interval=10, batch_bytes=1 << 20)
+    assert writer.write("a\n") and not writer.write("b\n") and not writer.write("c\n")
+    assert writer.flush(timeout=5)
+    assert writer.stats() == {'queued': 0, 'written': 1, 'dropped': 2, 'errors': 0}
+    writer.close()
+
+
+def test_batch_size_is_estimated_from_written_lines(tmp_path):
+    writer = LogWriter(str(tmp_path / 'requests.log'), flush_interval=10, batch_bytes=100)
+    writer.write("x" * 9 + "\n")
+    assert writer.flush(timeout=5)
+    assert writer._batch_lines == 10
+    writer.close()
@@ -0,0 +1,65 @@
+import math
+
+import pytest
+
+from rate_limiter import SlidingWindowLimiter, TokenBucketLimiter, _Limiter, rate_limit_headers
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_limiter_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Limiter()
+
+
+def test_token_bucket_burst_and_refill():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(10, 1.0, clock=clock)
+    assert limiter.check('a', 10).allowed
+    decision = limiter.check('a', 2)
+    assert not decision.allowed
+    assert decision.retry_after == pytest.approx(2.0)
+    clock.now += 2
+    assert limiter.check('a', 2).allowed
+    # Other keys have their own bucket
+    assert limiter.check('b', 10).allowed
+
+
+def test_token_bucket_cost_over_capacity_never_fits():
+    limiter = TokenBucketLimiter(10, 1.0, clock=FakeClock())
+    decision = limiter.check('a', 11)
+    assert not decision.allowed
+    assert math.isinf(decision.retry_after)
+    assert 'Retry-After' not in rate_limit_headers(decision)
+    # Rejection didn't take anything
+    assert limiter.check('a', 10).allowed
+
+
+def test_sliding_window_weights_previous_window():
+    clock = FakeClock()
+    limiter = SlidingWindowLimiter(10, 60, clock=clock)
+    assert limiter.check('a', 10).allowed
+    assert not limiter.check('a').allowed
+    # Half way into the next window, half of the previous window still counts
+    clock.now += 90
+    assert limiter.check('a', 5).allowed
+    assert not limiter.check('a').allowed
+
+
+def test_sweep_drops_idle_keys():
+    clock = FakeClock()
+    limiter = TokenBucketLimiter(10, 1.0, clock=clock)
+    limiter.check('a', 8)
+    limiter.check('b', 1)
+    clock.now += 5
+    assert limiter.sweep() == 1
+    assert len(limiter) == 1
+    clock.now += 5
+    assert limiter.sweep() == 1
+    assert len(limiter) == 0
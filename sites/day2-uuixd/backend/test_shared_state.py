@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+
+import pytest
+
+from counter_store import BlockCounter
+from country_tally import CountryTally, load_counts
+from shared_state import SharedBlockCounter, SharedCountryTally, SharedRateStore, SharedStateDB
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SharedStateDB(str(tmp_path / 'state.db'))
+
+
+def test_shared_counter_starts_past_local_file_and_mirrors_leases(tmp_path, db):
+    counter_file = str(tmp_path / 'recent_uuid.log')
+    local = BlockCounter(counter_file, block_size=10)
+    local.take(25)
+
+    mirror = BlockCounter(counter_file)
+    shared = SharedBlockCounter(db, block_size=100, initial=mirror.next_value, mirror=mirror)
+    first = shared.take()
+    assert first >= 30
+    issued = [first] + [shared.take() for _ in range(150)]
+
+    # Back on the local backend, nothing handed out by the shared counter is reissued
+    assert BlockCounter(counter_file).take() > max(issued)
+
+
+def test_shared_counter_catches_up_with_a_local_file_that_moved_on(tmp_path, db):
+    shared = SharedBlockCounter(db, block_size=10)
+    shared.take(5)
+    # A later start seeded from a counter file that the local backend advanced past the database
+    again = SharedBlockCounter(db, block_size=10, initial=500)
+    assert again.take() >= 500
+
+
+def test_concurrent_leases_are_unique(db):
+    counters = [SharedBlockCounter(db, block_size=7) for _ in range(4)]
+    issued = []
+    lock = threading.Lock()
+
+    def run(counter):
+        ids = [counter.take() for _ in range(200)]
+        with lock:
+            issued.extend(ids)
+
+    threads = [threading.Thread(target=run, args=(c,)) for c in counters]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(issued)) == len(issued)
+
+
+def test_tally_is_seeded_from_the_local_log_once(tmp_path, db):
+    path = str(tmp_path / 'country_counts.log')
+    local = CountryTally(path)
+    local.add('Peru', 4)
+    local.close()
+
+    tally = SharedCountryTally(db, initial=load_counts(path)[1])
+    tally.add('Peru')
+    tally.flush()
+    assert tally.most_common() == [('Peru', 5)]
+    # Already seeded: a second worker doesn't import the file again
+    SharedCountryTally(db, initial={'Peru': 4})
+    assert tally.most_common() == [('Peru', 5)]
+
+
+def test_failed_seed_rolls_back(db):
+    with pytest.raises(sqlite3.Error):
+        SharedCountryTally(db, initial={'Peru': 3, 'Chile': None})
+    conn = db.connection()
+    assert not conn.in_transaction
+    assert SharedCountryTally(db, initial={'Chile': 2}).most_common() == [('Chile', 2)]
+
+
+def test_rate_store_charges_cost(db):
+    store = SharedRateStore(db, limit=10)
+    assert store.hit('203.0.113.5', 6)
+    assert store.hit('203.0.113.5', 4)
+    assert not store.hit('203.0.113.5', 1)
+    assert store.hit('203.0.113.6', 10)
+
+
+def test_rate_store_spends_leases_locally(db):
+    store = SharedRateStore(db, limit=100, lease_size=10)
+    assert all(store.hit('203.0.113.5') for _ in range(25))
+    assert store.leases == 3
+    row = db.connection().execute('SELECT count FROM rate_limits').fetchone()
+    assert row == (30,)
+
+
+def test_rate_store_workers_share_one_budget(db):
+    workers = [SharedRateStore(db, limit=50, lease_size=7) for _ in range(3)]
+    allowed = sum(worker.hit('203.0.113.5') for _ in range(40) for worker in workers)
+    assert allowed == 50
+    # Exhaustion is remembered, so denied hits don't open transactions
+    leases = [worker.leases for worker in workers]
+    assert not any(worker.hit('203.0.113.5') for worker in workers)
+    assert [worker.leases for worker in workers] == leases
+
+
+def test_mirror_keeps_the_largest_mark_when_workers_race(tmp_path):
+    counter_file = str(tmp_path / 'recent_uuid.log')
+    first, second = BlockCounter(counter_file), BlockCounter(counter_file)
+    second.advance(3000)
+    # A worker whose smaller lease committed earlier writes its mark last
+    first.advance(2000)
+    assert BlockCounter(counter_file).take() == 3000
@@ -1,9 +1,20 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import requests
+import atexit
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import threading
+import time
+from riot_client import RiotClient
+from rate_governor import RateGovernor, RateBudgetExceeded, INTERACTIVE, BULK
+from riot_cache import RiotCache, classify
+from single_flight import SingleFlight
+from response_shaping import (
+    LAST_GAME_VIEWS, MATCH_VIEWS, requested_shape, project, json_response, not_modified
+)
 
 # Load environment variables
 load_dotenv()
@@ -16,6 +27,48 @@ RIOT_API_KEY = os.getenv('RIOT_API_KEY')
 if not RIOT_API_KEY:
     raise ValueError("RIOT_API_KEY not found in environment variables")
 
+# Paces Riot calls to the limits Riot reports in its response headers, queueing
+# instead of sending requests that would be rejected with a 429
+rate_governor = RateGovernor(
+    max_wait=float(os.getenv('RIOT_RATE_MAX_WAIT', 5)),
+    default_app_limits=os.getenv('RIOT_APP_RATE_LIMIT', '20:1,100:120'),
+)
+
+# Shared keep-alive connection pools for Riot API calls, one per host
+riot_client = RiotClient(
+    RIOT_API_KEY,
+    pool_size=int(os.getenv('RIOT_POOL_SIZE', 10)),
+    timeout=float(os.getenv('RIOT_TIMEOUT', 10)),
+    max_retries=int(os.getenv('RIOT_MAX_RETRIES', 2)),
+    backoff=float(os.getenv('RIOT_RETRY_BACKOFF', 0.25)),
+    governor=rate_governor,
+)
+
+# Response cache: finished matches are immutable (memory + disk LRU), account and
+# summoner lookups get short TTLs, match id lists are served stale while refreshing
+riot_cache = RiotCache(
+    os.getenv('RIOT_CACHE_DIR', 'cache'),
+    match_disk_entries=int(os.getenv('RIOT_CACHE_MATCHES_ON_DISK', 5000)),
+    account_ttl=float(os.getenv('RIOT_CACHE_ACCOUNT_TTL', 3600)),
+    summoner_ttl=float(os.getenv('RIOT_CACHE_SUMMONER_TTL', 300)),
+    match_ids_ttl=float(os.getenv('RIOT_CACHE_MATCH_IDS_TTL', 30)),
+    match_ids_stale=float(os.getenv('RIOT_CACHE_MATCH_IDS_STALE', 300)),
+    refresh_workers=int(os.getenv('RIOT_CACHE_REFRESH_WORKERS', 2)),
+)
+
+# Identical Riot calls, and last-game lookups of the same player, that overlap in time
+# are made once and shared by every caller waiting on them
+upstream_flights = SingleFlight()
+last_game_flights = SingleFlight()
+
+# Threads for running independent Riot calls of one request at the same time
+fanout_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('RIOT_FANOUT_WORKERS', 16)),
+    thread_name_prefix='riot-fanout'
+)
+atexit.register(fanout_pool.shutdown, wait=False, cancel_futures=True)
+LAST_GAME_DEADLINE = float(os.getenv('LAST_GAME_DEADLINE', 15))
+
 # Regional endpoints
 REGIONAL_ENDPOINTS = {
     'na1': 'https://na1.api.riotgames.com',
@@ -133,14 +186,26 @@ def get_puuid_by_riot_id(game_name, tag_line, region):
         base_url = REGIONAL_ENDPOINTS[region]
         url = f"{base_url}/lol/summoner/v4/summoners/by-name/{game_name}"
     
-    return make_riot_request(url)
+    return riot_request(url)
+
+def riot_request(url, priority=INTERACTIVE, cancelled=None):
+    """
+    Make a Riot API request through the response cache and request coalescing. Once
+    `cancelled` is set, cache misses fail without calling Riot.
+    """
+    def fetch(url, priority):
+        if cancelled is not None and cancelled.is_set():
+            return {'success': False, 'error': 'Request cancelled'}
+        return upstream_flights.do(flight_key(url), lambda: make_riot_request(url, priority))
+    return riot_cache.get(url, fetch, priority)
 
-def make_riot_request(url):
+def flight_key(url):
+    """Riot IDs are case-insensitive, so account lookups differing only in case are the same call"""
+    kind, _ = classify(url)
+    return url.lower() if kind == 'account' else url
+
+def make_riot_request(url, priority=INTERACTIVE):
     """Make a request to Riot API with proper headers and error handling"""
-    headers = {
-        'X-Riot-Token': RIOT_API_KEY
-    }
-    
     # Log the request
     print(f"\n🔗 RIOT API REQUEST:")
     print(f"   URL: {url}")
@@ -148,7 +213,7 @@ def make_riot_request(url):
     print(f"   Headers: {{'X-Riot-Token': '{masked_key}' }}")
     
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = riot_client.get(url, priority)
         
         # Log the response
         print(f"📥 RIOT API RESPONSE:")
@@ -172,6 +237,9 @@ def make_riot_request(url):
             print(f"   Error: {response.status_code} - {response.text}")
             return {'success': False, 'error': f'API request failed with status {response.status_code}'}
             
+    except RateBudgetExceeded as e:
+        print(f"   Error: {e}")
+        return {'success': False, 'error': f'Rate limit exceeded. Please wait {e.retry_after:.0f} seconds and try again.'}
     except requests.exceptions.Timeout:
         print(f"   Error: Request timed out")
         return {'success': False, 'error': 'Request timed out. Please try again.'}
@@ -203,7 +271,7 @@ def get_summoner(region, riot_id):
     base_url = REGIONAL_ENDPOINTS[region]
     url = f"{base_url}/lol/summoner/v4/summoners/by-puuid/{puuid}"
     
-    summoner_result = make_riot_request(url)
+    summoner_result = riot_request(url)
     
     if summoner_result['success']:
         # Combine account and summoner data
@@ -229,7 +297,8 @@ def get_match_history(region, puuid):
     
     url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count={count}"
     
-    result = make_riot_request(url)
+    # History browsing yields to interactive last-game lookups when the rate budget is tight
+    result = riot_request(url, BULK)
     
     if result['success']:
         return jsonify(result)
@@ -238,72 +307,135 @@ def get_match_history(region, puuid):
 
 @app.route('/api/match/<region>/<match_id>')
 def get_match_details(region, match_id):
-    """Get detailed information about a specific match"""
+    """Get detailed information about a specific match (?view=summary|full or ?fields=a.b,c)"""
     if region not in REGIONAL_ROUTING:
         return jsonify({'success': False, 'error': 'Invalid region'}), 400
     
+    fields, shape, error = requested_shape(MATCH_VIEWS)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    # A finished match never changes, so its ETag is known before fetching anything
+    etag = f"{match_id}.{shape}"
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag, immutable=True)
+    
     routing_region = REGIONAL_ROUTING[region]
     url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
     
-    result = make_riot_request(url)
+    result = riot_request(url)
     
     if result['success']:
-        return jsonify(result)
+        return json_response({'success': True, 'data': project(result['data'], fields)}, etag=etag, immutable=True)
     else:
         return jsonify(result), 400
 
+def as_step(result):
+    """Riot result as a pipeline step outcome: (result, HTTP status for the client)"""
+    return result, 200 if result['success'] else 400
+
+def fetch_last_match(puuid, region, cancelled):
+    """Match ids, then details of the most recent one; stops early if the request was abandoned"""
+    routing_region = REGIONAL_ROUTING[region]
+    matches_url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count=1"
+    
+    matches_result, status = as_step(riot_request(matches_url, cancelled=cancelled))
+    if status != 200:
+        return matches_result, status
+    
+    match_ids = matches_result['data']
+    if not match_ids:
+        return {'success': False, 'error': 'No recent matches found for this summoner.'}, 404
+    
+    if cancelled.is_set():
+        return {'success': False, 'error': 'Request cancelled'}, 499
+    
+    match_url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/{match_ids[0]}"
+    return as_step(riot_request(match_url, cancelled=cancelled))
+
+def run_steps(steps, deadline):
+    """
+    Run {name: step(cancelled) -> (result, status)} on the fan-out pool and wait for all of
+    them until `deadline`. Returns ({name: result}, None) on success, or (None, (error result,
+    status)) as soon as one step fails or time runs out. Steps not started yet are cancelled;
+    running ones get `cancelled` set, which riot_request checks before every upstream call.
+    """
+    cancelled = threading.Event()
+    futures = {fanout_pool.submit(step, cancelled): name for name, step in steps.items()}
+    
+    results = {}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                print(f"   Error: Deadline exceeded waiting for {sorted(futures[f] for f in pending)}")
+                return None, ({'success': False, 'error': 'Request timed out. Please try again.'}, 504)
+            for future in done:
+                result, status = future.result()
+                if status != 200:
+                    return None, (result, status)
+                results[futures[future]] = result
+        return results, None
+    finally:
+        if pending:
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+
 @app.route('/api/last-game/<region>/<riot_id>')
 def get_last_game(region, riot_id):
-    """Get complete information about a summoner's last game using Riot ID"""
+    """Get complete information about a summoner's last game using Riot ID (?view=summary|full or ?fields=a.b,c)"""
     if region not in REGIONAL_ENDPOINTS:
         return jsonify({'success': False, 'error': 'Invalid region'}), 400
     
+    fields, _, error = requested_shape(LAST_GAME_VIEWS)
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    
     # Parse the Riot ID
     game_name, tag_line = parse_riot_id(riot_id)
     
+    # Concurrent lookups of the same player share one pipeline run
+    key = (region, game_name.lower(), (tag_line or '').lower())
+    response_data, status = last_game_flights.do(key, lambda: build_last_game(region, game_name, tag_line))
+    if status != 200:
+        return jsonify(response_data), status
+    
+    # The pipeline result is shared between coalesced callers, so project into a new object
+    return json_response({'success': True, 'data': project(response_data['data'], fields)})
+
+def build_last_game(region, game_name, tag_line):
+    """Run the last-game pipeline; returns (response body, status)"""
+    deadline = time.monotonic() + LAST_GAME_DEADLINE
+    
     # Step 1: Get account info (PUUID) using Riot ID
-    account_result = get_puuid_by_riot_id(game_name, tag_line, region)
-    if not account_result['success']:
-        return jsonify(account_result), 400
+    account_result, status = as_step(get_puuid_by_riot_id(game_name, tag_line, region))
+    if status != 200:
+        return account_result, status
     
     account_data = account_result['data']
     puuid = account_data.get('puuid')
     
     if not puuid:
-        return jsonify({'success': False, 'error': 'PUUID not found in account data'}), 400
+        return {'success': False, 'error': 'PUUID not found in account data'}, 400
     
-    # Step 2: Get summoner info using PUUID
+    # Step 2: Summoner info and the match id -> match details chain only need the PUUID,
+    # so run them at the same time
     base_url = REGIONAL_ENDPOINTS[region]
     summoner_url = f"{base_url}/lol/summoner/v4/summoners/by-puuid/{puuid}"
     
-    summoner_result = make_riot_request(summoner_url)
-    if not summoner_result['success']:
-        return jsonify(summoner_result), 400
-    
-    summoner_data = summoner_result['data']
-    
-    # Step 3: Get match history
-    routing_region = REGIONAL_ROUTING[region]
-    matches_url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids?count=1"
-    
-    matches_result = make_riot_request(matches_url)
-    if not matches_result['success']:
-        return jsonify(matches_result), 400
-    
-    match_ids = matches_result['data']
-    if not match_ids:
-        return jsonify({'success': False, 'error': 'No recent matches found for this summoner.'}), 404
-    
-    # Step 4: Get match details
-    match_url = f"https://{routing_region}.api.riotgames.com/lol/match/v5/matches/{match_ids[0]}"
-    
-    match_result = make_riot_request(match_url)
-    if not match_result['success']:
-        return jsonify(match_result), 400
+    results, error = run_steps({
+        'summoner': lambda cancelled: as_step(riot_request(summoner_url, cancelled=cancelled)),
+        'match': lambda cancelled: fetch_last_match(puuid, region, cancelled),
+    }, deadline)
+    if error:
+        return error
     
-    match_data = match_result['data']
+    summoner_data = results['summoner']['data']
+    match_data = results['match']['data']
     
-    # Step 5: Find the participant
+    # Step 3: Find the participant
     participant = None
     for p in match_data['info']['participants']:
         if p['puuid'] == puuid:
@@ -311,7 +443,7 @@ def get_last_game(region, riot_id):
             break
     
     if not participant:
-        return jsonify({'success': False, 'error': 'Player not found in match data.'}), 500
+        return {'success': False, 'error': 'Player not found in match data.'}, 500
     
     # Calculate time ago for the last game
     game_end_timestamp = match_data['info']['gameEndTimestamp']
@@ -329,7 +461,7 @@ def get_last_game(region, riot_id):
         }
     }
     
-    return jsonify(response_data)
+    return response_data, 200
 
 @app.route('/health')
 def health_check():
@@ -338,7 +470,14 @@ def health_check():
         'success': True,
         'data': {
             'status': 'healthy', 
-            'api_key_configured': bool(RIOT_API_KEY)
+            'api_key_configured': bool(RIOT_API_KEY),
+            'riot_client': riot_client.stats(),
+            'cache': riot_cache.stats(),
+            'rate_governor': rate_governor.stats(),
+            'coalescing': {
+                'upstream': upstream_flights.stats(),
+                'last_game': last_game_flights.stats()
+            }
         }
     })
 
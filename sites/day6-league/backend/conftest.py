@@ -0,0 +1,54 @@
+import importlib
+import sys
+
+import pytest
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload
+        self.headers = {}
+        self.text = '' if payload is None else str(payload)
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def league(tmp_path, monkeypatch):
+    """A fresh import of app.py with its cache in a temporary directory and no real Riot calls"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('RIOT_API_KEY', 'RGAPI-test')
+    monkeypatch.setenv('RIOT_CACHE_DIR', str(tmp_path / 'cache'))
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    module.app.config['TESTING'] = True
+    yield module
+    module.fanout_pool.shutdown(wait=True)
+    module.riot_cache.close()
+    module.riot_client.close()
+    sys.modules.pop('app', None)
+
+
+@pytest.fixture
+def riot(league, monkeypatch):
+    """Routes Riot calls to `riot.routes` ({url substring: payload or callable}); unknown URLs get a 404"""
+
+    class Riot:
+        routes = {}
+        calls = []
+
+        def get(self, url, priority=0):
+            self.calls.append((url, priority))
+            for fragment, payload in self.routes.items():
+                if fragment in url:
+                    if callable(payload):
+                        payload = payload()
+                    return FakeResponse(200, payload)
+            return FakeResponse(404)
+
+    fake = Riot()
+    fake.routes, fake.calls = {}, []
+    monkeypatch.setattr(league.riot_client, 'get', fake.get)
+    return fake
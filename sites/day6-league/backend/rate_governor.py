@@ -0,0 +1,228 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Lower numbers go first
+INTERACTIVE = 0
+BULK = 1
+
+# Riot applies method limits per endpoint; map URLs onto those endpoints
+METHOD_PATTERNS = [
+    (re.compile(r'/riot/account/v1/accounts/by-riot-id/'), 'account-v1.by-riot-id'),
+    (re.compile(r'/lol/summoner/v4/summoners/by-puuid/'), 'summoner-v4.by-puuid'),
+    (re.compile(r'/lol/summoner/v4/summoners/by-name/'), 'summoner-v4.by-name'),
+    (re.compile(r'/lol/match/v5/matches/by-puuid/[^/]+/ids'), 'match-v5.ids'),
+    (re.compile(r'/lol/match/v5/matches/[^/?]+$'), 'match-v5.match'),
+]
+
+
+class RateBudgetExceeded(Exception):
+    """The request couldn't be sent within the governor's maximum wait"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Riot rate limit budget exhausted, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def method_of(url):
+    path = urlsplit(url).path
+    for pattern, name in METHOD_PATTERNS:
+        if pattern.search(path):
+            return name
+    return path
+
+
+def parse_limits(header):
+    """'20:1,100:120' -> [(20, 1.0), (100, 120.0)]"""
+    limits = []
+    for part in (header or '').split(','):
+        count, _, window = part.strip().partition(':')
+        if count.isdigit() and window.isdigit():
+            limits.append((int(count), float(window)))
+    return limits
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date), or None if it's missing or invalid"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until one token is available"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def sync(self, used, now):
+        """Trust Riot's count for this window when it says we have less left than we think"""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(self.limit - used))
+
+
+class RateGovernor:
+    """Client-side pacing for the Riot API, driven by its rate limit headers.
+
+    Keeps token buckets per routing host for the application limits
+    (X-App-Rate-Limit) and per host and endpoint for the method limits
+    (X-Method-Rate-Limit), synced to the *-Count headers on every response.
+    A 429's Retry-After (seconds or an HTTP date) blocks the limited scope
+    until it passes; without a usable one, for the window of its exhausted
+    bucket.
+
+    `acquire()` waits until every bucket the request touches has a token.
+    Waiters for a host are served in priority order (INTERACTIVE before
+    BULK, then first come first served), except that a waiter whose
+    buckets have tokens doesn't wait behind earlier ones that are held up
+    by their own method limit or a 429. A request that would have to wait
+    longer than `max_wait` raises RateBudgetExceeded without being sent.
+    """
+
+    def __init__(self, max_wait=5.0, default_app_limits='20:1,100:120'):
+        self.max_wait = max_wait
+        self.default_app_limits = parse_limits(default_app_limits)
+        self._cond = threading.Condition()
+        self._buckets = {}        # (host, method or None) -> [TokenBucket]
+        self._blocked_until = {}  # (host, method or None) -> monotonic time
+        self._waiters = {}        # host -> heap of (priority, seq, scopes)
+        self._seq = itertools.count()
+        self.sent = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+        self.throttled_429 = 0
+
+    def _scopes(self, host, method):
+        if (host, None) not in self._buckets:
+            self._buckets[(host, None)] = [TokenBucket(n, w) for n, w in self.default_app_limits]
+        return [(host, None), (host, method)]
+
+    def _delay(self, scopes, now):
+        delay = 0.0
+        for scope in scopes:
+            delay = max(delay, self._blocked_until.get(scope, 0) - now)
+            for bucket in self._buckets.get(scope, ()):
+                delay = max(delay, bucket.delay(now))
+        return delay
+
+    def acquire(self, url, priority=INTERACTIVE):
+        parts = urlsplit(url)
+        host, method = parts.hostname, method_of(url)
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._cond:
+            scopes = self._scopes(host, method)
+            waiters = self._waiters.setdefault(host, [])
+            ticket = (priority, next(self._seq), scopes)
+            heapq.heappush(waiters, ticket)
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    # Earlier waiters only go first if they could be sent now
+                    ahead = any(other[:2] < ticket[:2] and self._delay(other[2], now) <= 0 for other in waiters)
+                    if not ahead:
+                        delay = self._delay(scopes, now)
+                        if delay <= 0:
+                            for scope in scopes:
+                                for bucket in self._buckets.get(scope, ()):
+                                    bucket.take()
+                            self.sent += 1
+                            if waited:
+                                self.wait_seconds += now - started
+                            return
+                        if now + delay > deadline:
+                            self.rejected += 1
+                            raise RateBudgetExceeded(delay)
+                    else:
+                        # Behind a higher-priority or earlier request that can go; woken when it does
+                        delay = deadline - now
+                        if delay <= 0:
+                            self.rejected += 1
+                            raise RateBudgetExceeded(self._delay(scopes, now))
+                    if not waited:
+                        waited = True
+                        self.queued += 1
+                    self._cond.wait(delay)
+            finally:
+                waiters.remove(ticket)
+                heapq.heapify(waiters)
+                self._cond.notify_all()
+
+    def update(self, url, response):
+        """Sync the buckets to the rate limit headers of a Riot response"""
+        parts = urlsplit(url)
+        host, method = parts.hostname, method_of(url)
+        headers = response.headers
+        now = time.monotonic()
+        with self._cond:
+            for scope, limit_header, count_header in (
+                ((host, None), 'X-App-Rate-Limit', 'X-App-Rate-Limit-Count'),
+                ((host, method), 'X-Method-Rate-Limit', 'X-Method-Rate-Limit-Count'),
+            ):
+                limits = parse_limits(headers.get(limit_header))
+                if not limits:
+                    continue
+                buckets = self._buckets.get(scope)
+                if buckets is None or [(b.limit, b.window) for b in buckets] != limits:
+                    buckets = self._buckets[scope] = [TokenBucket(n, w) for n, w in limits]
+                used = dict((w, n) for n, w in parse_limits(headers.get(count_header)))
+                for bucket in buckets:
+                    if bucket.window in used:
+                        bucket.sync(used[bucket.window], now)
+            if response.status_code == 429:
+                self.throttled_429 += 1
+                # application limits cover the whole host; method and service limits one endpoint
+                scope = (host, None) if headers.get('X-Rate-Limit-Type') == 'application' else (host, method)
+                retry_after = parse_retry_after(headers.get('Retry-After'))
+                if retry_after is None:
+                    retry_after = self._window(scope, now)
+                self._blocked_until[scope] = max(self._blocked_until.get(scope, 0), now + retry_after)
+            self._cond.notify_all()
+
+    def _window(self, scope, now):
+        """Fallback block for a 429 without Retry-After: the shortest window of an exhausted bucket"""
+        buckets = self._buckets.get(scope, ())
+        exhausted = [b.window for b in buckets if b.delay(now) > 0]
+        windows = exhausted or [b.window for b in buckets]
+        return min(windows) if windows else 1.0
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'queued': self.queued,
+            'wait_seconds': round(self.wait_seconds, 3),
+            'rejected': self.rejected,
+            'throttled_429': self.throttled_429,
+        }
@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:  # optional; json.dumps below is the fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+MAX_FIELDS = 100
+
+# A None leaf means "the whole value"
+WHOLE = None
+
+
+def field_tree(paths):
+    """['match.info.gameMode', 'participant'] -> {'match': {'info': {'gameMode': None}}, 'participant': None}"""
+    tree = {}
+    for path in paths:
+        node = tree
+        parts = [p for p in path.strip().split('.') if p]
+        for i, part in enumerate(parts):
+            if i == len(parts) - 1:
+                node[part] = WHOLE
+            elif node.get(part, {}) is WHOLE:
+                # A shorter path already selects all of this
+                break
+            else:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def project(value, tree):
+    """Keep only the fields in `tree`; lists are projected item by item"""
+    if tree is WHOLE:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+    return value
+
+
+PARTICIPANT_SUMMARY = [
+    'riotIdGameName', 'riotIdTagline', 'puuid', 'teamId', 'teamPosition', 'championName', 'champLevel',
+    'win', 'kills', 'deaths', 'assists', 'totalMinionsKilled', 'neutralMinionsKilled', 'goldEarned',
+    'totalDamageDealtToChampions', 'visionScore', 'summoner1Id', 'summoner2Id',
+    'item0', 'item1', 'item2', 'item3', 'item4', 'item5', 'item6',
+]
+
+MATCH_SUMMARY = [
+    'metadata.matchId',
+    'info.gameMode', 'info.queueId', 'info.gameDuration', 'info.gameCreation', 'info.gameEndTimestamp',
+    'info.gameVersion', 'info.mapId', 'info.platformId',
+] + [f'info.participants.{name}' for name in PARTICIPANT_SUMMARY]
+
+# Named views per endpoint; 'full' is the unmodified Riot payload
+MATCH_VIEWS = {
+    'full': WHOLE,
+    'summary': field_tree(MATCH_SUMMARY),
+}
+
+LAST_GAME_VIEWS = {
+    'full': WHOLE,
+    'summary': field_tree(
+        ['account.puuid', 'account.gameName', 'account.tagLine',
+         'summoner.profileIconId', 'summoner.summonerLevel',
+         'timeAgo']
+        + [f'match.{path}' for path in MATCH_SUMMARY]
+        + [f'participant.{name}' for name in PARTICIPANT_SUMMARY]
+    ),
+}
+
+
+def requested_shape(views):
+    """
+    Read ?fields=a.b,c or ?view=name from the request.
+    Returns (tree, tag, error): `tag` identifies the shape in ETags.
+    """
+    fields = request.args.get('fields')
+    if fields:
+        paths = sorted({p.strip() for p in fields.split(',') if p.strip()})
+        if len(paths) > MAX_FIELDS:
+            return None, None, f'At most {MAX_FIELDS} fields can be requested'
+        tag = 'f' + hashlib.md5(','.join(paths).encode('utf-8')).hexdigest()[:12]
+        return field_tree(paths), tag, None
+    view = request.args.get('view', 'full')
+    if view not in views:
+        return None, None, f"Unknown view '{view}', expected one of: {', '.join(views)}"
+    return views[view], view, None
+
+
+def encode_json(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def not_modified(etag, immutable=False):
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def json_response(payload, status=200, etag=None, immutable=False):
+    """
+    Compact JSON response, compressed with brotli or gzip when the client
+    accepts it. Without an explicit `etag`, one is derived from the body;
+    a matching If-None-Match gets a 304 with no body. ETags are weak: the
+    tag names the JSON document, and the gzip, br and identity bytes of it
+    differ.
+    """
+    body = encode_json(payload)
+    if etag is None:
+        etag = hashlib.md5(body).hexdigest()
+    if status == 200 and request.if_none_match.contains_weak(etag):
+        return not_modified(etag, immutable)
+
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.vary.add('Accept-Encoding')
+    if immutable:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    if len(body) >= COMPRESS_MIN_BYTES:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            response.set_data(brotli.compress(body, quality=5))
+            response.headers['Content-Encoding'] = 'br'
+        elif accepted['gzip']:
+            response.set_data(gzip.compress(body, compresslevel=5))
+            response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_governor import BULK, INTERACTIVE
+
+# Resource types, by Riot API path
+ACCOUNT_PATH = re.compile(r'/riot/account/v1/accounts/by-riot-id/')
+SUMMONER_PATH = re.compile(r'/lol/summoner/v4/summoners/')
+MATCH_IDS_PATH = re.compile(r'/lol/match/v5/matches/by-puuid/[^/]+/ids')
+MATCH_PATH = re.compile(r'/lol/match/v5/matches/([^/?]+)$')
+
+
+def classify(url):
+    """Return (resource type, cache key) for a Riot API URL, or (None, None) if it isn't cached"""
+    if ACCOUNT_PATH.search(url):
+        # Riot IDs are case-insensitive
+        return 'account', url.lower()
+    if SUMMONER_PATH.search(url):
+        return 'summoner', url
+    if MATCH_IDS_PATH.search(url):
+        return 'match_ids', url
+    match = MATCH_PATH.search(url)
+    if match:
+        return 'match', match.group(1)
+    return None, None
+
+
+class DiskLRU:
+    """JSON documents on disk, one file per key, evicting the least recently used past `max_entries`."""
+
+    def __init__(self, directory, max_entries=5000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Rebuild recency order from file mtimes, which get() refreshes
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                path = os.path.join(directory, name)
+                files.append((os.path.getmtime(path), name))
+        self._order = OrderedDict((name, None) for _, name in sorted(files))
+
+    def _name(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+
+    def get(self, key):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._order[name] = None
+            self._order.move_to_end(name)
+        return data
+
+    def set(self, key, data):
+        name = self._name(key)
+        path = os.path.join(self.directory, name)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        evicted = []
+        with self._lock:
+            self._order[name] = None
+            self._order.move_to_end(name)
+            while len(self._order) > self.max_entries:
+                evicted.append(self._order.popitem(last=False)[0])
+        for old in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._order)
+
+
+class RiotCache:
+    """Per-resource-type cache in front of make_riot_request.
+
+    - match details never change once a game is over: kept indefinitely in
+      a small in-memory LRU backed by a larger LRU on disk
+    - account (Riot ID -> PUUID) and summoner data: in memory for a short TTL
+    - match id lists: fresh for `match_ids_ttl`, then served stale for up to
+      `match_ids_stale` more seconds while a background refresh runs at
+      BULK priority, so it never delays an interactive Riot call. Refreshes
+      run on `refresh_workers` threads; when they are all busy, further
+      stale hits are served without scheduling one (counted as
+      `refresh_dropped`) and a later hit retries
+
+    Only successful results are cached.
+    """
+
+    def __init__(self, cache_dir, memory_entries=2000, match_memory_entries=200, match_disk_entries=5000,
+                 account_ttl=3600, summoner_ttl=300, match_ids_ttl=30, match_ids_stale=300,
+                 refresh_workers=2):
+        self.ttls = {'account': account_ttl, 'summoner': summoner_ttl, 'match_ids': match_ids_ttl}
+        self.match_ids_stale = match_ids_stale
+        self.memory_entries = memory_entries
+        self.match_memory_entries = match_memory_entries
+        self._entries = OrderedDict()   # (kind, key) -> (data, stored_at)
+        self._matches = OrderedDict()   # match id -> data
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.refresh_workers = refresh_workers
+        self._refresh_pool = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix='riot-cache-refresh')
+        self.disk = DiskLRU(os.path.join(cache_dir, 'matches'), match_disk_entries)
+        self.counts = {}
+
+    def _count(self, kind, outcome):
+        key = f"{kind}_{outcome}"
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _remember(self, store, key, value, limit):
+        with self._lock:
+            store[key] = value
+            store.move_to_end(key)
+            while len(store) > limit:
+                store.popitem(last=False)
+
+    def get(self, url, fetch, priority=INTERACTIVE):
+        """Return the cached result for `url`, calling `fetch(url, priority)` on a miss"""
+        kind, key = classify(url)
+        if kind is None:
+            return fetch(url, priority)
+        if kind == 'match':
+            return self._get_match(url, key, fetch, priority)
+
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                self._entries.move_to_end((kind, key))
+        if entry is not None:
+            data, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttls[kind]:
+                self._count(kind, 'hits')
+                return {'success': True, 'data': data}
+            if kind == 'match_ids' and age < self.ttls[kind] + self.match_ids_stale:
+                self._count(kind, 'stale')
+                self._revalidate(url, kind, key, fetch)
+                return {'success': True, 'data': data}
+
+        self._count(kind, 'misses')
+        result = fetch(url, priority)
+        if result['success']:
+            self._remember(self._entries, (kind, key), (result['data'], time.monotonic()), self.memory_entries)
+        return result
+
+    def _get_match(self, url, match_id, fetch, priority):
+        with self._lock:
+            data = self._matches.get(match_id)
+        if data is not None:
+            self._count('match', 'hits')
+            return {'success': True, 'data': data}
+        data = self.disk.get(match_id)
+        if data is not None:
+            self._count('match', 'disk_hits')
+            self._remember(self._matches, match_id, data, self.match_memory_entries)
+            return {'success': True, 'data': data}
+
+        self._count('match', 'misses')
+        result = fetch(url, priority)
+        if result['success']:
+            self._remember(self._matches, match_id, result['data'], self.match_memory_entries)
+            try:
+                self.disk.set(match_id, result['data'])
+            except OSError as e:
+                print(f"   Failed to write match {match_id} to the disk cache: {e}")
+        return result
+
+    def _revalidate(self, url, kind, key, fetch):
+        with self._lock:
+            if (kind, key) in self._refreshing:
+                return
+            # Every refresh thread is busy: don't queue work behind them
+            if len(self._refreshing) >= self.refresh_workers:
+                self.counts['refresh_dropped'] = self.counts.get('refresh_dropped', 0) + 1
+                return
+            self._refreshing.add((kind, key))
+
+        def refresh():
+            try:
+                result = fetch(url, BULK)
+                if result['success']:
+                    self._remember(self._entries, (kind, key), (result['data'], time.monotonic()),
+                                   self.memory_entries)
+            finally:
+                with self._lock:
+                    self._refreshing.discard((kind, key))
+
+        try:
+            self._refresh_pool.submit(refresh)
+        except RuntimeError:
+            # Shut down
+            with self._lock:
+                self._refreshing.discard((kind, key))
+
+    def close(self):
+        """Stop scheduling refreshes and wait for the running ones"""
+        self._refresh_pool.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            'entries': len(self._entries),
+            'matches_in_memory': len(self._matches),
+            'matches_on_disk': len(self.disk),
+            **counts,
+        }
@@ -0,0 +1,98 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_governor import INTERACTIVE
+
+# Upstream failures worth retrying; 4xx (including 429) are returned to the caller as-is
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class RiotClient:
+    """Pooled keep-alive HTTP client for the Riot API.
+
+    Keeps one requests.Session per host (americas, europe, asia, sea and the
+    platform hosts such as na1), so repeat calls to a host reuse warm TCP/TLS
+    connections instead of handshaking every time. Timeouts, connection
+    errors and 5xx responses are retried with exponential backoff and full
+    jitter; responses are requested gzip-compressed. With a `governor`
+    (see rate_governor.py), every attempt waits for rate limit budget first.
+    """
+
+    def __init__(self, api_key, pool_size=10, timeout=10, max_retries=2, backoff=0.25, governor=None):
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.governor = governor
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+
+    def session(self, host):
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    # One host per session, so a single pool sized for the number of concurrent callers
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        'X-Riot-Token': self.api_key,
+                        'Accept-Encoding': 'gzip, deflate',
+                        'Connection': 'keep-alive',
+                    })
+                    self._sessions[host] = session
+        return session
+
+    def get(self, url, priority=INTERACTIVE):
+        """
+        GET `url` through the host's pooled session, retrying transient failures.
+        Raises RateBudgetExceeded if the governor can't fit the request in time.
+        """
+        session = self.session(urlsplit(url).hostname)
+        attempt = 0
+        while True:
+            if self.governor is not None:
+                self.governor.acquire(url, priority)
+            self.requests += 1
+            try:
+                response = session.get(url, timeout=self.timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(e).__name__
+            else:
+                if self.governor is not None:
+                    self.governor.update(url, response)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                reason = f"status {response.status_code}"
+                response.close()
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+            attempt += 1
+            self.retries += 1
+            print(f"   Retry {attempt}/{self.max_retries} in {delay:.2f}s after {reason}")
+            time.sleep(delay)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def stats(self):
+        return {
+            'hosts': sorted(self._sessions),
+            'requests': self.requests,
+            'retries': self.retries,
+        }
@@ -0,0 +1,108 @@
+import threading
+
+from rate_governor import BULK, INTERACTIVE
+
+PUUID = 'puuid-1'
+MATCH = {
+    'metadata': {'matchId': 'NA1_9'},
+    'info': {
+        'gameMode': 'CLASSIC',
+        'gameEndTimestamp': 1_700_000_000_000,
+        'participants': [{'puuid': 'other', 'championName': 'Jinx'}, {'puuid': PUUID, 'championName': 'Ahri'}],
+    },
+}
+
+
+def route_player(riot, summoner=None, match_ids=None):
+    riot.routes.update({
+        '/by-riot-id/Faker/KR1': {'puuid': PUUID, 'gameName': 'Faker', 'tagLine': 'KR1'},
+        f'/summoners/by-puuid/{PUUID}': summoner or {'summonerLevel': 500},
+        f'/by-puuid/{PUUID}/ids': ['NA1_9'] if match_ids is None else match_ids,
+        '/matches/NA1_9': MATCH,
+    })
+
+
+def test_last_game_runs_summoner_and_match_lookups_concurrently(league, riot):
+    # Each of these only returns once the other has started, so a sequential pipeline would time out
+    both_started = threading.Barrier(2, timeout=2)
+
+    def wait_for_the_other(payload):
+        def respond():
+            both_started.wait()
+            return payload
+        return respond
+
+    route_player(riot, summoner=wait_for_the_other({'summonerLevel': 500}),
+                 match_ids=wait_for_the_other(['NA1_9']))
+    response = league.app.test_client().get('/api/last-game/na1/Faker%23KR1')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['participant']['championName'] == 'Ahri'
+    assert data['summoner'] == {'summonerLevel': 500}
+
+
+def test_last_game_summary_view(league, riot):
+    route_player(riot)
+    response = league.app.test_client().get('/api/last-game/na1/Faker%23KR1?view=summary')
+    data = response.get_json()['data']
+    assert data['match']['info'] == {'gameMode': 'CLASSIC', 'gameEndTimestamp': 1_700_000_000_000,
+                                     'participants': [{'puuid': 'other', 'championName': 'Jinx'},
+                                                      {'puuid': PUUID, 'championName': 'Ahri'}]}
+    assert data['participant'] == {'puuid': PUUID, 'championName': 'Ahri'}
+
+
+def test_failed_step_stops_the_pipeline(league, riot):
+    route_player(riot, match_ids=[])
+    response = league.app.test_client().get('/api/last-game/na1/Faker%23KR1')
+    assert response.status_code == 404
+    assert not any('/matches/NA1_9' in url for url, _ in riot.calls)
+
+
+def test_cancelled_steps_make_no_further_riot_calls(league, riot):
+    route_player(riot)
+    cancelled = threading.Event()
+    url = f'https://americas.api.riotgames.com/lol/match/v5/matches/by-puuid/{PUUID}/ids?count=1'
+    assert league.riot_request(url, cancelled=cancelled)['success'] is True
+    cancelled.set()
+    # Cached results are still served, but nothing new goes upstream
+    assert league.riot_request(url, cancelled=cancelled)['success'] is True
+    assert league.riot_request(url.replace('count=1', 'count=5'), cancelled=cancelled)['success'] is False
+    result = league.fetch_last_match(PUUID, 'na1', cancelled)
+    assert result == ({'success': False, 'error': 'Request cancelled'}, 499)
+    assert [u for u, _ in riot.calls] == [url]
+
+
+def test_unknown_player(league, riot):
+    response = league.app.test_client().get('/api/last-game/na1/Nobody%23NA1')
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_match_details_are_cached_and_revalidated_by_etag(league, riot):
+    route_player(riot)
+    client = league.app.test_client()
+    response = client.get('/api/match/na1/NA1_9?view=summary')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    revalidated = client.get('/api/match/na1/NA1_9?view=summary', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert 'Accept-Encoding' in revalidated.headers['Vary']
+    client.get('/api/match/na1/NA1_9')
+    assert [url for url, _ in riot.calls].count('https://americas.api.riotgames.com/lol/match/v5/matches/NA1_9') == 1
+
+
+def test_history_is_fetched_at_bulk_priority(league, riot):
+    route_player(riot)
+    client = league.app.test_client()
+    assert client.get(f'/api/matches/na1/{PUUID}?count=50').status_code == 200
+    [(url, priority)] = riot.calls
+    assert url.endswith('ids?count=20')
+    assert priority == BULK
+    client.get('/api/summoner/na1/Faker%23KR1')
+    assert {priority for _, priority in riot.calls[1:]} == {INTERACTIVE}
+
+
+def test_invalid_region(league):
+    assert league.app.test_client().get('/api/last-game/xx/Faker%23KR1').status_code == 400
@@ -0,0 +1,115 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+
+from rate_governor import (
+    BULK, INTERACTIVE, RateBudgetExceeded, RateGovernor, method_of, parse_limits, parse_retry_after
+)
+
+ACCOUNT_URL = 'https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id/a/b'
+MATCH_URL = 'https://americas.api.riotgames.com/lol/match/v5/matches/NA1_1'
+
+
+class Response:
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_parse_limits_and_methods():
+    assert parse_limits('20:1,100:120') == [(20, 1.0), (100, 120.0)]
+    assert parse_limits('bogus, 5:10') == [(5, 10.0)]
+    assert parse_limits(None) == []
+    assert method_of(ACCOUNT_URL) == 'account-v1.by-riot-id'
+    assert method_of(MATCH_URL) == 'match-v5.match'
+
+
+def test_requests_past_the_budget_are_rejected_without_waiting():
+    governor = RateGovernor(max_wait=0.05, default_app_limits='2:10')
+    governor.acquire(ACCOUNT_URL)
+    governor.acquire(ACCOUNT_URL)
+    with pytest.raises(RateBudgetExceeded) as error:
+        governor.acquire(ACCOUNT_URL)
+    assert error.value.retry_after > 1
+    # Other hosts have their own application budget
+    governor.acquire('https://europe.api.riotgames.com/riot/account/v1/accounts/by-riot-id/a/b')
+    assert governor.stats()['rejected'] == 1
+
+
+def test_headers_sync_the_buckets():
+    governor = RateGovernor(max_wait=0.05, default_app_limits='100:1')
+    governor.update(ACCOUNT_URL, Response(headers={
+        'X-Method-Rate-Limit': '3:10',
+        'X-Method-Rate-Limit-Count': '3:10',
+    }))
+    with pytest.raises(RateBudgetExceeded):
+        governor.acquire(ACCOUNT_URL)
+    # A different endpoint on the same host isn't limited by that method's budget
+    governor.acquire(MATCH_URL)
+
+
+def test_429_blocks_the_limited_scope():
+    governor = RateGovernor(max_wait=0.05, default_app_limits='100:1')
+    governor.update(MATCH_URL, Response(429, {'Retry-After': '30', 'X-Rate-Limit-Type': 'application'}))
+    with pytest.raises(RateBudgetExceeded):
+        governor.acquire(ACCOUNT_URL)
+    assert governor.stats()['throttled_429'] == 1
+
+
+def test_interactive_requests_go_before_bulk():
+    governor = RateGovernor(max_wait=5, default_app_limits='20:1')
+    # Spend the budget so the next requests queue
+    for _ in range(20):
+        governor.acquire(ACCOUNT_URL)
+    order = []
+
+    def send(priority):
+        governor.acquire(ACCOUNT_URL, priority)
+        order.append(priority)
+
+    bulk = [threading.Thread(target=send, args=(BULK,)) for _ in range(3)]
+    for thread in bulk:
+        thread.start()
+    time.sleep(0.01)
+    interactive = threading.Thread(target=send, args=(INTERACTIVE,))
+    interactive.start()
+    for thread in bulk + [interactive]:
+        thread.join()
+    # The first bulk request may already hold the head when the interactive one arrives
+    assert order.index(INTERACTIVE) <= 1
+    assert governor.stats()['queued'] == 4
+
+
+def test_retry_after_forms():
+    assert parse_retry_after('30') == 30.0
+    assert 55 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_429_without_retry_after_blocks_for_the_bucket_window():
+    governor = RateGovernor(max_wait=5, default_app_limits='100:1')
+    governor.update(ACCOUNT_URL, Response(429, {
+        'X-Method-Rate-Limit': '3:10',
+        'X-Method-Rate-Limit-Count': '3:10',
+    }))
+    with pytest.raises(RateBudgetExceeded) as error:
+        governor.acquire(ACCOUNT_URL)
+    assert error.value.retry_after > 9
+
+
+def test_a_throttled_method_does_not_hold_up_other_methods():
+    governor = RateGovernor(max_wait=1, default_app_limits='100:1')
+    governor.update(ACCOUNT_URL, Response(429, {'Retry-After': '0.5'}))
+    blocked = threading.Thread(target=governor.acquire, args=(ACCOUNT_URL,))
+    blocked.start()
+    time.sleep(0.05)
+    # The account request is first in the host's queue but can't be sent yet
+    started = time.monotonic()
+    governor.acquire(MATCH_URL, BULK)
+    assert time.monotonic() - started < 0.2
+    blocked.join()
+    assert governor.stats()['sent'] == 2
@@ -0,0 +1,91 @@
+import gzip
+import json
+
+from flask import Flask
+
+import response_shaping
+from response_shaping import (
+    MATCH_VIEWS, field_tree, json_response, project, requested_shape
+)
+
+MATCH = {
+    'metadata': {'matchId': 'NA1_1', 'participants': ['a', 'b']},
+    'info': {
+        'gameMode': 'CLASSIC',
+        'gameDuration': 1800,
+        'participants': [
+            {'championName': 'Ahri', 'kills': 5, 'challenges': {'kda': 3.1}},
+            {'championName': 'Jinx', 'kills': 9, 'challenges': {'kda': 4.0}},
+        ],
+    },
+}
+
+app = Flask(__name__)
+
+
+def test_field_tree_keeps_the_broadest_path():
+    assert field_tree(['match.info.gameMode', 'participant']) == {
+        'match': {'info': {'gameMode': None}}, 'participant': None}
+    assert field_tree(['info', 'info.gameMode']) == {'info': None}
+    assert field_tree(['info.gameMode', 'info']) == {'info': None}
+
+
+def test_project_walks_lists():
+    projected = project(MATCH, field_tree(['metadata.matchId', 'info.participants.championName', 'info.missing']))
+    assert projected == {
+        'metadata': {'matchId': 'NA1_1'},
+        'info': {'participants': [{'championName': 'Ahri'}, {'championName': 'Jinx'}]},
+    }
+    assert project(MATCH, MATCH_VIEWS['full']) is MATCH
+
+
+def test_requested_shape():
+    with app.test_request_context('/?fields=info.gameMode, metadata.matchId,info.gameMode'):
+        tree, tag, error = requested_shape(MATCH_VIEWS)
+        assert error is None and tag.startswith('f')
+        assert tree == {'info': {'gameMode': None}, 'metadata': {'matchId': None}}
+    with app.test_request_context('/?fields=metadata.matchId,info.gameMode'):
+        # Same fields in another order share the ETag tag
+        assert requested_shape(MATCH_VIEWS)[1] == tag
+    with app.test_request_context('/?view=summary'):
+        assert requested_shape(MATCH_VIEWS)[1] == 'summary'
+    with app.test_request_context('/?view=everything'):
+        assert 'Unknown view' in requested_shape(MATCH_VIEWS)[2]
+    too_many = ','.join(f'f{i}' for i in range(response_shaping.MAX_FIELDS + 1))
+    with app.test_request_context(f'/?fields={too_many}'):
+        assert requested_shape(MATCH_VIEWS)[2] is not None
+
+
+def test_small_bodies_are_not_compressed_and_etags_match():
+    with app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+        response = json_response({'ok': True})
+        assert 'Content-Encoding' not in response.headers
+        assert json.loads(response.get_data()) == {'ok': True}
+        etag = response.headers['ETag']
+        # One tag covers the identity, gzip and br bytes of the body, so it's weak
+        assert etag.startswith('W/"')
+    with app.test_request_context('/', headers={'If-None-Match': etag}):
+        response = json_response({'ok': True})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+        assert response.headers['ETag'] == etag
+        assert 'Accept-Encoding' in response.headers['Vary']
+    # A strong form of the same tag matches too
+    with app.test_request_context('/', headers={'If-None-Match': etag[2:]}):
+        assert json_response({'ok': True}).status_code == 304
+
+
+def test_large_bodies_are_compressed(monkeypatch):
+    payload = {'participants': [MATCH['info']['participants'][0]] * 100}
+    monkeypatch.setattr(response_shaping, 'brotli', None)
+    with app.test_request_context('/', headers={'Accept-Encoding': 'gzip, br'}):
+        response = json_response(payload, immutable=True)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert 'immutable' in response.headers['Cache-Control']
+        assert json.loads(gzip.decompress(response.get_data())) == payload
+
+
+def test_encoding_without_orjson(monkeypatch):
+    monkeypatch.setattr(response_shaping, 'orjson', None)
+    assert response_shaping.encode_json({'name': 'Ahri', 'kda': 3.1}) == '{"name":"Ahri","kda":3.1}'.encode()
@@ -0,0 +1,108 @@
+import threading
+
+from rate_governor import BULK, INTERACTIVE
+from riot_cache import RiotCache, classify
+
+ACCOUNT_URL = 'https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id/Faker/KR1'
+MATCH_IDS_URL = 'https://asia.api.riotgames.com/lol/match/v5/matches/by-puuid/abc/ids?count=1'
+MATCH_URL = 'https://asia.api.riotgames.com/lol/match/v5/matches/KR_123'
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = []
+        self.done = threading.Event()
+
+    def __call__(self, url, priority):
+        self.calls.append((url, priority))
+        self.done.set()
+        return {'success': True, 'data': {'call': len(self.calls)}}
+
+
+def test_classify():
+    assert classify(ACCOUNT_URL) == ('account', ACCOUNT_URL.lower())
+    assert classify(MATCH_IDS_URL) == ('match_ids', MATCH_IDS_URL)
+    assert classify(MATCH_URL) == ('match', 'KR_123')
+    assert classify('https://na1.api.riotgames.com/lol/status/v4/platform-data') == (None, None)
+
+
+def test_hits_and_failed_results(tmp_path):
+    cache = RiotCache(str(tmp_path))
+    upstream = Upstream()
+    assert cache.get(ACCOUNT_URL, upstream)['data'] == {'call': 1}
+    assert cache.get(ACCOUNT_URL.replace('Faker', 'FAKER'), upstream)['data'] == {'call': 1}
+    assert upstream.calls == [(ACCOUNT_URL, INTERACTIVE)]
+
+    def failing(url, priority):
+        return {'success': False, 'error': 'nope'}
+
+    cache.get(MATCH_IDS_URL, failing)
+    assert cache.get(MATCH_IDS_URL, upstream)['data'] == {'call': 2}
+    assert cache.stats()['account_hits'] == 1
+
+
+def test_finished_matches_are_kept_on_disk(tmp_path):
+    upstream = Upstream()
+    RiotCache(str(tmp_path)).get(MATCH_URL, upstream, BULK)
+    assert upstream.calls == [(MATCH_URL, BULK)]
+
+    restarted = RiotCache(str(tmp_path))
+    assert restarted.get(MATCH_URL, upstream)['data'] == {'call': 1}
+    assert restarted.stats()['match_disk_hits'] == 1
+
+
+def test_stale_match_ids_are_refreshed_at_bulk_priority(tmp_path):
+    cache = RiotCache(str(tmp_path), match_ids_ttl=0, match_ids_stale=60)
+    upstream = Upstream()
+    cache.get(MATCH_IDS_URL, upstream)
+    upstream.done.clear()
+
+    # Served stale straight away; the refresh runs in the background
+    assert cache.get(MATCH_IDS_URL, upstream)['data'] == {'call': 1}
+    assert upstream.done.wait(2)
+    assert upstream.calls == [(MATCH_IDS_URL, INTERACTIVE), (MATCH_IDS_URL, BULK)]
+    assert cache.stats()['match_ids_stale'] == 1
+    cache.close()
+
+
+def test_refreshes_are_dropped_when_every_refresh_thread_is_busy(tmp_path):
+    cache = RiotCache(str(tmp_path), match_ids_ttl=0, match_ids_stale=60, refresh_workers=1)
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def upstream(url, priority):
+        calls.append((url, priority))
+        if priority == BULK:
+            started.set()
+            release.wait(2)
+        return {'success': True, 'data': url}
+
+    other_url = MATCH_IDS_URL.replace('abc', 'def')
+    cache.get(MATCH_IDS_URL, upstream)
+    cache.get(other_url, upstream)
+    cache.get(MATCH_IDS_URL, upstream)
+    assert started.wait(2)
+    # The only refresh thread is busy, so this stale hit doesn't queue another refresh
+    assert cache.get(other_url, upstream)['data'] == other_url
+    release.set()
+    cache.close()
+    assert calls.count((other_url, BULK)) == 0
+    assert cache.stats()['refresh_dropped'] == 1
+
+
+def test_counts_are_exact_under_concurrency(tmp_path):
+    cache = RiotCache(str(tmp_path))
+    upstream = Upstream()
+    cache.get(ACCOUNT_URL, upstream)
+
+    def read():
+        for _ in range(2000):
+            cache.get(ACCOUNT_URL, upstream)
+
+    threads = [threading.Thread(target=read) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()['account_hits'] == 8 * 2000
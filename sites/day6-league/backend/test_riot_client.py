@@ -0,0 +1,92 @@
+import pytest
+import requests
+
+import riot_client
+from rate_governor import BULK
+from riot_client import RiotClient
+
+URL = 'https://americas.api.riotgames.com/riot/account/v1/accounts/by-riot-id/a/b'
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, timeout):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(riot_client.time, 'sleep', lambda seconds: None)
+
+
+def client_with(outcomes, **kwargs):
+    client = RiotClient('RGAPI-test', **kwargs)
+    session = FakeSession(outcomes)
+    client._sessions['americas.api.riotgames.com'] = session
+    return client, session
+
+
+def test_one_session_per_host():
+    client = RiotClient('RGAPI-test')
+    first = client.session('americas.api.riotgames.com')
+    assert client.session('americas.api.riotgames.com') is first
+    assert client.session('na1.api.riotgames.com') is not first
+    assert first.headers['X-Riot-Token'] == 'RGAPI-test'
+    assert client.stats()['hosts'] == ['americas.api.riotgames.com', 'na1.api.riotgames.com']
+    client.close()
+    assert client.stats()['hosts'] == []
+
+
+def test_transient_failures_are_retried():
+    client, session = client_with([requests.exceptions.ConnectionError(), 503, 200], max_retries=2)
+    assert client.get(URL).status_code == 200
+    assert session.calls == 3
+    assert client.stats()['retries'] == 2
+
+
+def test_retries_are_bounded():
+    client, session = client_with([502, 502], max_retries=1)
+    assert client.get(URL).status_code == 502
+    client, session = client_with([requests.exceptions.Timeout()] * 2, max_retries=1)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get(URL)
+
+
+def test_client_errors_are_not_retried():
+    client, session = client_with([429])
+    assert client.get(URL).status_code == 429
+    assert session.calls == 1
+
+
+def test_every_attempt_goes_through_the_governor():
+    class Governor:
+        def __init__(self):
+            self.acquired, self.updated = [], 0
+
+        def acquire(self, url, priority):
+            self.acquired.append(priority)
+
+        def update(self, url, response):
+            self.updated += 1
+
+    governor = Governor()
+    client, _ = client_with([500, 200], governor=governor)
+    client.get(URL, BULK)
+    assert governor.acquired == [BULK, BULK]
+    assert governor.updated == 2
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_overlapping_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(2)
+        return {'data': 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do('key', fetch))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while flights.stats()['deduplicated'] < 4:
+        release.wait(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{'data': 42}] * 5
+    assert flights.stats() == {'executed': 1, 'deduplicated': 4, 'in_flight': 0}
+
+
+def test_errors_reach_every_waiter_and_are_not_kept():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(2)
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def call():
+        try:
+            flights.do('key', failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flights.stats()['deduplicated'] < 1:
+        release.wait(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+    assert len(errors) == 2
+
+    # The next call runs again
+    assert flights.do('key', lambda: 'ok') == 'ok'
+
+
+def test_different_keys_run_separately():
+    flights = SingleFlight()
+    assert flights.do('a', lambda: 1) == 1
+    assert flights.do('b', lambda: 2) == 2
+    with pytest.raises(ZeroDivisionError):
+        flights.do('c', lambda: 1 / 0)
+    assert flights.stats()['executed'] == 3
@@ -31,7 +31,7 @@ class RiotAPI {
     }
 
     async getLastGame(riotId, region) {
-        const url = `${this.backendUrl}/api/last-game/${region}/${encodeURIComponent(riotId)}`;
+        const url = `${this.backendUrl}/api/last-game/${region}/${encodeURIComponent(riotId)}?view=summary`;
         return await this.makeRequest(url);
     }
 
@@ -0,0 +1,158 @@
+import json
+import logging
+import random
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder below is the fallback
+    orjson = None
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def serialize(record: dict) -> str:
+    if orjson is not None:
+        return orjson.dumps(record).decode('utf-8')
+    return _encoder.encode(record)
+
+
+class AccessLogger:
+    """
+    Structured access log writer.
+
+    Records are serialized to one compact JSON line and handed to `logger`
+    (whose handler writes off the event loop). Redirects are logged for a
+    `redirect_sample_rate` fraction of requests; 0 turns them off, leaving
+    only a counter increment per redirect. The time spent in `log()` is
+    accumulated so the logging cost per request can be read from `stats()`.
+
+    `started_at` is the time.time() captured when the request arrived; the
+    record's timestamp is the request start, not the moment it was logged.
+    """
+
+    def __init__(self, logger: logging.Logger, redirect_sample_rate: float = 1.0, body_limit: int = 1024):
+        self.logger = logger
+        self.redirect_sample_rate = redirect_sample_rate
+        self.body_limit = body_limit
+        self.logged = 0
+        self.sampled_out = 0
+        self.cost_ns = 0
+
+    def sample_redirect(self) -> bool:
+        rate = self.redirect_sample_rate
+        if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return True
+        self.sampled_out += 1
+        return False
+
+    def log(self, started_at: float, client_ip: str, method: str, url: str, user_agent: str,
+            status_code: int, duration_ns: int, body: Optional[bytes] = None,
+            body_truncated: bool = False) -> None:
+        started = time.perf_counter_ns()
+        record = {
+            "timestamp": datetime.fromtimestamp(started_at).isoformat(),
+            "client_ip": client_ip,
+            "method": method,
+            "url": url,
+            "user_agent": user_agent,
+            "status_code": status_code,
+            "process_time_seconds": round(duration_ns / 1e9, 4),
+        }
+        if body:
+            record["request_body"] = body.decode('utf-8', 'replace')
+            if body_truncated:
+                record["request_body_truncated"] = True
+        self.logger.info(serialize(record))
+        self.logged += 1
+        self.cost_ns += time.perf_counter_ns() - started
+
+    def stats(self) -> dict:
+        return {
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "mean_cost_us": round(self.cost_ns / self.logged / 1000, 2) if self.logged else 0.0,
+        }
+
+
+def scope_header(scope, name: bytes, default: str = "unknown") -> str:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode('latin-1')
+    return default
+
+
+def scope_url(scope) -> str:
+    host = scope_header(scope, b"host", "")
+    url = f"{scope.get('scheme', 'http')}://{host}{scope.get('root_path', '')}{scope['path']}"
+    if scope.get("query_string"):
+        url += "?" + scope["query_string"].decode('latin-1')
+    return url
+
+
+class AccessLogMiddleware:
+    """
+    Pure ASGI access-log middleware.
+
+    Times each request with perf_counter_ns and logs it once the response has
+    been sent. For POST/PUT/PATCH it keeps a copy of at most `body_limit`
+    bytes of the body as it streams through to the app, so large bodies are
+    never buffered just to be logged. `observer(scope, status, duration_ns)`
+    is called for every request as well, for metrics.
+    """
+
+    def __init__(self, app, access_log: AccessLogger, observer: Optional[Callable] = None):
+        self.app = app
+        self.access_log = access_log
+        self.observer = observer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started_at = time.time()
+        started = time.perf_counter_ns()
+        status_code = 500
+        limit = self.access_log.body_limit
+        captured = bytearray()
+        truncated = False
+
+        async def capture_receive():
+            nonlocal truncated
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                room = limit - len(captured)
+                if room > 0:
+                    captured.extend(chunk[:room])
+                if len(chunk) > room:
+                    truncated = True
+            return message
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        wants_body = limit > 0 and scope["method"] in ("POST", "PUT", "PATCH")
+        try:
+            await self.app(scope, capture_receive if wants_body else receive, capture_send)
+        finally:
+            duration_ns = time.perf_counter_ns() - started
+            if self.observer is not None:
+                self.observer(scope, status_code, duration_ns)
+            client = scope.get("client")
+            self.access_log.log(
+                started_at,
+                client[0] if client else "unknown",
+                scope["method"],
+                scope_url(scope),
+                scope_header(scope, b"user-agent"),
+                status_code,
+                duration_ns,
+                bytes(captured) if captured else None,
+                truncated,
+            )
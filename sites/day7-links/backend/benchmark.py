@@ -0,0 +1,382 @@
+"""Load benchmark for the links backend.
+
+For each store size, pre-populates a scratch data directory, starts main.py
+against it and drives a mixed create/redirect workload, either in-process
+(ASGI calls on one event loop, no sockets) or over HTTP against uvicorn.
+Startup time, peak RSS, throughput and latency percentiles per operation
+are written to a JSON file so runs can be compared between commits.
+
+    python benchmark.py --sizes 10000,1000000 --mode inprocess --duration 10
+    python benchmark.py --mode uvicorn --workers 4 --backend sqlite --concurrency 64
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def populate(workdir, size, backend):
+    """Write `size` mappings (k0..kN-1) to workdir/data in the store's on-disk format"""
+    from link_store import LinkStore
+    from shared_link_store import SharedLinkStore
+
+    data_dir = os.path.join(workdir, "data")
+    store = LinkStore(data_dir)
+    store.load()
+    batch = []
+    for i in range(size):
+        key = f"k{i}"
+        url = f"https://example.com/articles/{i}?utm_source=bench"
+        store.reserve(key, url)
+        batch.append((key, url))
+        if len(batch) >= 10000:
+            store.append_many(batch)
+            batch = []
+    store.append_many(batch)
+    store.compact()
+    store.close()
+    if backend == "sqlite":
+        shared = SharedLinkStore(os.path.join(data_dir, "links.db"))
+        shared.load(seed=LinkStore(data_dir))
+        shared.close()
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(latencies, statuses, elapsed):
+    latencies.sort()
+    report = {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+    }
+    if latencies:
+        report["latency_ms"] = {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "p999": round(percentile(latencies, 0.999) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3),
+        }
+    return report
+
+
+class Workload:
+    """Picks the next request: a create with unique short path, a redirect to a known key, or a miss"""
+
+    def __init__(self, size, create_ratio, miss_ratio, prefix):
+        self.size = size
+        self.create_ratio = create_ratio
+        self.miss_ratio = miss_ratio
+        self.prefix = prefix
+        self.created = 0
+        self.rng = random.Random()
+
+    def next(self):
+        roll = self.rng.random()
+        if roll < self.create_ratio:
+            self.created += 1
+            short_path = f"{self.prefix}-{self.created}"
+            body = json.dumps({"long_url": f"https://example.com/new/{short_path}", "short_path": short_path})
+            return "create", "POST", "/shorten", body.encode("utf-8")
+        if roll < self.create_ratio + self.miss_ratio or self.size == 0:
+            return "redirect", "GET", f"/missing-{self.rng.randrange(1 << 30)}", b""
+        return "redirect", "GET", f"/k{self.rng.randrange(self.size)}", b""
+
+
+def new_results():
+    return {"create": ([], {}), "redirect": ([], {})}
+
+
+def merge_results(results, local):
+    for name, (latencies, statuses) in local.items():
+        results[name][0].extend(latencies)
+        for status, n in statuses.items():
+            results[name][1][status] = results[name][1].get(status, 0) + n
+
+
+# In-process mode: runs in a child process so each store size starts from a clean interpreter
+
+async def asgi_request(app, method, path, body):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench.local"),
+            (b"user-agent", b"links-benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench.local", 80),
+    }
+    status = None
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_inprocess_load(app, args, size):
+    inbox, outbox = asyncio.Queue(), asyncio.Queue()
+    lifespan = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, inbox.get, outbox.put))
+    await inbox.put({"type": "lifespan.startup"})
+    message = await outbox.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"App failed to start: {message}")
+
+    results = new_results()
+    deadline = time.perf_counter() + args.duration
+
+    async def client(n):
+        local = new_results()
+        workload = Workload(size, args.create_ratio, args.miss_ratio, f"bench-{os.getpid()}-{n}")
+        while time.perf_counter() < deadline:
+            name, method, path, body = workload.next()
+            started = time.perf_counter()
+            try:
+                status = await asgi_request(app, method, path, body)
+            except Exception:
+                status = "error"
+            latencies, statuses = local[name]
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+        merge_results(results, local)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    await inbox.put({"type": "lifespan.shutdown"})
+    await outbox.get()
+    await lifespan
+    return results, elapsed
+
+
+def inprocess_child(args):
+    """Entry point of the child process: import main (timing startup), then drive it"""
+    for item in args.env:
+        key, _, value = item.partition("=")
+        os.environ[key] = value
+    os.chdir(args.child)
+    started = time.perf_counter()
+    import main
+    startup = time.perf_counter() - started
+    size = len(main.link_store)
+    results, elapsed = asyncio.run(run_inprocess_load(main.app, args, size))
+    report = {name: summarize(latencies, statuses, elapsed) for name, (latencies, statuses) in results.items()}
+    json.dump({
+        "startup_s": round(startup, 4),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "elapsed_s": round(elapsed, 3),
+        "operations": report,
+        "store": main.link_store.stats(),
+    }, sys.stdout)
+
+
+def run_inprocess(workdir, args):
+    command = [sys.executable, os.path.abspath(__file__), "--child", workdir] + sys.argv[1:]
+    output = subprocess.run(command, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"In-process run failed:\n{output.stderr}")
+    return json.loads(output.stdout)
+
+
+# uvicorn mode: real sockets, optionally several worker processes
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss_mb(pid):
+    """Current RSS of `pid` and its descendants, from /proc (Linux only)"""
+    total_kb = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+    except OSError:
+        return None
+    return round(total_kb / 1024, 1)
+
+
+def run_http_load(port, args, size):
+    results = new_results()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(n):
+        local = new_results()
+        workload = Workload(size, args.create_ratio, args.miss_ratio, f"bench-{os.getpid()}-{n}")
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.perf_counter() < deadline:
+            name, method, path, body = workload.next()
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body or None, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                status = "error"
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            latencies, statuses = local[name]
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+        conn.close()
+        with lock:
+            merge_results(results, local)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started
+
+
+def run_uvicorn(workdir, args, size):
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    # A file rather than a pipe, so a chatty server can't block on a full pipe buffer
+    log = open(os.path.join(workdir, "uvicorn.log"), "w+")
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        # Startup ends when the app answers its first request
+        while True:
+            if server.poll() is not None:
+                log.seek(0)
+                raise RuntimeError(f"uvicorn exited:\n{log.read()}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/")
+                conn.getresponse().read()
+                conn.close()
+                break
+            except OSError:
+                time.sleep(0.01)
+        startup = time.perf_counter() - started
+        results, elapsed = run_http_load(port, args, size)
+        rss = process_tree_rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait(30)
+        log.close()
+    report = {name: summarize(latencies, statuses, elapsed) for name, (latencies, statuses) in results.items()}
+    return {"startup_s": round(startup, 4), "rss_mb": rss, "elapsed_s": round(elapsed, 3), "operations": report}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", help="comma-separated store sizes to pre-populate")
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn", "both"), default="inprocess")
+    parser.add_argument("--backend", choices=("local", "sqlite"), default="local", help="LINKS_STORE_BACKEND")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per run")
+    parser.add_argument("--create-ratio", type=float, default=0.05, help="fraction of requests that are creates")
+    parser.add_argument("--miss-ratio", type=float, default=0.05, help="fraction of redirects to unknown paths")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the app, e.g. LINKS_REDIRECT_LOG_SAMPLE_RATE=0")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.env.append(f"LINKS_STORE_BACKEND={args.backend}")
+
+    if args.child:
+        inprocess_child(args)
+        return
+
+    output = os.path.abspath(args.output)
+    modes = ("inprocess", "uvicorn") if args.mode == "both" else (args.mode,)
+    runs = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for mode in modes:
+            with tempfile.TemporaryDirectory(prefix="links-bench-") as workdir:
+                populate_started = time.perf_counter()
+                populate(workdir, size, args.backend)
+                populate_s = time.perf_counter() - populate_started
+                if mode == "inprocess":
+                    run = run_inprocess(workdir, args)
+                else:
+                    run = run_uvicorn(workdir, args, size)
+            run.update({"size": size, "mode": mode, "populate_s": round(populate_s, 3)})
+            runs.append(run)
+            for name, r in run["operations"].items():
+                lat = r.get("latency_ms", {})
+                print(f"{mode:9s} {size:>9d} {name:8s} {r['requests']:8d} req  {r['throughput_rps']:9.1f} req/s  "
+                      f"p50 {lat.get('p50')} ms  p99 {lat.get('p99')} ms  startup {run['startup_s']} s")
+
+    config = vars(args)
+    config.pop("child")
+    with open(output, "w") as f:
+        json.dump({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "config": config,
+            "runs": runs,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterator, Optional, Tuple
+
+# Rows are yielded as (row number, long_url, short_path, error)
+Row = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+# Longest line (and CSV record) accepted from an upload; longer rows are reported and skipped
+MAX_LINE_BYTES = 64 * 1024
+TOO_LONG = "Row is too long"
+
+
+async def iter_lines(stream: AsyncIterator[bytes], max_line: int = MAX_LINE_BYTES) -> AsyncIterator[Optional[str]]:
+    """
+    Split a streamed request body into lines without buffering the whole body.
+
+    Each chunk is searched for newlines once, so splitting stays linear in
+    the body size however the client chunks it. A line longer than
+    `max_line` bytes is not buffered: the rest of it is skipped up to the
+    next newline and None is yielded in its place so the parser can report
+    the row.
+    """
+    line = bytearray()
+    oversize = False
+    async for chunk in stream:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            if oversize or len(line) + end - start > max_line:
+                yield None
+            else:
+                line += chunk[start:end]
+                yield line.decode('utf-8', 'replace').rstrip('\r')
+            line.clear()
+            oversize = False
+            start = end + 1
+        if not oversize:
+            if len(line) + len(chunk) - start > max_line:
+                oversize = True
+                line.clear()
+            else:
+                line += chunk[start:]
+    if oversize:
+        yield None
+    elif line:
+        yield line.decode('utf-8', 'replace').rstrip('\r')
+
+
+async def parse_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Row]:
+    row = 0
+    async for line in lines:
+        if line is None:
+            row += 1
+            yield row, None, None, TOO_LONG
+            continue
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row, None, None, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield row, None, None, "Expected a JSON object"
+            continue
+        yield row, record.get("long_url"), record.get("short_path"), None
+
+
+async def parse_csv(lines: AsyncIterator[Optional[str]], max_record: int = MAX_LINE_BYTES) -> AsyncIterator[Row]:
+    """
+    CSV rows of long_url,short_path; a header row naming the columns may reorder them.
+
+    A quoted field may span lines: while a record has an odd number of
+    quote characters the next line is appended to it, up to `max_record`
+    characters.
+    """
+    row = 0
+    url_col, path_col = 0, 1
+    first = True
+    record: Optional[str] = None
+    quotes = 0
+    async for line in lines:
+        if line is None:
+            row += 1
+            record = None
+            yield row, None, None, TOO_LONG
+            continue
+        if record is None:
+            if not line.strip():
+                continue
+            record, quotes = line, line.count('"')
+        else:
+            record += "\n" + line
+            quotes += line.count('"')
+        if quotes % 2:
+            # Inside a quoted field that continues on the next line
+            if len(record) > max_record:
+                row += 1
+                record = None
+                yield row, None, None, TOO_LONG
+            continue
+        fields = next(csv.reader([record]))
+        record = None
+        if first:
+            first = False
+            names = [f.strip().lower() for f in fields]
+            if "long_url" in names and "short_path" in names:
+                url_col, path_col = names.index("long_url"), names.index("short_path")
+                continue
+        row += 1
+        if len(fields) <= max(url_col, path_col):
+            yield row, None, None, "Expected long_url and short_path columns"
+            continue
+        yield row, fields[url_col].strip(), fields[path_col].strip(), None
+    if record is not None:
+        yield row + 1, None, None, "Unterminated quoted field"
+
+
+def export_ndjson(items: Iterator[Tuple[str, str]], chunk_size: int = 1000) -> Iterator[bytes]:
+    chunk = []
+    for short_path, long_url in items:
+        chunk.append(json.dumps({"short_path": short_path, "long_url": long_url}, separators=(',', ':')))
+        if len(chunk) >= chunk_size:
+            yield ("\n".join(chunk) + "\n").encode('utf-8')
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode('utf-8')
+
+
+def export_csv(items: Iterator[Tuple[str, str]], chunk_size: int = 1000) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["short_path", "long_url"])
+    rows = 0
+    for item in items:
+        writer.writerow(item)
+        rows += 1
+        if rows >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
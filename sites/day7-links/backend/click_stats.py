@@ -0,0 +1,444 @@
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Cap on distinct referrers / user agents kept per link; the rest are counted as "other"
+MAX_BREAKDOWN_KEYS = 50
+
+
+def user_agent_family(user_agent: str) -> str:
+    """Collapse a user agent string into a small, bounded set of families"""
+    ua = user_agent.lower()
+    if not ua:
+        return "unknown"
+    if "bot" in ua or "spider" in ua or "crawl" in ua or "preview" in ua:
+        return "bot"
+    if "curl" in ua or "wget" in ua or "python" in ua or "httpie" in ua:
+        return "cli"
+    if "edg/" in ua:
+        return "edge"
+    if "firefox" in ua:
+        return "firefox"
+    if "chrome" in ua or "crios" in ua:
+        return "chrome"
+    if "safari" in ua:
+        return "safari"
+    return "other"
+
+
+def referrer_host(referrer: str) -> str:
+    if not referrer:
+        return "direct"
+    return urlsplit(referrer).hostname or "other"
+
+
+def _bump(counter: Counter, key: str, amount: int = 1) -> None:
+    if key in counter or len(counter) < MAX_BREAKDOWN_KEYS:
+        counter[key] += amount
+    else:
+        counter["other"] += amount
+
+
+class ClickStats:
+    """
+    Per-link click counters.
+
+    `record()` is called on the redirect path and only appends the link, the
+    time and the raw referer and user agent values to a bounded deque; when
+    `max_pending` clicks are waiting the click is dropped and counted instead.
+    A background thread drains the deque into the aggregates (totals,
+    optional per-minute buckets, referrer host and user agent family) every
+    `flush_interval` seconds. Readers only take the aggregation lock, never
+    the click path. Expired minute buckets are swept once a minute rather
+    than on every drain.
+
+    A flush appends one record per link that changed since the last flush to a journal for the current generation
+    (`path.<generation>.log`), so its cost follows the clicks rather than
+    the number of links. Once the journal holds more records than there are
+    links, everything is written to the JSON snapshot under the next
+    generation and the old journal is removed. load() reads the snapshot and
+    replays only its generation's journal, so a crash between the two steps
+    can't apply a journal twice.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, minute_buckets: int = 0,
+                 max_pending: int = 100_000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.minute_buckets = minute_buckets
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._pending: deque = deque()
+        self._lock = threading.Lock()
+        self.totals: Counter = Counter()
+        self.minutes: Dict[str, Counter] = {}
+        self.referrers: Dict[str, Counter] = {}
+        self.user_agents: Dict[str, Counter] = {}
+        # Links counted since the last flush
+        self._dirty: Set[str] = set()
+        self._swept_minute = 0
+        self.generation = 0
+        self._journal = None
+        self._journaled = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _journal_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.log"
+
+    def _set_link(self, short_path: str, total: int, referrers: dict, user_agents: dict, minutes: dict) -> None:
+        self.totals[short_path] = total
+        self.referrers[short_path] = Counter(referrers)
+        self.user_agents[short_path] = Counter(user_agents)
+        if minutes:
+            self.minutes[short_path] = Counter({int(m): n for m, n in minutes.items()})
+        else:
+            self.minutes.pop(short_path, None)
+
+    def load(self) -> None:
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.generation = data.get("generation", 0)
+            self.totals.update(data.get("totals", {}))
+            for key, counts in data.get("referrers", {}).items():
+                self.referrers[key] = Counter(counts)
+            for key, counts in data.get("user_agents", {}).items():
+                self.user_agents[key] = Counter(counts)
+            for key, counts in data.get("minutes", {}).items():
+                self.minutes[key] = Counter({int(m): n for m, n in counts.items()})
+        journal = self._journal_path(self.generation)
+        if os.path.exists(journal):
+            with open(journal, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn record from a crash mid-flush
+                        continue
+                    # Records hold a link's full counters, so the last one wins
+                    self._set_link(*record)
+                    self._journaled += 1
+        for stale in glob.glob(f"{glob.escape(self.path)}.*.log"):
+            if stale != journal:
+                os.remove(stale)
+
+    def record(self, short_path: str, headers) -> None:
+        """Queue one click; `headers` is the raw ASGI header list, only two values are kept"""
+        if len(self._pending) >= self.max_pending:
+            # Only the event loop records clicks, so this needs no lock
+            self.dropped += 1
+            return
+        referrer = user_agent = b""
+        for name, value in headers:
+            if name == b"referer":
+                referrer = value
+            elif name == b"user-agent":
+                user_agent = value
+        self._pending.append((short_path, time.time(), referrer, user_agent))
+
+    def _drain(self) -> None:
+        pending = self._pending
+        if not pending:
+            return
+        with self._lock:
+            dirty = self._dirty
+            while pending:
+                short_path, clicked_at, referrer, user_agent = pending.popleft()
+                self.totals[short_path] += 1
+                _bump(self.referrers.setdefault(short_path, Counter()),
+                      referrer_host(referrer.decode('latin-1')))
+                _bump(self.user_agents.setdefault(short_path, Counter()),
+                      user_agent_family(user_agent.decode('latin-1')))
+                if self.minute_buckets:
+                    self.minutes.setdefault(short_path, Counter())[int(clicked_at // 60)] += 1
+                dirty.add(short_path)
+            if self.minute_buckets:
+                self._sweep_minutes()
+
+    def _sweep_minutes(self) -> None:
+        """Drop expired minute buckets, walking every link at most once a minute; called with the lock held"""
+        minute = int(time.time() // 60)
+        if minute == self._swept_minute:
+            return
+        self._swept_minute = minute
+        oldest_minute = minute - self.minute_buckets
+        for short_path in list(self.minutes):
+            buckets = self.minutes[short_path]
+            for m in [m for m in buckets if m <= oldest_minute]:
+                del buckets[m]
+            if not buckets:
+                del self.minutes[short_path]
+
+    def _link_record(self, short_path: str) -> list:
+        return [
+            short_path,
+            self.totals[short_path],
+            dict(self.referrers.get(short_path, ())),
+            dict(self.user_agents.get(short_path, ())),
+            dict(self.minutes.get(short_path, ())),
+        ]
+
+    def flush(self) -> None:
+        """Aggregate queued clicks and journal the links that changed"""
+        self._drain()
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            if not dirty:
+                return
+            compact = self._journaled + len(dirty) > len(self.totals)
+            if compact:
+                data = {
+                    "generation": self.generation + 1,
+                    "totals": dict(self.totals),
+                    "referrers": {k: dict(v) for k, v in self.referrers.items()},
+                    "user_agents": {k: dict(v) for k, v in self.user_agents.items()},
+                    "minutes": {k: dict(v) for k, v in self.minutes.items()},
+                }
+            else:
+                records = ''.join(json.dumps(self._link_record(k), separators=(',', ':')) + '\n' for k in dirty)
+        try:
+            if compact:
+                self._write_snapshot(data)
+            else:
+                if self._journal is None:
+                    self._journal = open(self._journal_path(self.generation), 'a')
+                self._journal.write(records)
+                self._journal.flush()
+                self._journaled += len(dirty)
+        except Exception:
+            with self._lock:
+                self._dirty |= dirty
+            raise
+
+    def _write_snapshot(self, data: dict) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        # The snapshot names the new generation, so the old journal is never replayed again
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        old_journal = self._journal_path(self.generation)
+        self.generation = data["generation"]
+        self._journaled = 0
+        if os.path.exists(old_journal):
+            os.remove(old_journal)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="click-stats", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush click stats: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def link_stats(self, short_path: str) -> dict:
+        self._drain()
+        with self._lock:
+            result = {
+                "short_path": short_path,
+                "clicks": self.totals.get(short_path, 0),
+                "referrers": dict(self.referrers.get(short_path, Counter()).most_common()),
+                "user_agents": dict(self.user_agents.get(short_path, Counter()).most_common()),
+            }
+            if self.minute_buckets:
+                oldest_minute = int(time.time() // 60) - self.minute_buckets
+                buckets = self.minutes.get(short_path, Counter())
+                result["per_minute"] = [
+                    {"minute": time.strftime('%Y-%m-%dT%H:%M:00Z', time.gmtime(m * 60)), "clicks": n}
+                    for m, n in sorted(buckets.items()) if m > oldest_minute
+                ]
+        return result
+
+    def top(self, n: int = 10) -> List[dict]:
+        self._drain()
+        with self._lock:
+            return [{"short_path": k, "clicks": c} for k, c in self.totals.most_common(n)]
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "dropped": self.dropped}
+
+
+class SharedClickStats(ClickStats):
+    """
+    ClickStats whose counters live in the SQLite file shared by every uvicorn
+    worker, so /stats sees the clicks every worker served.
+
+    Clicks are queued and aggregated in memory exactly as in ClickStats, but
+    the in-memory counters only hold this worker's clicks since its last
+    flush: each flush adds them to the shared tables in one transaction and
+    starts over from zero. Reads flush this worker's clicks first and then
+    query the database, so they block; call them off the event loop. Clicks
+    served by other workers show up after their next flush.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 5.0, minute_buckets: int = 0,
+                 max_pending: int = 100_000, timeout: float = 10.0):
+        super().__init__(path, flush_interval, minute_buckets, max_pending)
+        self.timeout = timeout
+        self._deleted_minute = 0
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+            local.conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            local.conn.execute('PRAGMA synchronous=NORMAL')
+        return local.conn
+
+    def load(self, seed: Optional[ClickStats] = None) -> None:
+        """
+        Create the tables. If they are empty and `seed` (an unloaded
+        ClickStats) is given, import its counters once for all workers.
+        """
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS click_totals (short_path TEXT PRIMARY KEY, clicks INTEGER NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS click_totals_by_clicks ON click_totals (clicks)')
+        for table in ('click_referrers', 'click_user_agents'):
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (short_path TEXT NOT NULL, key TEXT NOT NULL, '
+                         'clicks INTEGER NOT NULL, PRIMARY KEY (short_path, key))')
+        conn.execute('CREATE TABLE IF NOT EXISTS click_minutes (short_path TEXT NOT NULL, minute INTEGER NOT NULL, '
+                     'clicks INTEGER NOT NULL, PRIMARY KEY (short_path, minute))')
+        if seed is None or conn.execute('SELECT 1 FROM click_totals LIMIT 1').fetchone() is not None:
+            return
+        seed.load()
+        if not seed.totals:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-check under the write lock in case another worker seeded first
+            if conn.execute('SELECT 1 FROM click_totals LIMIT 1').fetchone() is None:
+                self._add(conn, (seed.totals, seed.referrers, seed.user_agents, seed.minutes))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        logger.info(f"Seeded shared click stats from {seed.path}")
+
+    def _take(self) -> Tuple[Counter, dict, dict, dict]:
+        """Aggregate queued clicks and hand over everything counted since the last flush"""
+        self._drain()
+        with self._lock:
+            taken = (self.totals, self.referrers, self.user_agents, self.minutes)
+            self.totals, self.referrers, self.user_agents, self.minutes = Counter(), {}, {}, {}
+            self._dirty = set()
+        return taken
+
+    def _restore(self, taken: Tuple[Counter, dict, dict, dict]) -> None:
+        """Put counts whose write failed back, so the next flush retries them"""
+        totals, referrers, user_agents, minutes = taken
+        with self._lock:
+            self.totals.update(totals)
+            for mine, theirs in ((self.referrers, referrers), (self.user_agents, user_agents)):
+                for short_path, counts in theirs.items():
+                    target = mine.setdefault(short_path, Counter())
+                    for key, n in counts.items():
+                        _bump(target, key, n)
+            for short_path, counts in minutes.items():
+                self.minutes.setdefault(short_path, Counter()).update(counts)
+            self._dirty.update(totals)
+
+    def _add(self, conn: sqlite3.Connection, taken: Tuple[Counter, dict, dict, dict]) -> None:
+        totals, referrers, user_agents, minutes = taken
+        conn.executemany('INSERT INTO click_totals (short_path, clicks) VALUES (?, ?) '
+                         'ON CONFLICT (short_path) DO UPDATE SET clicks = clicks + excluded.clicks',
+                         totals.items())
+        for table, breakdowns in (('click_referrers', referrers), ('click_user_agents', user_agents)):
+            for short_path, counts in breakdowns.items():
+                for key, n in counts.items():
+                    if conn.execute(f'UPDATE {table} SET clicks = clicks + ? WHERE short_path = ? AND key = ?',
+                                    (n, short_path, key)).rowcount:
+                        continue
+                    kept = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE short_path = ?',
+                                        (short_path,)).fetchone()[0]
+                    # Same cap as _bump, across every worker's keys
+                    if kept >= MAX_BREAKDOWN_KEYS:
+                        key = "other"
+                    conn.execute(f'INSERT INTO {table} (short_path, key, clicks) VALUES (?, ?, ?) '
+                                 'ON CONFLICT (short_path, key) DO UPDATE SET clicks = clicks + excluded.clicks',
+                                 (short_path, key, n))
+        if self.minute_buckets:
+            conn.executemany('INSERT INTO click_minutes (short_path, minute, clicks) VALUES (?, ?, ?) '
+                             'ON CONFLICT (short_path, minute) DO UPDATE SET clicks = clicks + excluded.clicks',
+                             [(short_path, minute, n)
+                              for short_path, counts in minutes.items() for minute, n in counts.items()])
+            minute = int(time.time() // 60)
+            if minute != self._deleted_minute:
+                # A full scan of the table, so at most once a minute
+                conn.execute('DELETE FROM click_minutes WHERE minute <= ?', (minute - self.minute_buckets,))
+                self._deleted_minute = minute
+
+    def flush(self) -> None:
+        """Add this worker's clicks since the last flush to the shared counters"""
+        taken = self._take()
+        if not taken[0]:
+            return
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._add(conn, taken)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception:
+            self._restore(taken)
+            raise
+
+    def close(self) -> None:
+        super().close()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def link_stats(self, short_path: str) -> dict:
+        self.flush()
+        conn = self._conn()
+        row = conn.execute('SELECT clicks FROM click_totals WHERE short_path = ?', (short_path,)).fetchone()
+        result = {"short_path": short_path, "clicks": row[0] if row else 0}
+        for name, table in (("referrers", "click_referrers"), ("user_agents", "click_user_agents")):
+            result[name] = dict(conn.execute(
+                f'SELECT key, clicks FROM {table} WHERE short_path = ? ORDER BY clicks DESC', (short_path,)))
+        if self.minute_buckets:
+            oldest_minute = int(time.time() // 60) - self.minute_buckets
+            result["per_minute"] = [
+                {"minute": time.strftime('%Y-%m-%dT%H:%M:00Z', time.gmtime(m * 60)), "clicks": n}
+                for m, n in conn.execute('SELECT minute, clicks FROM click_minutes '
+                                         'WHERE short_path = ? AND minute > ? ORDER BY minute',
+                                         (short_path, oldest_minute))
+            ]
+        return result
+
+    def top(self, n: int = 10) -> List[dict]:
+        self.flush()
+        rows = self._conn().execute('SELECT short_path, clicks FROM click_totals ORDER BY clicks DESC LIMIT ?', (n,))
+        return [{"short_path": k, "clicks": c} for k, c in rows]
@@ -0,0 +1,111 @@
+import asyncio
+import importlib
+import logging
+import sys
+from urllib.parse import urlsplit
+
+import pytest
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        import json
+        return json.loads(self.body)
+
+    @property
+    def text(self):
+        return self.body.decode("utf-8")
+
+
+class ASGIClient:
+    """Drives an ASGI app in-process with raw scope/receive/send calls, no sockets"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def _request(self, method, url, body, headers):
+        parts = urlsplit(url)
+        raw_headers = [(b"host", b"testserver")]
+        raw_headers += [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+        raw_headers.append((b"content-length", str(len(body)).encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode("latin-1"),
+            "query_string": parts.query.encode("latin-1"),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        sent = False
+        status, response_headers, chunks = None, {}, []
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                for name, value in message.get("headers", []):
+                    response_headers[name.decode("latin-1").lower()] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return Response(status, response_headers, b"".join(chunks))
+
+    def request(self, method, url, body=b"", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        return asyncio.run(self._request(method, url, body, headers or {}))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+@pytest.fixture
+def store_backend():
+    """LINKS_STORE_BACKEND for `links`; parametrize it to run a test against the shared backend"""
+    return "local"
+
+
+@pytest.fixture
+def links(tmp_path, monkeypatch, store_backend):
+    """A fresh import of main.py whose data and logs live in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("LINKS_STORE_BACKEND", store_backend)
+    for name in [name for name in sys.modules if name == "main"]:
+        del sys.modules[name]
+    module = importlib.import_module("main")
+    yield module
+    module.click_stats.close()
+    if module.shared_metrics is not None:
+        module.shared_metrics.close()
+    module.io_writer.close()
+    module.link_store.close()
+    module.request_handler.close()
+    logging.getLogger("http_requests").handlers.clear()
+    del sys.modules["main"]
+
+
+@pytest.fixture
+def client(links):
+    return ASGIClient(links.app)
@@ -0,0 +1,91 @@
+import inspect
+import json
+import time
+from urllib.parse import quote
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+_NOT_FOUND_HEADERS = [(b"content-type", b"application/json")]
+
+
+class RedirectFastPath:
+    """
+    ASGI layer that answers `GET /{short_path}` before FastAPI sees the request.
+
+    Hits get a 302 whose pre-encoded headers are cached per short path (in
+    LRU order); misses get the same 404 JSON body the FastAPI route
+    returns, without raising HTTPException. Any other request, and any path in
+    `reserved_paths`, falls through to the wrapped app untouched.
+
+    Only GET is handled here; HEAD and other methods go to FastAPI, whose
+    route answers them with 405 as before. CORS headers are added by wrapping
+    this layer in CORSMiddleware (see main.py), not by the FastAPI stack.
+
+    `lookup` may be a coroutine function, for stores that read from disk on a
+    cache miss and must not block the event loop.
+
+    `observer(scope, short_path, status, duration_ns, started_at)` is called
+    after the response is sent so logging and stats can hook in without
+    sitting in front of the send; `started_at` is the request's arrival time.
+    """
+
+    def __init__(self, app, lookup: Callable[[str], Optional[str]], reserved_paths: Iterable[str] = (),
+                 observer: Optional[Callable] = None, cache_size: int = 10000):
+        self.app = app
+        self.lookup = lookup
+        self._lookup_is_async = inspect.iscoroutinefunction(lookup)
+        self.reserved_paths = frozenset(reserved_paths)
+        self.observer = observer
+        self.cache_size = cache_size
+        self._starts: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _redirect_start(self, short_path: str, long_url: str) -> dict:
+        starts = self._starts
+        headers = starts.get(short_path)
+        if headers is not None:
+            try:
+                starts.move_to_end(short_path)
+            except KeyError:
+                pass
+        else:
+            headers = (
+                # Same escaping as starlette's RedirectResponse
+                (b"location", quote(long_url, safe=":/%#?=@[]!$&'()*+,;").encode("latin-1")),
+                (b"content-length", b"0"),
+            )
+            # Mappings never change, so a cached entry stays valid until evicted
+            starts[short_path] = headers
+            if len(starts) > self.cache_size:
+                starts.popitem(last=False)
+        # A new message and header list per response: outer middleware (CORS) appends to them
+        return {"type": "http.response.start", "status": 302, "headers": list(headers)}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return await self.app(scope, receive, send)
+        short_path = scope["path"][1:]
+        if not short_path or "/" in short_path or short_path in self.reserved_paths:
+            return await self.app(scope, receive, send)
+
+        started_at = time.time()
+        started = time.perf_counter_ns()
+        if self._lookup_is_async:
+            long_url = await self.lookup(short_path)
+        else:
+            long_url = self.lookup(short_path)
+        if long_url is not None:
+            status = 302
+            await send(self._redirect_start(short_path, long_url))
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            status = 404
+            body = json.dumps({"detail": f"Short URL path '{short_path}' not found"},
+                              ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 404,
+                "headers": _NOT_FOUND_HEADERS + [(b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+        if self.observer is not None:
+            self.observer(scope, short_path, status, time.perf_counter_ns() - started, started_at)
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BackgroundWriter:
+    """
+    A dedicated thread that runs blocking I/O handed to it from the event loop.
+
+    Work items go through a bounded queue. `run()` awaits completion and, when
+    the queue is full, waits for room without blocking the loop, so callers
+    are slowed down rather than piling up unbounded work. `submit_nowait()` is
+    for fire-and-forget work such as log records and drops the item instead.
+    `close()` drains everything already queued; anything submitted after that
+    is refused with RuntimeError rather than left waiting forever.
+    """
+
+    def __init__(self, name: str = "io-writer", max_queue: int = 10000):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._closed = False
+        # Set by the writer thread once it has stopped taking work
+        self._stopped = threading.Event()
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.backpressure_waits = 0
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            fn, args, future = item
+            if future is not None and not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                self.failed += 1
+                if future is not None:
+                    future.set_exception(e)
+                else:
+                    logger.error(f"Background write failed: {e}")
+            else:
+                self.completed += 1
+                if future is not None:
+                    future.set_result(result)
+        self._stopped.set()
+        # Fail anything that raced in behind the stop marker
+        while True:
+            try:
+                fn, args, future = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if future is not None and future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("Writer is closed"))
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run `fn(*args)` on the writer thread and await its result"""
+        if self._closed:
+            raise RuntimeError("Writer is closed")
+        future: Future = Future()
+        item = (fn, args, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Backpressure: wait for room on a worker thread, not on the loop
+            self.backpressure_waits += 1
+            await asyncio.to_thread(self._queue.put, item)
+        # The thread sets _stopped before its final drain, so if the item went in after that
+        # drain this sees it; cancel() fails if the drain got to the item first
+        if self._stopped.is_set() and future.cancel():
+            raise RuntimeError("Writer is closed")
+        return await asyncio.wrap_future(future)
+
+    def submit_nowait(self, fn: Callable, *args) -> bool:
+        """Queue `fn(*args)` without waiting; returns False if it was dropped"""
+        if self._closed or self._stopped.is_set():
+            return False
+        try:
+            self._queue.put_nowait((fn, args, None))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish everything already queued and stop the thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+
+class BackgroundLogHandler(logging.Handler):
+    """Logging handler that hands records to `target` on a BackgroundWriter thread"""
+
+    def __init__(self, writer: BackgroundWriter, target: logging.Handler):
+        super().__init__(target.level)
+        self.writer = writer
+        self.target = target
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.writer.submit_nowait(self.target.handle, record)
+
+    def close(self) -> None:
+        self.target.close()
+        super().close()
@@ -0,0 +1,128 @@
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Iterable, Iterator, Optional, Tuple
+
+MAGIC = b"LNKIDX01"
+HEADER = struct.Struct("<8sQ")
+OFFSET = struct.Struct("<Q")
+
+
+class MappedIndex:
+    """
+    Read-only, memory-mapped table of short path -> long URL.
+
+    File layout (little endian):
+        magic (8 bytes) | count (u64)
+        key offsets   (count + 1) x u64, relative to the key blob
+        url offsets   (count + 1) x u64, relative to the url blob
+        key blob      keys sorted by their UTF-8 bytes, concatenated
+        url blob      urls in the same order, concatenated
+
+    Opening only maps the file, so startup cost doesn't grow with the table;
+    a lookup is a binary search that touches O(log n) keys and builds no
+    Python objects for the rest.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a link index")
+        table = memoryview(self._mm)[HEADER.size:HEADER.size + 16 * (self.count + 1)].cast('Q')
+        self._key_offsets = table[:self.count + 1]
+        self._url_offsets = table[self.count + 1:]
+        self._keys_start = HEADER.size + 16 * (self.count + 1)
+        self._urls_start = self._keys_start + self._key_offsets[self.count]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _key(self, i: int) -> bytes:
+        start = self._keys_start
+        return self._mm[start + self._key_offsets[i]:start + self._key_offsets[i + 1]]
+
+    def _url(self, i: int) -> bytes:
+        start = self._urls_start
+        return self._mm[start + self._url_offsets[i]:start + self._url_offsets[i + 1]]
+
+    def lookup(self, key: str) -> Optional[str]:
+        target = key.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key(lo) == target:
+            return self._url(lo).decode('utf-8')
+        return None
+
+    def __contains__(self, key: str) -> bool:
+        return self.lookup(key) is not None
+
+    def raw_items(self) -> Iterator[Tuple[bytes, bytes]]:
+        for i in range(self.count):
+            yield self._key(i), self._url(i)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        for key, url in self.raw_items():
+            yield key.decode('utf-8'), url.decode('utf-8')
+
+
+def write_index(path: str, entries: Iterable[Tuple[bytes, bytes]], count: int) -> None:
+    """
+    Write `count` (key, url) byte pairs, already sorted by key, to a new index at
+    `path`. Sections are spilled to temporary files as they are produced and
+    concatenated at the end, so memory use doesn't depend on `count`.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    spills = [tempfile.TemporaryFile(dir=directory) for _ in range(4)]
+    key_offsets, url_offsets, keys, urls = spills
+    try:
+        key_pos = url_pos = 0
+        written = 0
+        key_offsets.write(OFFSET.pack(0))
+        url_offsets.write(OFFSET.pack(0))
+        for key, url in entries:
+            keys.write(key)
+            urls.write(url)
+            key_pos += len(key)
+            url_pos += len(url)
+            key_offsets.write(OFFSET.pack(key_pos))
+            url_offsets.write(OFFSET.pack(url_pos))
+            written += 1
+        if written != count:
+            raise ValueError(f"Expected {count} index entries, got {written}")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as out:
+            out.write(HEADER.pack(MAGIC, count))
+            for spill in spills:
+                spill.seek(0)
+                shutil.copyfileobj(spill, out, 1024 * 1024)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        for spill in spills:
+            spill.close()
+
+
+def merge_sorted(index: Optional[MappedIndex], recent: Iterable[Tuple[str, str]]) -> Iterator[Tuple[bytes, bytes]]:
+    """Merge an existing index with new mappings (keys must not overlap) in key order"""
+    new_items = sorted((k.encode('utf-8'), u.encode('utf-8')) for k, u in recent)
+    old_items = index.raw_items() if index is not None else iter(())
+    old = next(old_items, None)
+    i = 0
+    while old is not None or i < len(new_items):
+        if old is not None and (i >= len(new_items) or old[0] < new_items[i][0]):
+            yield old
+            old = next(old_items, None)
+        else:
+            yield new_items[i]
+            i += 1
@@ -0,0 +1,419 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from link_index import MappedIndex, merge_sorted, write_index
+
+logger = logging.getLogger(__name__)
+
+
+class LinkStore:
+    """
+    Log-structured storage for short path -> long URL mappings.
+
+    New mappings are appended to a log file as one JSON record per line, so
+    a create costs the same no matter how many links exist. A background
+    thread fsyncs the log in groups every `fsync_interval` seconds and, once
+    `compact_threshold` records have been appended, merges them into the
+    memory-mapped index (see link_index.py) and drops the old logs.
+
+    Only mappings created since the last compaction are held in a dict;
+    everything else is looked up in the index, with a small LRU of hot keys
+    in front of it, so startup maps one file instead of parsing the whole
+    table. A url_mappings.json snapshot from older versions is converted to
+    an index on first load. Mappings are never changed once created, so
+    replaying a log that the index already covers is harmless.
+
+    `reserve()` claims a key without making it visible: reservations live in
+    their own dict and only move into `recent` (and so into get() and
+    exports) once their append, or for batches their fsync, has succeeded.
+    Compaction never merges a reserved key into the index (its record is
+    carried over to the new log instead), and a failed append writes a
+    tombstone so neither compaction nor a restart can bring back a link that
+    was never created.
+
+    Reservation state is guarded by `_lock`, which reserve() takes on the
+    event loop, so it is never held across file I/O; log writes happen under
+    `_io_lock`, which only writer threads take. When both are needed the I/O
+    lock is taken first.
+    """
+
+    def __init__(self, data_dir: str = "data", snapshot_name: str = "url_mappings.json",
+                 index_name: str = "url_mappings.idx", fsync_interval: float = 0.05,
+                 compact_threshold: int = 100_000, hot_cache_size: int = 10_000,
+                 on_sync: Optional[Callable[[float], None]] = None):
+        self.data_dir = data_dir
+        self.snapshot_path = os.path.join(data_dir, snapshot_name)
+        self.index_path = os.path.join(data_dir, index_name)
+        self.log_prefix = os.path.join(data_dir, "url_mappings.log.")
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self.hot_cache_size = hot_cache_size
+        # Called with the duration in seconds of every group fsync
+        self.on_sync = on_sync
+        self.index: Optional[MappedIndex] = None
+        # Written mappings not yet merged into the index
+        self.recent: Dict[str, str] = {}
+        # Reserved keys whose append hasn't succeeded yet, with their URLs
+        self._reserved: Dict[str, str] = {}
+        # Keys whose append failed, with the log they failed in; skipped by compaction even if
+        # the tombstone couldn't be written, and forgotten once a compaction has covered that log
+        self._failed: Dict[str, int] = {}
+        # Recent keys in creation order so exports can walk them while creates continue
+        self._order: List[str] = []
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self.hot_hits = 0
+        self.index_lookups = 0
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._log_file = None
+        self._log_seq = 0
+        self._dirty = False
+        self._appended = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _log_path(self, seq: int) -> str:
+        return f"{self.log_prefix}{seq}"
+
+    def _log_files(self):
+        files = []
+        for path in glob.glob(f"{self.log_prefix}*"):
+            suffix = path[len(self.log_prefix):]
+            if suffix.isdigit():
+                files.append((int(suffix), path))
+        return sorted(files)
+
+    def load(self) -> None:
+        """Map the index, replay the logs and open a fresh log for appends"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        if not os.path.exists(self.index_path) and os.path.exists(self.snapshot_path):
+            self._migrate_snapshot()
+        if os.path.exists(self.index_path):
+            self.index = MappedIndex(self.index_path)
+        replayed = 0
+        logs = self._log_files()
+        for _, path in logs:
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        key, url = json.loads(line)
+                    except ValueError:
+                        # Torn record from a crash mid-append
+                        continue
+                    if url is None:
+                        # Tombstone of a failed append
+                        self.recent.pop(key, None)
+                        continue
+                    # Logs left behind by a compaction that crashed before removing them
+                    if self.index is not None and key in self.index:
+                        continue
+                    self.recent[key] = url
+                    replayed += 1
+        self._order = list(self.recent)
+        self._appended = replayed
+        # Keep appending to the newest log rather than starting an empty one on every load
+        self._log_seq = logs[-1][0] if logs else 0
+        self._log_file = open(self._log_path(self._log_seq), 'a')
+        if self._log_file.tell() > 0:
+            with open(self._log_path(self._log_seq), 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+            if torn:
+                # End the torn record so the next append starts on its own line
+                self._log_file.write('\n')
+                self._log_file.flush()
+        logger.info(f"Loaded {len(self)} mappings ({replayed} replayed from {len(logs)} log files)")
+
+    def _migrate_snapshot(self) -> None:
+        with open(self.snapshot_path, 'r') as f:
+            mappings = json.load(f)
+        write_index(self.index_path, merge_sorted(None, mappings.items()), len(mappings))
+        os.replace(self.snapshot_path, f"{self.snapshot_path}.migrated")
+        logger.info(f"Converted {len(mappings)} mappings from {self.snapshot_path} into {self.index_path}")
+
+    def start(self) -> None:
+        """Start the background group-fsync and compaction thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="link-store", daemon=True)
+            self._thread.start()
+
+    def get(self, key: str) -> Optional[str]:
+        url = self.recent.get(key)
+        if url is not None:
+            return url
+        hot = self._hot
+        url = hot.get(key)
+        if url is not None:
+            self.hot_hits += 1
+            try:
+                hot.move_to_end(key)
+            except KeyError:
+                # Evicted by a concurrent lookup in between
+                pass
+            return url
+        index = self.index
+        if index is None:
+            return None
+        self.index_lookups += 1
+        url = index.lookup(key)
+        if url is not None:
+            hot[key] = url
+            if len(hot) > self.hot_cache_size:
+                try:
+                    hot.popitem(last=False)
+                except KeyError:
+                    pass
+        return url
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return (len(self.index) if self.index is not None else 0) + len(self.recent)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        """Yield indexed mappings in key order, then recent ones in creation order, without copying the table"""
+        index, order = self.index, self._order
+        if index is not None:
+            yield from index.items()
+        for i in range(len(order)):
+            key = order[i]
+            # A compaction may move the key into a newer index mid-export, so don't read `recent` directly
+            url = self.get(key)
+            if url is not None:
+                yield key, url
+
+    def reserve(self, key: str, url: str) -> bool:
+        """Claim `key` in memory without touching disk; returns False if it is already taken"""
+        with self._lock:
+            if key in self.recent or key in self._reserved or (self.index is not None and key in self.index):
+                return False
+            self._reserved[key] = url
+            # A new attempt at a path whose earlier append failed
+            self._failed.pop(key, None)
+        return True
+
+    def discard(self, key: str) -> None:
+        """Release a reservation whose append failed (or never ran)"""
+        with self._lock:
+            self._reserved.pop(key, None)
+
+    def discard_many(self, keys: Iterable[str]) -> None:
+        """Release a batch of reservations"""
+        with self._lock:
+            for key in keys:
+                self._reserved.pop(key, None)
+
+    def _confirm(self, keys: List[str]) -> None:
+        """Make reservations whose records are safely in the log visible to readers"""
+        with self._lock:
+            for key in keys:
+                url = self._reserved.pop(key, None)
+                if url is not None:
+                    self.recent[key] = url
+                    self._order.append(key)
+            self._appended += len(keys)
+
+    def _fail(self, keys: List[str]) -> None:
+        """
+        Tombstone reserved keys whose append raised, since part of the write may
+        have reached the log. Called with the I/O lock held; the caller still
+        discards the reservations.
+        """
+        with self._lock:
+            for key in keys:
+                self._failed[key] = self._log_seq
+        # The leading newline ends any torn record the failed write left behind
+        tombstones = '\n' + ''.join(json.dumps([key, None], separators=(',', ':')) + '\n' for key in keys)
+        try:
+            self._log_file.write(tombstones)
+            self._log_file.flush()
+        except Exception as e:
+            logger.error(f"Failed to write tombstones for {len(keys)} failed appends: {e}")
+
+    def append(self, key: str, url: str) -> None:
+        """Write a reserved mapping to the log (blocking file I/O)"""
+        record = json.dumps([key, url], separators=(',', ':')) + '\n'
+        with self._io_lock:
+            try:
+                self._log_file.write(record)
+                self._log_file.flush()
+            except Exception:
+                self._fail([key])
+                raise
+            self._dirty = True
+        self._confirm([key])
+
+    def append_many(self, items: Iterable[Tuple[str, str]]) -> List[str]:
+        """
+        Write many reserved mappings as one batch and fsync it before returning.
+        Returns the short paths that turned out to be taken, which is always
+        none here since reserve() is authoritative in a single process.
+        """
+        items = list(items)
+        if not items:
+            return []
+        keys = [key for key, _ in items]
+        data = ''.join(json.dumps([key, url], separators=(',', ':')) + '\n' for key, url in items)
+        with self._io_lock:
+            try:
+                self._log_file.write(data)
+                self._log_file.flush()
+                fd = os.dup(self._log_file.fileno())
+            except Exception:
+                self._fail(keys)
+                raise
+        try:
+            os.fsync(fd)
+        except Exception:
+            with self._io_lock:
+                self._fail(keys)
+            raise
+        finally:
+            os.close(fd)
+        self._confirm(keys)
+        return []
+
+    def add(self, key: str, url: str) -> bool:
+        """Reserve and append a new mapping; returns False if the key is already taken"""
+        if not self.reserve(key, url):
+            return False
+        try:
+            self.append(key, url)
+        except Exception:
+            self.discard(key)
+            raise
+        return True
+
+    def sync(self) -> None:
+        """fsync everything appended so far"""
+        with self._io_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            # fsync a duplicate outside the lock so appends aren't held up by the disk
+            fd = os.dup(self._log_file.fileno())
+        started = time.perf_counter()
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        if self.on_sync is not None:
+            self.on_sync(time.perf_counter() - started)
+
+    def compact(self) -> None:
+        """Merge the logged mappings into a new index and remove the logs it covers"""
+        with self._compact_lock:
+            # Only this method changes _log_seq, so the next log can be opened before taking the lock
+            new_log = open(self._log_path(self._log_seq + 1), 'a')
+            with self._io_lock:
+                # Switch appends to the new log; everything before it goes into the index
+                old_log = self._log_file
+                try:
+                    old_log.flush()
+                except Exception:
+                    new_log.close()
+                    raise
+                covered = [(seq, path) for seq, path in self._log_files() if seq <= self._log_seq]
+                with self._lock:
+                    covered_seq = self._log_seq
+                    self._log_seq += 1
+                    self._log_file = new_log
+                    self._appended = 0
+                    index = self.index
+                    pending = set(self._reserved)
+                    failed = set(self._failed)
+            # Group fsyncs use a dup of the old descriptor, so it's still safe to close
+            os.fsync(old_log.fileno())
+            old_log.close()
+            # Read back the closed logs rather than `recent`, which also holds reservations
+            # whose append hasn't happened yet
+            merged: Dict[str, str] = {}
+            for _, path in covered:
+                with open(path, 'r') as f:
+                    for line in f:
+                        try:
+                            key, url = json.loads(line)
+                        except ValueError:
+                            continue
+                        if url is None:
+                            merged.pop(key, None)
+                        elif index is None or key not in index:
+                            merged[key] = url
+            # Appends still in flight may yet fail, so they stay out of the index
+            carried = {key: merged.pop(key) for key in pending.intersection(merged)}
+            for key in failed:
+                merged.pop(key, None)
+            count = (len(index) if index is not None else 0) + len(merged)
+            write_index(self.index_path, merge_sorted(index, merged.items()), count)
+            # The old index stays mapped until the last reader drops it
+            new_index = MappedIndex(self.index_path)
+            with self._lock:
+                self.index = new_index
+                for key in merged:
+                    self.recent.pop(key, None)
+                self._order = [key for key in self._order if key in self.recent]
+            with self._io_lock:
+                # Re-log carried records that are still reserved or have since been confirmed.
+                # Failures write their tombstones under this lock, so a later one lands after
+                # the carried record in the new log.
+                with self._lock:
+                    carry = ''.join(json.dumps([key, url], separators=(',', ':')) + '\n'
+                                    for key, url in carried.items()
+                                    if (self.recent.get(key) == url or self._reserved.get(key) == url)
+                                    and key not in self._failed)
+                if carry:
+                    self._log_file.write(carry)
+                    self._log_file.flush()
+                    self._dirty = True
+            if carry:
+                self.sync()
+            for _, path in covered:
+                os.remove(path)
+            with self._lock:
+                # Failures in the covered logs are now settled by the index; later ones stay
+                for key in failed:
+                    if self._failed.get(key, covered_seq + 1) <= covered_seq:
+                        del self._failed[key]
+            logger.info(f"Compacted {len(merged)} mappings into {self.index_path} ({count} total)")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+                if self._appended >= self.compact_threshold:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Link store background task failed: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._io_lock:
+            if self._log_file is not None:
+                self._log_file.flush()
+                os.fsync(self._log_file.fileno())
+                self._log_file.close()
+                self._log_file = None
+
+    def stats(self) -> dict:
+        return {
+            "mappings": len(self),
+            "indexed": len(self.index) if self.index is not None else 0,
+            "recent": len(self.recent),
+            "reserved": len(self._reserved),
+            "hot_cache_entries": len(self._hot),
+            "hot_hits": self.hot_hits,
+            "index_lookups": self.index_lookups,
+            "log_records_since_compaction": self._appended,
+            "log_seq": self._log_seq,
+        }
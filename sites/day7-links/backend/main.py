@@ -1,14 +1,23 @@
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
-from typing import Dict
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, HttpUrl, TypeAdapter, ValidationError
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+import hmac
 import re
 import os
 import logging
-import json
-from datetime import datetime
 from dotenv import load_dotenv
+from link_store import LinkStore
+from shared_link_store import SharedLinkStore, LinkExistsError
+from io_writer import BackgroundWriter, BackgroundLogHandler
+from fast_redirect import RedirectFastPath
+from access_log import AccessLogger, AccessLogMiddleware, scope_header, scope_url
+from click_stats import ClickStats, SharedClickStats
+from bulk_io import MAX_LINE_BYTES, iter_lines, parse_ndjson, parse_csv, export_ndjson, export_csv
+from metrics import Metrics, SharedMetrics
 
 # Load environment variables
 load_dotenv(dotenv_path="../.env")
@@ -39,102 +48,145 @@ logger = logging.getLogger(__name__)
 # Create logs directory if it doesn't exist
 os.makedirs("logs", exist_ok=True)
 
+# All disk writes (mapping appends and request logs) run on this thread, never on the event loop
+WRITER_QUEUE_SIZE = int(os.getenv("LINKS_WRITER_QUEUE_SIZE", "10000"))
+io_writer = BackgroundWriter(max_queue=WRITER_QUEUE_SIZE)
+
 # Setup file handler for HTTP request logging
 request_logger = logging.getLogger("http_requests")
 request_handler = logging.FileHandler("logs/http_requests.log")
 request_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-request_logger.addHandler(request_handler)
+request_logger.addHandler(BackgroundLogHandler(io_writer, request_handler))
 request_logger.setLevel(logging.INFO)
 
-app = FastAPI(title="Link Shortener Service", version="1.0.0")
+# Prometheus metrics for this worker, served at /metrics
+metrics = Metrics()
+request_latency = metrics.histogram(
+    "links_request_duration_seconds", "Request latency by route template", ("route", "method"))
+responses_total = metrics.counter(
+    "links_responses_total", "Responses by route template and status code", ("route", "status"))
+redirects_total = metrics.counter(
+    "links_redirects_total", "Short path lookups on the redirect fast path", ("result",))
+store_fsync_latency = metrics.histogram(
+    "links_store_fsync_duration_seconds", "Duration of link log group fsyncs")
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = datetime.now()
-    
-    # Get request info
-    client_ip = request.client.host if request.client else "unknown"
-    method = request.method
-    url = str(request.url)
-    user_agent = request.headers.get("user-agent", "unknown")
-    
-    # Get request body for POST requests
-    body = None
-    if method in ["POST", "PUT", "PATCH"]:
-        try:
-            body_bytes = await request.body()
-            if body_bytes:
-                body = body_bytes.decode('utf-8')
-        except Exception:
-            body = "Could not read body"
-    
-    # Process the request
-    response = await call_next(request)
-    
-    # Calculate processing time
-    process_time = (datetime.now() - start_time).total_seconds()
-    
-    # Log the request
-    log_data = {
-        "timestamp": start_time.isoformat(),
-        "client_ip": client_ip,
-        "method": method,
-        "url": url,
-        "user_agent": user_agent,
-        "status_code": response.status_code,
-        "process_time_seconds": round(process_time, 4)
-    }
-    
-    if body:
-        log_data["request_body"] = body
-    
-    request_logger.info(json.dumps(log_data))
-    
-    return response
+# Storage for URL mappings: appended to a log, compacted into a memory-mapped index in the background
+DATA_DIR = "data"
+FSYNC_INTERVAL = float(os.getenv("LINKS_FSYNC_INTERVAL", "0.05"))
+COMPACT_THRESHOLD = int(os.getenv("LINKS_COMPACT_THRESHOLD", "100000"))
+HOT_CACHE_SIZE = int(os.getenv("LINKS_HOT_CACHE_SIZE", "10000"))
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=cors_origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# LINKS_STORE_BACKEND=sqlite keeps mappings, click counts and metrics in a SQLite file
+# shared by all workers, so the service can run under `uvicorn --workers N`
+STORE_BACKEND = os.getenv("LINKS_STORE_BACKEND", "local")
+STORE_DB_FILE = os.getenv("LINKS_STORE_DB_FILE", os.path.join(DATA_DIR, "links.db"))
+# How often each worker checks for links created by the others (only 404s cached before then can be stale)
+STORE_REFRESH_INTERVAL = float(os.getenv("LINKS_STORE_REFRESH_INTERVAL", "0.05"))
 
-# In-memory storage for URL mappings
-# In production, this should be replaced with a proper database
-url_mappings: Dict[str, str] = {}
+def new_local_store():
+    return LinkStore(DATA_DIR, fsync_interval=FSYNC_INTERVAL, compact_threshold=COMPACT_THRESHOLD,
+                     hot_cache_size=HOT_CACHE_SIZE, on_sync=store_fsync_latency.observe)
 
-# State persistence functions
-STATE_FILE = "data/url_mappings.json"
+if STORE_BACKEND == "sqlite":
+    os.makedirs(DATA_DIR, exist_ok=True)
+    link_store = SharedLinkStore(STORE_DB_FILE, refresh_interval=STORE_REFRESH_INTERVAL,
+                                 cache_size=HOT_CACHE_SIZE)
+    # Cache misses read SQLite on the store's own threads, not on the event loop
+    lookup_link = link_store.lookup
+elif STORE_BACKEND == "local":
+    link_store = new_local_store()
+    lookup_link = link_store.get
+else:
+    raise ValueError(f"Unknown LINKS_STORE_BACKEND: {STORE_BACKEND}")
 
-def save_state():
-    """Save the current URL mappings to a JSON file"""
-    try:
-        os.makedirs("data", exist_ok=True)
-        with open(STATE_FILE, 'w') as f:
-            json.dump(url_mappings, f, indent=2)
-        logger.info(f"State saved to {STATE_FILE} with {len(url_mappings)} mappings")
-    except Exception as e:
-        logger.error(f"Failed to save state: {e}")
+# Per-link click counters, aggregated in memory and flushed to disk periodically.
+# LINKS_CLICK_MINUTE_BUCKETS > 0 also keeps that many minutes of per-minute counts.
+CLICK_FLUSH_INTERVAL = float(os.getenv("LINKS_CLICK_FLUSH_INTERVAL", "5.0"))
+CLICK_MINUTE_BUCKETS = int(os.getenv("LINKS_CLICK_MINUTE_BUCKETS", "0"))
+# Clicks waiting to be aggregated; beyond this they are dropped and counted
+CLICK_MAX_PENDING = int(os.getenv("LINKS_CLICK_MAX_PENDING", "100000"))
+CLICK_STATS_FILE = os.path.join(DATA_DIR, "click_stats.json")
+if STORE_BACKEND == "sqlite":
+    # Every worker adds its clicks to the shared database instead of rewriting one JSON file
+    click_stats = SharedClickStats(
+        STORE_DB_FILE,
+        flush_interval=CLICK_FLUSH_INTERVAL,
+        minute_buckets=CLICK_MINUTE_BUCKETS,
+        max_pending=CLICK_MAX_PENDING,
+    )
+    # Each worker publishes its metrics there too, and /metrics renders the sum
+    shared_metrics = SharedMetrics(metrics, STORE_DB_FILE)
+else:
+    click_stats = ClickStats(
+        CLICK_STATS_FILE,
+        flush_interval=CLICK_FLUSH_INTERVAL,
+        minute_buckets=CLICK_MINUTE_BUCKETS,
+        max_pending=CLICK_MAX_PENDING,
+    )
+    shared_metrics = None
 
-def load_state():
-    """Load URL mappings from the JSON file"""
-    global url_mappings
-    try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r') as f:
-                loaded_mappings = json.load(f)
-                url_mappings.update(loaded_mappings)
-            logger.info(f"State loaded from {STATE_FILE} with {len(url_mappings)} mappings")
-        else:
-            logger.info("No existing state file found, starting with empty mappings")
-    except Exception as e:
-        logger.error(f"Failed to load state: {e}")
-        logger.info("Starting with empty mappings")
+# Every worker sees the same mappings, so the count is not summed across them
+metrics.gauge_callback("links_mappings", "Number of short links", lambda: len(link_store), aggregate="max")
+metrics.gauge_callback("links_writer_queue_depth", "Writes waiting for the background writer", io_writer.qsize)
+metrics.counter_callback("links_writer_completed_total", "Writes completed by the background writer",
+                         lambda: io_writer.completed)
+metrics.counter_callback("links_writer_failed_total", "Writes that raised on the background writer",
+                         lambda: io_writer.failed)
+metrics.counter_callback("links_writer_dropped_total", "Log records dropped because the writer queue was full",
+                         lambda: io_writer.dropped)
+metrics.counter_callback("links_writer_backpressure_waits_total", "Creates that waited for room in the writer queue",
+                         lambda: io_writer.backpressure_waits)
+metrics.counter_callback("links_clicks_dropped_total", "Clicks dropped because the click queue was full",
+                         lambda: click_stats.dropped)
+
+def observe_request(scope, status_code: int, duration_ns: int):
+    """Record latency and status for a request handled by FastAPI"""
+    route = scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    request_latency.observe(duration_ns / 1e9, path, scope["method"])
+    responses_total.inc(path, str(status_code))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    link_store.start()
+    click_stats.start()
+    if shared_metrics is not None:
+        shared_metrics.start()
+    yield
+    # Drain queued appends and log records, then make every create durable before exiting
+    click_stats.close()
+    if shared_metrics is not None:
+        shared_metrics.close()
+    io_writer.close()
+    link_store.close()
+    request_handler.close()
+
+app = FastAPI(title="Link Shortener Service", version="1.0.0", lifespan=lifespan)
+
+# Access logging: pure ASGI middleware, sampled redirects, request bodies capped
+REDIRECT_LOG_SAMPLE_RATE = float(os.getenv("LINKS_REDIRECT_LOG_SAMPLE_RATE", "1.0"))
+LOG_BODY_LIMIT = int(os.getenv("LINKS_LOG_BODY_LIMIT", "1024"))
+access_log = AccessLogger(request_logger, redirect_sample_rate=REDIRECT_LOG_SAMPLE_RATE, body_limit=LOG_BODY_LIMIT)
+app.add_middleware(AccessLogMiddleware, access_log=access_log, observer=observe_request)
+
+# Load existing state on startup; a new shared store is seeded from the local files once
+try:
+    if STORE_BACKEND == "sqlite":
+        link_store.load(seed=new_local_store())
+        shared_metrics.load()
+    else:
+        link_store.load()
+except Exception as e:
+    logger.error(f"Failed to load state: {e}")
+    raise
 
-# Load existing state on startup
-load_state()
+try:
+    if STORE_BACKEND == "sqlite":
+        click_stats.load(seed=ClickStats(CLICK_STATS_FILE))
+    else:
+        click_stats.load()
+except Exception as e:
+    logger.error(f"Failed to load click stats, starting from zero: {e}")
 
 class URLRequest(BaseModel):
     long_url: HttpUrl
@@ -148,11 +200,12 @@ class URLRequest(BaseModel):
             }
         }
 
+# Allow alphanumeric characters, hyphens, and underscores
+SHORT_PATH_PATTERN = re.compile(r'[a-zA-Z0-9_-]+')
+
 def validate_short_path(short_path: str) -> bool:
     """Validate that the short path contains only allowed characters"""
-    # Allow alphanumeric characters, hyphens, and underscores
-    pattern = r'^[a-zA-Z0-9_-]+$'
-    return bool(re.match(pattern, short_path)) and len(short_path) > 0
+    return SHORT_PATH_PATTERN.fullmatch(short_path) is not None
 
 @app.post("/shorten")
 async def create_short_url(request: URLRequest):
@@ -167,39 +220,213 @@ async def create_short_url(request: URLRequest):
             detail="Short path can only contain alphanumeric characters, hyphens, and underscores"
         )
     
-    # Check if short path already exists
-    if request.short_path in url_mappings:
+    # Paths used by the service's own routes would never redirect
+    if request.short_path in RESERVED_PATHS:
         raise HTTPException(
             status_code=409,
             detail=f"Short URL path '{request.short_path}' is already taken"
         )
     
-    # Store the mapping
-    url_mappings[request.short_path] = str(request.long_url)
+    long_url = str(request.long_url)
+    
+    # Claim the short path in memory first so concurrent creates can't both win
+    if not link_store.reserve(request.short_path, long_url):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Short URL path '{request.short_path}' is already taken"
+        )
     
-    # Save state after adding new mapping
-    save_state()
+    # Append to the log on the writer thread; the loop only awaits the result
+    try:
+        await io_writer.run(link_store.append, request.short_path, long_url)
+    except LinkExistsError:
+        # Another worker created the same path after our reservation check
+        raise HTTPException(
+            status_code=409,
+            detail=f"Short URL path '{request.short_path}' is already taken"
+        )
+    except Exception as e:
+        link_store.discard(request.short_path)
+        logger.error(f"Failed to save mapping '{request.short_path}': {e}")
+        raise HTTPException(status_code=500, detail="Failed to save short URL")
     
     return {
         "message": "Short URL created successfully",
         "short_url": f"{SERVICE_DOMAIN}/{request.short_path}",
-        "long_url": str(request.long_url)
+        "long_url": long_url
     }
 
-@app.get("/{short_path}")
-async def redirect_to_long_url(short_path: str):
+BULK_MAX_ROWS = int(os.getenv("LINKS_BULK_MAX_ROWS", "100000"))
+# Longer upload rows are reported as errors instead of being buffered
+BULK_MAX_ROW_BYTES = int(os.getenv("LINKS_BULK_MAX_ROW_BYTES", str(MAX_LINE_BYTES)))
+http_url_adapter = TypeAdapter(HttpUrl)
+
+# Bulk import and export are admin operations: they need `Authorization: Bearer $LINKS_ADMIN_TOKEN`
+# and are disabled when no token is configured. At most LINKS_ADMIN_CONCURRENCY run at once.
+ADMIN_TOKEN = os.getenv("LINKS_ADMIN_TOKEN", "")
+ADMIN_CONCURRENCY = int(os.getenv("LINKS_ADMIN_CONCURRENCY", "1"))
+
+async def require_admin(request: Request) -> None:
+    """Reject the request unless it carries the admin bearer token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403,
+            detail="Bulk import and export are disabled; set LINKS_ADMIN_TOKEN to enable them"
+        )
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=401,
+            detail="Missing or invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+class AdminSlots:
+    """Caps concurrent admin operations; only touched from the event loop, so no lock"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+
+    def acquire(self) -> None:
+        if self.in_use >= self.limit:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many bulk operations in progress, try again shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.in_use += 1
+
+    def release(self) -> None:
+        self.in_use -= 1
+
+admin_slots = AdminSlots(ADMIN_CONCURRENCY)
+
+@app.post("/shorten/bulk", dependencies=[Depends(require_admin)])
+async def bulk_create_short_urls(request: Request):
     """
-    Redirect to the long URL associated with the short path.
-    Returns 302 redirect if found, 404 if not found.
+    Create many short URL mappings from an NDJSON (one {"long_url", "short_path"}
+    object per line) or CSV (long_url,short_path) upload.
+    Every valid row is written in a single batched commit; the response lists
+    the outcome of each row.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        rows = parse_csv(iter_lines(request.stream(), BULK_MAX_ROW_BYTES), BULK_MAX_ROW_BYTES)
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        rows = parse_ndjson(iter_lines(request.stream(), BULK_MAX_ROW_BYTES))
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload application/x-ndjson or text/csv"
+        )
+    
+    admin_slots.acquire()
+    try:
+        return await import_rows(rows)
+    finally:
+        admin_slots.release()
+
+async def import_rows(rows):
+    """Validate and reserve each uploaded row, then write the accepted ones in one batch"""
+    results = []
+    accepted = []
+    try:
+        async for row, long_url, short_path, error in rows:
+            if row > BULK_MAX_ROWS:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Bulk uploads are limited to {BULK_MAX_ROWS} rows"
+                )
+            status = "invalid"
+            if error is None:
+                if not isinstance(short_path, str) or not validate_short_path(short_path):
+                    error = "Short path can only contain alphanumeric characters, hyphens, and underscores"
+                else:
+                    try:
+                        long_url = str(http_url_adapter.validate_python(long_url))
+                    except ValidationError:
+                        error = "Invalid long_url"
+            if error is None:
+                # Reserving also catches duplicates earlier in the same upload
+                if short_path in RESERVED_PATHS or not link_store.reserve(short_path, long_url):
+                    status = "conflict"
+                    error = f"Short URL path '{short_path}' is already taken"
+                else:
+                    status = "created"
+                    accepted.append((short_path, long_url))
+            result = {"row": row, "short_path": short_path, "status": status}
+            if error:
+                result["error"] = error
+            results.append(result)
+    except BaseException:
+        # Release everything this upload reserved if it is abandoned part way
+        link_store.discard_many(short_path for short_path, _ in accepted)
+        raise
+    
+    # One write and one fsync for the whole upload, on the writer thread
+    try:
+        conflicts = await io_writer.run(link_store.append_many, accepted)
+    except Exception as e:
+        link_store.discard_many(short_path for short_path, _ in accepted)
+        logger.error(f"Failed to save bulk upload of {len(accepted)} mappings: {e}")
+        raise HTTPException(status_code=500, detail="Failed to save short URLs")
+    
+    # Rows another worker created between our reservation check and the insert
+    if conflicts:
+        conflicts = set(conflicts)
+        for result in results:
+            if result["status"] == "created" and result["short_path"] in conflicts:
+                result["status"] = "conflict"
+                result["error"] = f"Short URL path '{result['short_path']}' is already taken"
+    created = len(accepted) - len(conflicts)
+    
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
+
+@app.get("/export", dependencies=[Depends(require_admin)])
+async def export_mappings(format: str = "ndjson"):
+    """Stream every mapping as NDJSON (default) or CSV"""
+    if format == "csv":
+        body, media_type = export_csv(link_store.items()), "text/csv"
+    elif format == "ndjson":
+        body, media_type = export_ndjson(link_store.items()), "application/x-ndjson"
+    else:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    # The slot is held until the stream finishes (or the client goes away)
+    admin_slots.acquire()
+    return StreamingResponse(body, media_type=media_type, background=BackgroundTask(admin_slots.release))
+
+@app.get("/stats")
+async def top_links(n: int = 10):
+    """Return the most clicked short paths"""
+    # The shared backend queries SQLite, so stats reads stay off the event loop
+    return {"top": await run_in_threadpool(click_stats.top, max(1, min(n, 1000)))}
+
+@app.get("/stats/{short_path}")
+async def short_url_stats(short_path: str):
     """
-    if short_path not in url_mappings:
+    Return click counts for a short path, broken down by referrer host and
+    user agent family (and per minute when enabled).
+    """
+    if await run_in_threadpool(link_store.get, short_path) is None:
         raise HTTPException(
             status_code=404,
             detail=f"Short URL path '{short_path}' not found"
         )
-    
-    long_url = url_mappings[short_path]
-    return RedirectResponse(url=long_url, status_code=302)
+    return await run_in_threadpool(click_stats.link_stats, short_path)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Latency histograms, status counts and store/writer gauges in Prometheus text format"""
+    if shared_metrics is not None:
+        body = await run_in_threadpool(shared_metrics.render)
+    else:
+        body = metrics.render()
+    return PlainTextResponse(body, media_type=Metrics.CONTENT_TYPE)
 
 @app.get("/")
 async def root():
@@ -208,10 +435,72 @@ async def root():
         "message": "Link Shortener Service",
         "usage": {
             "create_short_url": "POST /shorten with JSON body containing 'long_url' and 'short_path'",
-            "redirect": "GET /{short_path} to redirect to the long URL"
+            "redirect": "GET /{short_path} to redirect to the long URL",
+            "stats": "GET /stats/{short_path} for click counts, GET /stats?n=10 for the most clicked links",
+            "bulk": "POST /shorten/bulk (NDJSON or CSV) and GET /export, with the admin bearer token",
+            "metrics": "GET /metrics for Prometheus metrics"
         }
     }
 
+# Declared last: it matches every single-segment path, so fixed routes such as
+# /stats, /export and /metrics must be registered before it
+@app.get("/{short_path}")
+async def redirect_to_long_url(short_path: str):
+    """
+    Redirect to the long URL associated with the short path.
+    Returns 302 redirect if found, 404 if not found.
+    """
+    long_url = await run_in_threadpool(link_store.get, short_path)
+    if long_url is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Short URL path '{short_path}' not found"
+        )
+    
+    return RedirectResponse(url=long_url, status_code=302)
+
+def observe_fast_redirect(scope, short_path: str, status_code: int, duration_ns: int, started_at: float):
+    """Count the click, record metrics and log a sampled request answered by the redirect fast path"""
+    request_latency.observe(duration_ns / 1e9, "/{short_path}", scope["method"])
+    responses_total.inc("/{short_path}", str(status_code))
+    if status_code == 302:
+        redirects_total.inc("hit")
+        click_stats.record(short_path, scope["headers"])
+    else:
+        redirects_total.inc("miss")
+    if not access_log.sample_redirect():
+        return
+    client = scope.get("client")
+    access_log.log(
+        started_at,
+        client[0] if client else "unknown",
+        scope["method"],
+        scope_url(scope),
+        scope_header(scope, b"user-agent"),
+        status_code,
+        duration_ns,
+    )
+
+# Answer redirects ahead of FastAPI routing and middleware; everything else falls through.
+# Fixed single-segment routes (/shorten, /docs, ...) are never treated as short paths.
+RESERVED_PATHS = {route.path.strip("/") for route in app.routes if "{" not in route.path}
+api = app
+app = RedirectFastPath(
+    api,
+    lookup_link,
+    reserved_paths=RESERVED_PATHS,
+    observer=observe_fast_redirect,
+)
+
+# CORS wraps the fast path too, so redirects carry the same Access-Control-* headers as the API
+app = CORSMiddleware(
+    app,
+    allow_origins=cors_origins,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5004)
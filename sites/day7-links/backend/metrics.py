@@ -0,0 +1,395 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; request latencies on this service are mostly well under 10ms
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. `observe()` is a bisect and two increments with
+    no lock: observations come from the event loop thread, and a lost update
+    from a rare concurrent thread only skews a counter by one.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # Prometheus buckets are "less than or equal", which is what bisect_left finds
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Family:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+
+class CounterFamily(_Family):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        children = self.children
+        children[labels] = children.get(labels, 0) + amount
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in list(self.children.items())]
+
+    def merged(self, snapshots: List[list]) -> dict:
+        children = {}
+        for snapshot in snapshots:
+            for labels, value in snapshot:
+                labels = tuple(labels)
+                children[labels] = children.get(labels, 0) + value
+        return children
+
+    def combined(self, snapshots: List[list]) -> list:
+        return [[list(labels), value] for labels, value in self.merged(snapshots).items()]
+
+    def render(self, out: List[str], children: Optional[dict] = None) -> None:
+        children = self.children if children is None else children
+        for labels, value in list(children.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets: Iterable[float]):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels) -> None:
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children.setdefault(labels, Histogram(self.buckets))
+        child.observe(value)
+
+    def snapshot(self) -> list:
+        return [[list(labels), list(child.counts), child.sum] for labels, child in list(self.children.items())]
+
+    def merged(self, snapshots: List[list]) -> dict:
+        children = {}
+        for snapshot in snapshots:
+            for labels, counts, total in snapshot:
+                child = children.setdefault(tuple(labels), Histogram(self.buckets))
+                for i, count in enumerate(counts):
+                    child.counts[i] += count
+                child.sum += total
+        return children
+
+    def combined(self, snapshots: List[list]) -> list:
+        return [[list(labels), child.counts, child.sum] for labels, child in self.merged(snapshots).items()]
+
+    def render(self, out: List[str], children: Optional[dict] = None) -> None:
+        children = self.children if children is None else children
+        for labels, child in list(children.items()):
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(child.bounds, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {repr(child.sum)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+
+
+class CallbackFamily(_Family):
+    """
+    Gauge or counter whose value is read from `fn()` at scrape time.
+    `aggregate` ("sum" or "max") combines the values of several workers.
+    """
+
+    def __init__(self, name: str, help_text: str, kind: str, fn: Callable[[], float], aggregate: str = "sum"):
+        super().__init__(name, help_text, ())
+        if aggregate not in ("sum", "max"):
+            raise ValueError(f"Unknown aggregate: {aggregate}")
+        self.kind = kind
+        self.fn = fn
+        self.aggregate = aggregate
+
+    def snapshot(self) -> float:
+        return self.fn()
+
+    def merged(self, snapshots: List[float]) -> Optional[float]:
+        if not snapshots:
+            return None
+        return sum(snapshots) if self.aggregate == "sum" else max(snapshots)
+
+    def combined(self, snapshots: List[float]) -> Optional[float]:
+        return self.merged(snapshots)
+
+    def render(self, out: List[str], value: Optional[float] = None) -> None:
+        out.append(f"{self.name} {_number(self.fn() if value is None else value)}")
+
+
+class Metrics:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+
+    Each worker process has its own registry; with several workers,
+    SharedMetrics publishes it and renders the sum over every worker.
+    """
+
+    # Starlette appends "; charset=utf-8" to text/* media types
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+
+    def _register(self, family: _Family):
+        if family.name in self._families:
+            raise ValueError(f"Metric {family.name} is already registered")
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> CounterFamily:
+        return self._register(CounterFamily(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help_text, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, fn: Callable[[], float],
+                       aggregate: str = "sum") -> CallbackFamily:
+        return self._register(CallbackFamily(name, help_text, "gauge", fn, aggregate))
+
+    def counter_callback(self, name: str, help_text: str, fn: Callable[[], float]) -> CallbackFamily:
+        return self._register(CallbackFamily(name, help_text, "counter", fn))
+
+    def snapshot(self) -> dict:
+        """Current values of every family, as JSON-serialisable data"""
+        return {name: family.snapshot() for name, family in self._families.items()}
+
+    def combine(self, snapshots: List[dict]) -> dict:
+        """Add up the counters and histograms of several snapshots into one; gauges are left out"""
+        combined = {}
+        for name, family in self._families.items():
+            if family.kind == "gauge":
+                continue
+            values = [s[name] for s in snapshots if name in s]
+            if values:
+                combined[name] = family.combined(values)
+        return combined
+
+    def render(self, snapshots: Optional[List[dict]] = None, stale: Iterable[dict] = ()) -> str:
+        """
+        Render this registry or, given `snapshots` from several registries,
+        their combined values. `stale` snapshots (from workers that are
+        gone) still count towards counters and histograms but not gauges.
+        """
+        out: List[str] = []
+        stale = list(stale)
+        for family in self._families.values():
+            if snapshots is None:
+                merged = None
+            else:
+                sources = snapshots if family.kind == "gauge" else snapshots + stale
+                merged = family.merged([s[family.name] for s in sources if family.name in s])
+                if merged is None:
+                    continue
+            out.append(f"# HELP {family.name} {family.help}")
+            out.append(f"# TYPE {family.name} {family.kind}")
+            family.render(out, merged)
+        return "\n".join(out) + "\n"
+
+
+def _boot_id() -> str:
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMetrics:
+    """
+    Publishes this worker's Metrics to the SQLite file shared by every
+    uvicorn worker and renders the combined values, so a scrape sees the
+    whole service whichever worker answers it.
+
+    Each worker keeps one row with its latest snapshot, written every
+    `publish_interval` seconds and before each render. Rows are keyed by a
+    startup generation (counted in the database) plus a random id, so a
+    reused pid never overwrites another worker's row. Gauges only include
+    workers that published within `stale_after` seconds. Counters and
+    histograms also include workers that have exited, so totals don't drop
+    when a worker is replaced: a worker folds its final snapshot into a
+    single aggregate row when it closes, and a scrape folds stale rows whose
+    process is gone (its pid no longer exists, or it ran under another boot
+    id) the same way. The table therefore holds one row per live worker plus
+    the aggregate. Publishing and rendering block, so call them off the
+    event loop.
+    """
+
+    AGGREGATE = "exited"
+
+    def __init__(self, metrics: Metrics, path: str, publish_interval: float = 5.0,
+                 stale_after: Optional[float] = None, timeout: float = 10.0):
+        self.metrics = metrics
+        self.path = path
+        self.publish_interval = publish_interval
+        self.stale_after = stale_after if stale_after is not None else 3 * publish_interval
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.boot_id = _boot_id()
+        self.worker: Optional[str] = None
+        self.folded = 0
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+            local.conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            local.conn.execute('PRAGMA synchronous=NORMAL')
+        return local.conn
+
+    def load(self) -> None:
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS metrics_workers (worker TEXT PRIMARY KEY, pid INTEGER, '
+                     'boot_id TEXT, updated_at REAL NOT NULL, snapshot TEXT NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS metrics_generation (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                     'generation INTEGER NOT NULL)')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT INTO metrics_generation (id, generation) VALUES (0, 1) '
+                         'ON CONFLICT (id) DO UPDATE SET generation = generation + 1')
+            generation = conn.execute('SELECT generation FROM metrics_generation').fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.worker = f"{generation}-{uuid.uuid4().hex[:12]}"
+
+    def publish(self) -> None:
+        snapshot = json.dumps(self.metrics.snapshot(), separators=(',', ':'))
+        self._conn().execute('INSERT INTO metrics_workers (worker, pid, boot_id, updated_at, snapshot) '
+                             'VALUES (?, ?, ?, ?, ?) ON CONFLICT (worker) DO UPDATE SET '
+                             'updated_at = excluded.updated_at, snapshot = excluded.snapshot',
+                             (self.worker, self.pid, self.boot_id, time.time(), snapshot))
+
+    def _fold(self, conn: sqlite3.Connection, workers: List[str], snapshots: List[dict]) -> None:
+        """Add `snapshots` to the aggregate row and delete `workers`; called inside a transaction"""
+        row = conn.execute('SELECT snapshot FROM metrics_workers WHERE worker = ?', (self.AGGREGATE,)).fetchone()
+        if row is not None:
+            snapshots = [json.loads(row[0])] + snapshots
+        aggregate = json.dumps(self.metrics.combine(snapshots), separators=(',', ':'))
+        conn.execute('INSERT INTO metrics_workers (worker, pid, boot_id, updated_at, snapshot) '
+                     'VALUES (?, NULL, NULL, ?, ?) ON CONFLICT (worker) DO UPDATE SET '
+                     'updated_at = excluded.updated_at, snapshot = excluded.snapshot',
+                     (self.AGGREGATE, time.time(), aggregate))
+        conn.executemany('DELETE FROM metrics_workers WHERE worker = ?', [(w,) for w in workers])
+        self.folded += len(workers)
+
+    def _fold_exited(self, rows) -> None:
+        fresh_since = time.time() - self.stale_after
+        exited = [worker for worker, pid, boot_id, updated_at, _ in rows
+                  if worker != self.AGGREGATE and updated_at < fresh_since
+                  and (boot_id != self.boot_id or not _pid_alive(pid))]
+        if not exited:
+            return
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Re-read under the write lock: another scrape may have folded them already
+            marks = ','.join('?' * len(exited))
+            found = conn.execute(f'SELECT worker, snapshot FROM metrics_workers WHERE worker IN ({marks})',
+                                 exited).fetchall()
+            if found:
+                self._fold(conn, [w for w, _ in found], [json.loads(snapshot) for _, snapshot in found])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def render(self) -> str:
+        self.publish()
+        conn = self._conn()
+        query = 'SELECT worker, pid, boot_id, updated_at, snapshot FROM metrics_workers'
+        rows = conn.execute(query).fetchall()
+        self._fold_exited(rows)
+        rows = conn.execute(query).fetchall()
+        fresh_since = time.time() - self.stale_after
+        live, stale = [], []
+        for worker, _, _, updated_at, snapshot in rows:
+            (live if worker != self.AGGREGATE and updated_at >= fresh_since else stale).append(json.loads(snapshot))
+        return self.metrics.render(live, stale)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-publish", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.publish_interval):
+            try:
+                self.publish()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to publish metrics: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # Final counters go into the aggregate row, so this worker's totals outlive it
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._fold(conn, [self.worker], [self.metrics.snapshot()])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,312 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LinkExistsError(Exception):
+    """Raised when another worker created the same short path first"""
+
+
+class SharedLinkStore:
+    """
+    Short path -> long URL mappings in a SQLite (WAL mode) file shared by every
+    uvicorn worker on the host, with the same interface as LinkStore.
+
+    The primary key on short_path makes creates unique across processes:
+    `reserve()` only checks this worker's cache and its in-flight creates,
+    and `append()` raises LinkExistsError if another worker won the race.
+
+    Like LinkStore's index, the table is not copied into memory: lookups go
+    through a bounded LRU of `cache_size` mappings and fall back to a
+    primary-key read. Mappings never change once created, so cached hits
+    stay valid. Misses are cached too, and those are dropped whenever a
+    background thread sees `PRAGMA data_version` change (checked every
+    `refresh_interval` seconds), so another worker's create can 404 here
+    for up to one refresh interval after a lookup that missed.
+
+    `get()` reads SQLite on the calling thread; `lookup()` answers from the
+    cache on the event loop and runs misses on the store's own
+    `read_threads` threads. Every connection is opened by the store and
+    closed by `close()`; exports get a connection of their own.
+    """
+
+    def __init__(self, path: str, refresh_interval: float = 0.05, timeout: float = 10.0,
+                 cache_size: int = 10_000, read_threads: int = 4):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # Short paths reserved by this worker whose insert hasn't finished
+        self._pending = set()
+        self._cache_lock = threading.Lock()
+        self._hits: "OrderedDict[str, str]" = OrderedDict()
+        # Replaced, not cleared, on invalidation, so a read that started earlier caches into the old one
+        self._misses: "OrderedDict[str, None]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=read_threads, thread_name_prefix="link-store-read")
+        # Connection of the refresher; data_version is per connection
+        self._refresh_lock = threading.Lock()
+        self._watcher: Optional[sqlite3.Connection] = None
+        self._version = None
+        self._count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+        self.conflicts = 0
+        self.cache_hits = 0
+        self.db_reads = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Not tied to the opening thread, so close() can close connections of pool threads
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+        with self._conns_lock:
+            self._conns.append(conn)
+        return conn
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._conns_lock:
+            if conn in self._conns:
+                self._conns.remove(conn)
+        conn.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            # Autocommit; transactions are opened explicitly with BEGIN IMMEDIATE
+            local.conn = self._connect()
+            local.conn.execute('PRAGMA synchronous=NORMAL')
+        return local.conn
+
+    def refresh(self) -> bool:
+        """Forget cached misses if anything was committed since the last check; returns whether it was"""
+        with self._refresh_lock:
+            if self._watcher is None:
+                self._watcher = self._connect()
+            conn = self._watcher
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version == self._version:
+                return False
+            # Rows are never deleted, so the highest rowid is the row count
+            self._count = max(self._count, conn.execute('SELECT MAX(rowid) FROM links').fetchone()[0] or 0)
+            with self._cache_lock:
+                self._misses = OrderedDict()
+            self._version = version
+            self.refreshes += 1
+            return True
+
+    def load(self, seed=None) -> None:
+        """
+        Create the schema. If the table is empty and `seed` (an unloaded
+        LinkStore) is given, import its mappings once for all workers.
+        """
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS links (short_path TEXT PRIMARY KEY, long_url TEXT NOT NULL)')
+        if seed is not None and conn.execute('SELECT 1 FROM links LIMIT 1').fetchone() is None:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Re-check under the write lock in case another worker seeded first
+                if conn.execute('SELECT 1 FROM links LIMIT 1').fetchone() is None:
+                    seed.load()
+                    conn.executemany('INSERT OR IGNORE INTO links (short_path, long_url) VALUES (?, ?)',
+                                     seed.items())
+                    seed.close()
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            logger.info(f"Seeded shared link store {self.path}")
+        self.refresh()
+        logger.info(f"Opened shared link store {self.path} with {len(self)} mappings")
+
+    def start(self) -> None:
+        """Start the thread that notices other workers' creates; SQLite checkpoints the WAL itself"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="link-store-refresh", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to refresh shared link store: {e}")
+
+    def _remember(self, key: str, url: str) -> None:
+        with self._cache_lock:
+            self._misses.pop(key, None)
+            self._hits[key] = url
+            self._hits.move_to_end(key)
+            if len(self._hits) > self.cache_size:
+                self._hits.popitem(last=False)
+
+    def _cached(self, key: str) -> Tuple[bool, Optional[str]]:
+        """(True, url or None) if the cache knows the answer, (False, None) if SQLite has to be read"""
+        with self._cache_lock:
+            url = self._hits.get(key)
+            if url is not None:
+                self._hits.move_to_end(key)
+                self.cache_hits += 1
+                return True, url
+            if key in self._misses:
+                self.cache_hits += 1
+                return True, None
+        return False, None
+
+    def _read(self, key: str) -> Optional[str]:
+        misses = self._misses
+        row = self._conn().execute('SELECT long_url FROM links WHERE short_path = ?', (key,)).fetchone()
+        self.db_reads += 1
+        if row is not None:
+            self._remember(key, row[0])
+            return row[0]
+        with self._cache_lock:
+            misses[key] = None
+            if len(misses) > self.cache_size:
+                misses.popitem(last=False)
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        """Look `key` up, reading SQLite on this thread on a cache miss"""
+        found, url = self._cached(key)
+        if found:
+            return url
+        return self._read(key)
+
+    async def lookup(self, key: str) -> Optional[str]:
+        """Look `key` up from the event loop; cache misses are read on the store's threads"""
+        found, url = self._cached(key)
+        if found:
+            return url
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._read, key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """Yield every mapping in creation order, a page at a time, on a connection closed when the export ends"""
+        conn = self._connect()
+        try:
+            last = 0
+            while True:
+                # Pages may be read on different threadpool threads, so no cursor is held between them
+                rows = conn.execute(
+                    'SELECT rowid, short_path, long_url FROM links WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (last, page_size)).fetchall()
+                if not rows:
+                    return
+                for last, key, url in rows:
+                    yield key, url
+        finally:
+            self._release(conn)
+
+    def reserve(self, key: str, url: str) -> bool:
+        """Check that `key` is free as far as this worker knows; the insert in append() is what decides"""
+        with self._lock:
+            if key in self._pending or key in self._hits:
+                return False
+            self._pending.add(key)
+        return True
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._pending.discard(key)
+
+    def discard_many(self, keys: Iterable[str]) -> None:
+        with self._lock:
+            self._pending.difference_update(keys)
+
+    def append(self, key: str, url: str) -> None:
+        """Insert a reserved mapping (blocking); raises LinkExistsError if another worker took it"""
+        try:
+            rowid = self._conn().execute('INSERT INTO links (short_path, long_url) VALUES (?, ?)',
+                                         (key, url)).lastrowid
+        except sqlite3.IntegrityError:
+            self.conflicts += 1
+            raise LinkExistsError(key)
+        else:
+            self._remember(key, url)
+            self._count = max(self._count, rowid)
+        finally:
+            self.discard(key)
+
+    def append_many(self, items: Iterable[Tuple[str, str]]) -> List[str]:
+        """Insert many reserved mappings in one transaction; returns the short paths another worker took first"""
+        items = list(items)
+        conflicts = []
+        rowid = 0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for key, url in items:
+                cursor = conn.execute('INSERT OR IGNORE INTO links (short_path, long_url) VALUES (?, ?)',
+                                      (key, url))
+                if cursor.rowcount == 0:
+                    conflicts.append(key)
+                else:
+                    rowid = cursor.lastrowid
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            with self._lock:
+                self._pending.difference_update(key for key, _ in items)
+        taken = set(conflicts)
+        # Only the tail of a large batch is likely to be read soon
+        for key, url in items[-self.cache_size:]:
+            if key not in taken:
+                self._remember(key, url)
+        # Rows are never deleted, so this worker's newest rowid is a lower bound on the count
+        self._count = max(self._count, rowid)
+        self.conflicts += len(conflicts)
+        return conflicts
+
+    def add(self, key: str, url: str) -> bool:
+        if not self.reserve(key, url):
+            return False
+        try:
+            self.append(key, url)
+        except LinkExistsError:
+            return False
+        return True
+
+    def sync(self) -> None:
+        """Every insert is committed before it returns"""
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._executor.shutdown(wait=True)
+        with self._refresh_lock:
+            self._watcher = None
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        return {
+            "mappings": len(self),
+            "refreshes": self.refreshes,
+            "create_conflicts": self.conflicts,
+            "cache_entries": len(self._hits),
+            "cache_hits": self.cache_hits,
+            "db_reads": self.db_reads,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+
+from access_log import AccessLogger, AccessLogMiddleware, scope_url
+
+
+class Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(record.getMessage()))
+
+
+def make_logger(**kwargs):
+    handler = Collect()
+    logger = logging.getLogger(f"test_access_log.{id(handler)}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    return AccessLogger(logger, **kwargs), handler
+
+
+def scope(method="POST", path="/shorten", query=b""):
+    return {
+        "type": "http",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query,
+        "headers": [(b"host", b"testserver"), (b"user-agent", b"curl/8.0")],
+        "client": ("203.0.113.9", 1234),
+    }
+
+
+async def echo(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 201, "headers": []})
+    await send({"type": "http.response.body", "body": body})
+
+
+def call(app, request_scope, chunks):
+    messages = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(request_scope, receive, send))
+    return sent
+
+
+def test_request_body_is_capped_and_streamed_through():
+    access_log, handler = make_logger(body_limit=5)
+    observed = []
+    app = AccessLogMiddleware(echo, access_log, observer=lambda s, status, ns: observed.append(status))
+    sent = call(app, scope(), [b"abc", b"defgh"])
+
+    # The app still gets the whole body
+    assert sent[-1]["body"] == b"abcdefgh"
+    [line] = handler.lines
+    assert line["request_body"] == "abcde"
+    assert line["request_body_truncated"] is True
+    assert line["status_code"] == 201
+    assert line["client_ip"] == "203.0.113.9"
+    assert line["user_agent"] == "curl/8.0"
+    assert observed == [201]
+
+
+def test_get_bodies_are_not_captured():
+    access_log, handler = make_logger()
+    call(AccessLogMiddleware(echo, access_log), scope("GET", "/stats", b"n=5"), [b""])
+    [line] = handler.lines
+    assert "request_body" not in line
+    assert line["url"] == "http://testserver/stats?n=5"
+
+
+def test_redirect_sampling():
+    never, _ = make_logger(redirect_sample_rate=0.0)
+    assert not any(never.sample_redirect() for _ in range(100))
+    assert never.stats()["sampled_out"] == 100
+    always, _ = make_logger(redirect_sample_rate=1.0)
+    assert all(always.sample_redirect() for _ in range(100))
+
+
+def test_scope_url_keeps_the_root_path():
+    request_scope = scope("GET", "/abc")
+    request_scope["root_path"] = "/links"
+    assert scope_url(request_scope) == "http://testserver/links/abc"
+
+
+def test_timestamp_is_the_request_start():
+    access_log, handler = make_logger()
+
+    async def slow(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await echo(scope, receive, send)
+
+    before = datetime.now()
+    call(AccessLogMiddleware(slow, access_log), scope(), [b""])
+    [line] = handler.lines
+    logged = datetime.fromisoformat(line["timestamp"])
+    assert before <= logged < before + timedelta(seconds=0.04)
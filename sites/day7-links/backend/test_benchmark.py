@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmark import BACKEND_DIR, Workload, populate, summarize
+from link_store import LinkStore
+from shared_link_store import SharedLinkStore
+
+
+def test_summarize_mixed_statuses():
+    report = summarize([0.003, 0.001, 0.002], {302: 2, "error": 1, 404: 1}, elapsed=1.0)
+    assert report["statuses"] == {"302": 2, "404": 1, "error": 1}
+    assert report["throughput_rps"] == 3.0
+    assert report["latency_ms"]["p50"] == 2.0
+
+
+def test_workload_mix():
+    workload = Workload(10, create_ratio=0.2, miss_ratio=0.1, prefix="t")
+    requests = [workload.next() for _ in range(2000)]
+    creates = [r for r in requests if r[0] == "create"]
+    assert 300 < len(creates) < 500
+    assert len({json.loads(body)["short_path"] for _, _, _, body in creates}) == len(creates)
+    assert all(path.startswith(("/k", "/missing-")) for name, _, path, _ in requests if name == "redirect")
+
+
+@pytest.mark.parametrize("backend", ["local", "sqlite"])
+def test_populate(tmp_path, backend):
+    populate(str(tmp_path), 25, backend)
+    data_dir = str(tmp_path / "data")
+    if backend == "sqlite":
+        store = SharedLinkStore(os.path.join(data_dir, "links.db"))
+    else:
+        store = LinkStore(data_dir)
+    store.load()
+    assert len(store) == 25
+    assert store.get("k24") == "https://example.com/articles/24?utm_source=bench"
+    store.close()
+
+
+def test_inprocess_run(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "benchmark.py"), "--sizes", "50",
+                    "--duration", "0.3", "--concurrency", "4", "--create-ratio", "0.2", "--output", str(output)],
+                   cwd=str(tmp_path), check=True, capture_output=True)
+    [run] = json.loads(output.read_text())["runs"]
+    assert run["size"] == 50
+    assert set(run["operations"]["create"]["statuses"]) == {"200"}
+    assert set(run["operations"]["redirect"]["statuses"]) <= {"302", "404"}
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import pytest
+
+from bulk_io import iter_lines, parse_csv
+
+
+@pytest.fixture
+def links(monkeypatch, links):
+    monkeypatch.setattr(links, "ADMIN_TOKEN", "s3cret")
+    return links
+
+
+ADMIN = {"authorization": "Bearer s3cret"}
+
+
+def bulk(client, body, content_type="application/x-ndjson", headers=ADMIN):
+    return client.post("/shorten/bulk", body=body, headers={"content-type": content_type, **headers})
+
+
+def test_bulk_import_then_export(client):
+    rows = [
+        {"long_url": "https://example.com/1", "short_path": "one"},
+        {"long_url": "https://example.com/2", "short_path": "two"},
+        {"long_url": "not a url", "short_path": "three"},
+        {"long_url": "https://example.com/1", "short_path": "one"},
+    ]
+    response = bulk(client, "\n".join(json.dumps(row) for row in rows))
+    assert response.status_code == 200
+    report = response.json()
+    assert report["created"] == 2
+    assert [r["status"] for r in report["results"]] == ["created", "created", "invalid", "conflict"]
+    assert client.get("/two").headers["location"] == "https://example.com/2"
+
+    response = client.get("/export", headers=ADMIN)
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert {row["short_path"]: row["long_url"] for row in exported} == {
+        "one": "https://example.com/1", "two": "https://example.com/2"}
+
+    response = client.get("/export?format=csv", headers=ADMIN)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "two" in response.text
+
+
+def test_csv_upload(client):
+    response = bulk(client, "long_url,short_path\nhttps://example.com/c,csv-row\n", content_type="text/csv")
+    assert response.status_code == 200
+    assert response.json()["created"] == 1
+
+
+def test_admin_token_is_required(client):
+    assert client.get("/export").status_code == 401
+    assert client.get("/export", headers={"authorization": "Bearer wrong"}).status_code == 401
+    assert bulk(client, "", headers={}).status_code == 401
+
+
+def test_admin_routes_are_disabled_without_a_token(links, client, monkeypatch):
+    monkeypatch.setattr(links, "ADMIN_TOKEN", "")
+    assert client.get("/export", headers=ADMIN).status_code == 403
+    assert bulk(client, "").status_code == 403
+
+
+def test_concurrent_admin_operations_are_limited(links, client):
+    links.admin_slots.acquire()
+    try:
+        response = client.get("/export", headers=ADMIN)
+        assert response.status_code == 429
+        assert response.headers["retry-after"] == "1"
+    finally:
+        links.admin_slots.release()
+    assert client.get("/export", headers=ADMIN).status_code == 200
+    # The export's slot was given back once the stream finished
+    assert links.admin_slots.in_use == 0
+
+
+def test_failed_bulk_write_releases_every_reservation(links, client, monkeypatch):
+    def failing_append_many(items):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(links.link_store, "append_many", failing_append_many)
+    body = "\n".join(json.dumps({"long_url": f"https://example.com/{i}", "short_path": f"k{i}"}) for i in range(50))
+    assert bulk(client, body).status_code == 500
+    assert all(links.link_store.get(f"k{i}") is None for i in range(50))
+    assert all(key is None for key in links.link_store._order)
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def collect(aiter):
+    return [item async for item in aiter]
+
+
+def test_lines_split_across_chunks_and_long_lines_are_skipped():
+    body = chunks(b"one\r\ntw", b"o\n" + b"x" * 6, b"x" * 6 + b"y", b"yy\nthree", b"\nfour")
+    assert asyncio.run(collect(iter_lines(body, max_line=10))) == ["one", "two", None, "three", "four"]
+    assert asyncio.run(collect(iter_lines(chunks(b"x" * 11), max_line=10))) == [None]
+
+
+def test_csv_quoted_fields_may_span_lines():
+    lines = ['long_url,short_path', '"https://example.com/?q=a', 'b",multi', '',
+             'https://example.com/b,plain', None, '"https://example.com/open,x']
+    rows = asyncio.run(collect(parse_csv(chunks(*lines))))
+    assert rows == [
+        (1, "https://example.com/?q=a\nb", "multi", None),
+        (2, "https://example.com/b", "plain", None),
+        (3, None, None, "Row is too long"),
+        (4, None, None, "Unterminated quoted field"),
+    ]
+
+
+def test_csv_record_spanning_too_many_lines_is_rejected():
+    lines = ['"' + "a" * 8] + ["a" * 8] * 3 + ['",x', "https://example.com/,ok"]
+    rows = asyncio.run(collect(parse_csv(chunks(*lines), max_record=20)))
+    assert rows[0] == (1, None, None, "Row is too long")
+
+
+def test_oversized_ndjson_row_is_reported(links, client, monkeypatch):
+    monkeypatch.setattr(links, "BULK_MAX_ROW_BYTES", 100)
+    body = json.dumps({"long_url": "https://example.com/" + "a" * 200, "short_path": "big"}) + "\n"
+    body += json.dumps({"long_url": "https://example.com/", "short_path": "small"}) + "\n"
+    response = bulk(client, body.encode())
+    results = response.json()["results"]
+    assert results[0]["error"] == "Row is too long"
+    assert results[1]["status"] == "created"
@@ -0,0 +1,188 @@
+import json
+import os
+import time
+
+import pytest
+
+from click_stats import MAX_BREAKDOWN_KEYS, ClickStats, SharedClickStats
+
+FIREFOX = [(b"referer", b"https://news.example.org/item"), (b"user-agent", b"Mozilla/5.0 Firefox/120.0")]
+
+
+def test_counts_survive_restart(tmp_path):
+    path = str(tmp_path / "click_stats.json")
+    stats = ClickStats(path, minute_buckets=5)
+    for _ in range(3):
+        stats.record("a", FIREFOX)
+    stats.record("b", [])
+    stats.close()
+
+    reloaded = ClickStats(path, minute_buckets=5)
+    reloaded.load()
+    result = reloaded.link_stats("a")
+    assert result["clicks"] == 3
+    assert result["referrers"] == {"news.example.org": 3}
+    assert result["user_agents"] == {"firefox": 3}
+    assert [m["clicks"] for m in result["per_minute"]] == [3]
+    assert reloaded.top(1) == [{"short_path": "a", "clicks": 3}]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "links.db")
+
+
+def open_shared(db_path, **kwargs):
+    stats = SharedClickStats(db_path, **kwargs)
+    stats.load()
+    return stats
+
+
+def test_workers_add_up_in_the_shared_db(db_path):
+    workers = [open_shared(db_path, minute_buckets=5) for _ in range(3)]
+    for worker in workers:
+        worker.record("a", FIREFOX)
+        worker.record("a", [])
+        worker.flush()
+    workers[0].record("b", [])
+
+    # Reads include every worker's flushed clicks and this worker's pending ones
+    result = workers[1].link_stats("a")
+    assert result["clicks"] == 6
+    assert result["referrers"] == {"news.example.org": 3, "direct": 3}
+    assert result["user_agents"] == {"firefox": 3, "unknown": 3}
+    assert [m["clicks"] for m in result["per_minute"]] == [6]
+    assert workers[0].top(2) == [{"short_path": "a", "clicks": 6}, {"short_path": "b", "clicks": 1}]
+    for worker in workers:
+        worker.close()
+
+
+def test_breakdowns_are_capped_across_workers(db_path):
+    first, second = open_shared(db_path), open_shared(db_path)
+    for i in range(MAX_BREAKDOWN_KEYS):
+        first.record("a", [(b"referer", f"https://site{i}.example/".encode())])
+    first.flush()
+    second.record("a", [(b"referer", b"https://late.example/")])
+    second.flush()
+
+    referrers = first.link_stats("a")["referrers"]
+    assert "late.example" not in referrers
+    assert referrers["other"] == 1
+    first.close()
+    second.close()
+
+
+def test_failed_flush_keeps_the_clicks(db_path, monkeypatch):
+    stats = open_shared(db_path)
+    stats.record("a", FIREFOX)
+
+    def broken(conn, taken):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(stats, "_add", broken)
+    with pytest.raises(OSError):
+        stats.flush()
+    monkeypatch.undo()
+    stats.flush()
+    assert stats.link_stats("a")["clicks"] == 1
+    stats.close()
+
+
+def test_seeded_once_from_the_json_file(tmp_path, db_path):
+    path = str(tmp_path / "click_stats.json")
+    local = ClickStats(path)
+    local.record("a", FIREFOX)
+    local.close()
+
+    stats = SharedClickStats(db_path)
+    stats.load(seed=ClickStats(path))
+    stats.record("a", [])
+    assert stats.link_stats("a")["clicks"] == 2
+    stats.close()
+
+    again = SharedClickStats(db_path)
+    again.load(seed=ClickStats(path))
+    assert again.top() == [{"short_path": "a", "clicks": 2}]
+    again.close()
+
+
+def test_old_minutes_are_pruned(db_path, monkeypatch):
+    stats = open_shared(db_path, minute_buckets=2)
+    stats.record("a", [])
+    stats.flush()
+    later = time.time() + 600
+    monkeypatch.setattr(time, "time", lambda: later)
+    stats.record("a", [])
+    stats.flush()
+    assert [m["clicks"] for m in stats.link_stats("a")["per_minute"]] == [1]
+    stats.close()
+
+
+def test_full_queue_drops_and_counts_clicks(tmp_path):
+    stats = ClickStats(str(tmp_path / "click_stats.json"), max_pending=2)
+    for _ in range(5):
+        stats.record("a", FIREFOX + [(b"cookie", b"x" * 1000)])
+    # Only the two header values are queued, not the whole header list
+    assert list(stats._pending)[0][2:] == (b"https://news.example.org/item", b"Mozilla/5.0 Firefox/120.0")
+    assert stats.stats() == {"pending": 2, "dropped": 3}
+    assert stats.link_stats("a")["clicks"] == 2
+    stats.close()
+
+
+def test_flush_journals_only_changed_links(tmp_path):
+    path = str(tmp_path / "click_stats.json")
+    stats = ClickStats(path)
+    for key in "abcd":
+        stats.record(key, [])
+    stats.flush()
+    stats.record("a", [])
+    stats.flush()
+    assert stats.generation == 1
+    stats.record("b", [])
+    stats.flush()
+    with open(f"{path}.1.log") as f:
+        assert [json.loads(line)[:2] for line in f] == [["b", 2]]
+    stats.close()
+
+    reloaded = ClickStats(path)
+    reloaded.load()
+    assert reloaded.top(4) == [{"short_path": "a", "clicks": 2}, {"short_path": "b", "clicks": 2},
+                               {"short_path": "c", "clicks": 1}, {"short_path": "d", "clicks": 1}]
+
+
+def test_journal_is_folded_into_the_snapshot(tmp_path):
+    path = str(tmp_path / "click_stats.json")
+    stats = ClickStats(path)
+    stats.record("a", [])
+    stats.flush()
+    stats.record("a", [])
+    # The journal would outgrow the link count, so this flush writes a snapshot instead
+    stats.flush()
+    assert stats.generation == 1
+    assert not os.path.exists(f"{path}.0.log")
+    stats.record("a", [])
+    stats.close()
+
+    reloaded = ClickStats(path)
+    reloaded.load()
+    assert reloaded.generation == 1
+    assert reloaded.link_stats("a")["clicks"] == 3
+
+
+def test_journal_of_an_older_generation_is_not_replayed(tmp_path):
+    path = str(tmp_path / "click_stats.json")
+    stats = ClickStats(path)
+    stats.record("a", [])
+    stats.flush()
+    with open(f"{path}.0.log") as f:
+        journal = f.read()
+    stats.record("a", [])
+    stats.close()
+    # A crash after the snapshot was replaced but before its old journal was removed
+    with open(f"{path}.0.log", "w") as f:
+        f.write(journal)
+
+    reloaded = ClickStats(path)
+    reloaded.load()
+    assert reloaded.link_stats("a")["clicks"] == 2
+    assert not os.path.exists(f"{path}.0.log")
@@ -0,0 +1,45 @@
+import asyncio
+
+from fast_redirect import RedirectFastPath
+
+
+async def fallback(scope, receive, send):
+    await send({"type": "http.response.start", "status": 418, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def call(app, path, method="GET"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": [], "query_string": b""}
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"], dict(messages[0]["headers"])
+
+
+def test_hits_misses_and_fall_through():
+    urls = {"a": "https://example.com/a b"}
+    app = RedirectFastPath(fallback, urls.get, reserved_paths={"shorten"})
+    status, headers = call(app, "/a")
+    assert status == 302
+    assert headers[b"location"] == b"https://example.com/a%20b"
+    assert call(app, "/b")[0] == 404
+    assert call(app, "/shorten")[0] == 418
+    assert call(app, "/stats/a")[0] == 418
+    assert call(app, "/a", method="HEAD")[0] == 418
+    assert call(app, "/a", method="POST")[0] == 418
+
+
+def test_cached_starts_are_evicted_least_recently_used():
+    urls = {key: f"https://example.com/{key}" for key in "abc"}
+    app = RedirectFastPath(fallback, urls.get, cache_size=2)
+    call(app, "/a")
+    call(app, "/b")
+    call(app, "/a")
+    call(app, "/c")
+    assert list(app._starts) == ["a", "c"]
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+import pytest
+
+from io_writer import BackgroundWriter
+
+
+def test_run_returns_result_and_propagates_errors():
+    writer = BackgroundWriter()
+
+    async def main():
+        assert await writer.run(lambda a, b: a + b, 2, 3) == 5
+        with pytest.raises(ZeroDivisionError):
+            await writer.run(lambda: 1 / 0)
+
+    asyncio.run(main())
+    writer.close()
+    assert writer.completed == 1
+    assert writer.failed == 1
+
+
+def test_close_drains_queued_work():
+    writer = BackgroundWriter()
+    done = []
+    for i in range(100):
+        writer.submit_nowait(done.append, i)
+    writer.close()
+    assert done == list(range(100))
+
+
+def test_run_after_close_raises_instead_of_hanging():
+    writer = BackgroundWriter()
+    writer.close()
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(writer.run(lambda: None), 1)
+
+    asyncio.run(main())
+    assert writer.submit_nowait(lambda: None) is False
+
+
+def test_run_that_passed_the_closed_check_before_close_still_resolves():
+    writer = BackgroundWriter()
+    writer.close()
+    # As if run() had checked `_closed` just before close() flipped it
+    writer._closed = False
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(writer.run(lambda: None), 1)
+
+    asyncio.run(main())
+
+
+def test_submit_nowait_drops_when_full():
+    writer = BackgroundWriter(max_queue=1)
+    gate = threading.Event()
+    writer.submit_nowait(gate.wait)
+    while writer.qsize():
+        pass
+    assert writer.submit_nowait(lambda: None)
+    assert writer.submit_nowait(lambda: None) is False
+    assert writer.dropped == 1
+    gate.set()
+    writer.close()
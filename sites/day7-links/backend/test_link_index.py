@@ -0,0 +1,49 @@
+import pytest
+
+from link_index import MappedIndex, merge_sorted, write_index
+
+
+def build(path, items):
+    entries = sorted((k.encode("utf-8"), u.encode("utf-8")) for k, u in items.items())
+    write_index(str(path), iter(entries), len(entries))
+    return MappedIndex(str(path))
+
+
+def test_lookups(tmp_path):
+    items = {f"k{i}": f"https://example.com/{i}" for i in range(1000)}
+    items["ünïcode"] = "https://example.com/ü"
+    index = build(tmp_path / "links.idx", items)
+    assert len(index) == 1001
+    for key in ("k0", "k999", "k500", "ünïcode"):
+        assert index.lookup(key) == items[key]
+    assert index.lookup("k1000") is None
+    assert index.lookup("") is None
+    assert "k7" in index and "missing" not in index
+    assert dict(index.items()) == items
+
+
+def test_empty_index(tmp_path):
+    index = build(tmp_path / "links.idx", {})
+    assert len(index) == 0
+    assert index.lookup("a") is None
+
+
+def test_merge_keeps_key_order(tmp_path):
+    index = build(tmp_path / "links.idx", {"b": "B", "d": "D"})
+    merged = list(merge_sorted(index, [("c", "C"), ("a", "A"), ("e", "E")]))
+    assert [k for k, _ in merged] == [b"a", b"b", b"c", b"d", b"e"]
+    assert list(merge_sorted(None, [("z", "Z")])) == [(b"z", b"Z")]
+
+
+def test_count_mismatch_leaves_no_file(tmp_path):
+    path = tmp_path / "links.idx"
+    with pytest.raises(ValueError):
+        write_index(str(path), iter([(b"a", b"A")]), 2)
+    assert not path.exists()
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "links.idx"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        MappedIndex(str(path))
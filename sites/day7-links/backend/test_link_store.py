@@ -0,0 +1,291 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from link_store import LinkStore
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return str(tmp_path / "data")
+
+
+def open_store(data_dir, **kwargs):
+    store = LinkStore(data_dir, **kwargs)
+    store.load()
+    return store
+
+
+def test_mappings_survive_restart_and_compaction(data_dir):
+    store = open_store(data_dir)
+    assert store.add("a", "https://example.com/a")
+    assert store.add("b", "https://example.com/b")
+    assert not store.add("a", "https://example.com/other")
+    store.compact()
+    assert store.add("c", "https://example.com/c")
+    store.close()
+
+    store = open_store(data_dir)
+    assert len(store) == 3
+    assert store.get("a") == "https://example.com/a"
+    assert store.get("c") == "https://example.com/c"
+    assert dict(store.items()) == {
+        "a": "https://example.com/a", "b": "https://example.com/b", "c": "https://example.com/c"}
+    store.close()
+
+
+def test_restart_reuses_the_newest_log(data_dir):
+    for i in range(3):
+        store = open_store(data_dir)
+        store.add(f"k{i}", "https://example.com/")
+        store.close()
+    logs = [name for name in os.listdir(data_dir) if name.startswith("url_mappings.log.")]
+    assert logs == ["url_mappings.log.0"]
+
+
+def test_torn_record_is_skipped_and_next_append_starts_a_new_line(data_dir):
+    store = open_store(data_dir)
+    store.add("a", "https://example.com/a")
+    store.close()
+    with open(os.path.join(data_dir, "url_mappings.log.0"), "a") as f:
+        f.write('["torn","https://exa')
+
+    store = open_store(data_dir)
+    assert store.get("torn") is None
+    store.add("b", "https://example.com/b")
+    store.close()
+    store = open_store(data_dir)
+    assert store.get("b") == "https://example.com/b"
+    store.close()
+
+
+def test_compaction_keeps_pending_reservations_out_of_the_index(data_dir):
+    store = open_store(data_dir)
+    assert store.reserve("pending", "https://example.com/p")
+    store.add("done", "https://example.com/d")
+    store.compact()
+    assert "pending" not in store.index
+    assert "done" in store.index
+    # Still claimed, but not served until its append succeeds
+    assert store.get("pending") is None
+    assert not store.reserve("pending", "https://example.com/other")
+    store.discard("pending")
+    store.close()
+
+    store = open_store(data_dir)
+    assert store.get("pending") is None
+    assert store.get("done") == "https://example.com/d"
+    store.close()
+
+
+def test_failed_batch_append_is_not_resurrected(data_dir, monkeypatch):
+    store = open_store(data_dir)
+    items = [("x", "https://example.com/x"), ("y", "https://example.com/y")]
+    for key, url in items:
+        assert store.reserve(key, url)
+
+    def failing_fsync(fd):
+        raise OSError("disk gone")
+
+    # The records reach the log, then the batch fsync fails
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        store.append_many(items)
+    monkeypatch.undo()
+    for key, _ in items:
+        store.discard(key)
+
+    store.compact()
+    assert store.get("x") is None
+    store.close()
+    store = open_store(data_dir)
+    assert store.get("x") is None and store.get("y") is None
+    # The path is free to be created again
+    assert store.add("x", "https://example.com/again")
+    store.close()
+    store = open_store(data_dir)
+    assert store.get("x") == "https://example.com/again"
+    store.close()
+
+
+def test_records_of_an_in_flight_batch_are_carried_over_by_compaction(data_dir, monkeypatch):
+    store = open_store(data_dir)
+    items = [("x", "https://example.com/x")]
+    store.reserve("x", "https://example.com/x")
+
+    real_fsync = os.fsync
+
+    def compact_mid_batch(fd):
+        # Compaction runs between the batch's write and its fsync
+        monkeypatch.setattr(os, "fsync", real_fsync)
+        store.compact()
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", compact_mid_batch)
+    store.append_many(items)
+    assert "x" not in store.index
+    store.close()
+
+    store = open_store(data_dir)
+    assert store.get("x") == "https://example.com/x"
+    store.close()
+
+
+def test_discard_many_releases_only_the_given_reservations(data_dir):
+    store = open_store(data_dir)
+    for i in range(10):
+        store.reserve(f"k{i}", f"https://example.com/{i}")
+    store.discard_many(f"k{i}" for i in range(0, 10, 2))
+    # Released paths can be reserved again, the others are still claimed
+    assert store.reserve("k0", "https://example.com/new")
+    assert not store.reserve("k1", "https://example.com/new")
+    store.close()
+
+
+def test_reservations_are_served_only_after_their_append(data_dir):
+    store = open_store(data_dir)
+    assert store.reserve("a", "https://example.com/a")
+    assert store.get("a") is None and list(store.items()) == [] and len(store) == 0
+    store.append("a", "https://example.com/a")
+    assert store.get("a") == "https://example.com/a"
+    assert list(store.items()) == [("a", "https://example.com/a")]
+
+    store.reserve("b", "https://example.com/b")
+    real_fsync = os.fsync
+    seen = []
+
+    def checking_fsync(fd):
+        seen.append(store.get("b"))
+        real_fsync(fd)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(os, "fsync", checking_fsync)
+        store.append_many([("b", "https://example.com/b")])
+    # A batch becomes visible once its fsync has succeeded
+    assert seen == [None]
+    assert store.get("b") == "https://example.com/b"
+    store.close()
+
+
+def test_appends_do_not_hold_the_reservation_lock(data_dir):
+    store = open_store(data_dir)
+    held = []
+
+    class CheckingFile:
+        def __init__(self, f):
+            self._f = f
+
+        def write(self, data):
+            held.append(store._lock.locked())
+            return self._f.write(data)
+
+        def __getattr__(self, name):
+            return getattr(self._f, name)
+
+    store._log_file = CheckingFile(store._log_file)
+    store.reserve("a", "https://example.com/a")
+    store.append("a", "https://example.com/a")
+    store.reserve("b", "https://example.com/b")
+    store.append_many([("b", "https://example.com/b")])
+    assert held == [False, False]
+    store.close()
+
+
+def test_failed_keys_are_forgotten_once_compacted(data_dir, monkeypatch):
+    store = open_store(data_dir)
+    store.reserve("x", "https://example.com/x")
+
+    def failing_fsync(fd):
+        raise OSError("disk gone")
+
+    monkeypatch.setattr(os, "fsync", failing_fsync)
+    with pytest.raises(OSError):
+        store.append_many([("x", "https://example.com/x")])
+    monkeypatch.undo()
+    store.discard("x")
+    assert list(store._failed) == ["x"]
+    store.compact()
+    assert store._failed == {}
+    assert store.get("x") is None
+    store.close()
+
+
+def test_hot_cache_evicts_least_recently_used(data_dir):
+    store = open_store(data_dir, hot_cache_size=2)
+    for key in "abc":
+        store.add(key, f"https://example.com/{key}")
+    store.compact()
+    store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    assert list(store._hot) == ["a", "c"]
+    store.close()
+
+
+def test_compaction_does_not_fsync_while_holding_the_lock(data_dir, monkeypatch):
+    store = open_store(data_dir)
+    store.add("a", "https://example.com/a")
+    real_fsync = os.fsync
+    held = []
+
+    def checking_fsync(fd):
+        held.append(store._lock.locked())
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", checking_fsync)
+    store.compact()
+    monkeypatch.undo()
+    assert held and not any(held)
+    assert store.get("a") == "https://example.com/a"
+    store.close()
+
+
+def test_json_snapshot_is_migrated_to_an_index(data_dir):
+    os.makedirs(data_dir)
+    with open(os.path.join(data_dir, "url_mappings.json"), "w") as f:
+        json.dump({"b": "https://example.com/b", "a": "https://example.com/a"}, f, indent=2)
+
+    store = open_store(data_dir)
+    assert len(store.index) == 2
+    assert store.get("a") == "https://example.com/a"
+    assert not os.path.exists(os.path.join(data_dir, "url_mappings.json"))
+    assert os.path.exists(os.path.join(data_dir, "url_mappings.json.migrated"))
+    store.close()
+
+
+def test_background_thread_group_fsyncs_and_compacts(data_dir):
+    synced = threading.Event()
+    store = open_store(data_dir, fsync_interval=0.01, compact_threshold=5, on_sync=lambda seconds: synced.set())
+    store.start()
+    for i in range(5):
+        store.add(f"k{i}", f"https://example.com/{i}")
+    assert synced.wait(5)
+    deadline = time.monotonic() + 5
+    while store.stats()["indexed"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.stats()["indexed"] == 5 and store.stats()["recent"] == 0
+    store.close()
+
+
+def test_logs_left_by_an_interrupted_compaction_replay_harmlessly(data_dir):
+    store = open_store(data_dir)
+    store.add("a", "https://example.com/a")
+    store.close()
+    # Keep a copy of the log, as if compaction crashed before removing it
+    log = os.path.join(data_dir, "url_mappings.log.0")
+    with open(log) as f:
+        record = f.read()
+    store = open_store(data_dir)
+    store.compact()
+    store.close()
+    with open(log, "w") as f:
+        f.write(record)
+
+    store = open_store(data_dir)
+    assert len(store) == 1 and store.stats()["recent"] == 0
+    assert store.get("a") == "https://example.com/a"
+    store.close()
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+
+
+def shorten(client, short_path, long_url="https://example.com/page"):
+    return client.post("/shorten", body=json.dumps({"long_url": long_url, "short_path": short_path}),
+                       headers={"content-type": "application/json"})
+
+
+@pytest.mark.parametrize("store_backend", ["local", "sqlite"])
+def test_create_then_redirect(client):
+    response = shorten(client, "guide", "https://example.com/docs?a=1")
+    assert response.status_code == 200
+    assert response.json()["long_url"] == "https://example.com/docs?a=1"
+
+    response = client.get("/guide")
+    assert response.status_code == 302
+    assert response.headers["location"] == "https://example.com/docs?a=1"
+
+
+def test_duplicate_and_invalid_short_paths(client):
+    assert shorten(client, "taken").status_code == 200
+    assert shorten(client, "taken").status_code == 409
+    assert shorten(client, "bad path!").status_code == 400
+    # Names of the service's own routes can never redirect
+    assert shorten(client, "shorten").status_code == 409
+
+
+def test_unknown_short_path_is_404(client):
+    response = client.get("/nope")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Short URL path 'nope' not found"}
+
+
+def test_created_links_survive_restart(links, client, tmp_path):
+    assert shorten(client, "keep", "https://example.com/keep").status_code == 200
+    links.io_writer.close()
+    links.link_store.close()
+
+    from link_store import LinkStore
+    store = LinkStore(str(tmp_path / "data"))
+    store.load()
+    assert store.get("keep") == "https://example.com/keep"
+    store.close()
+
+
+def test_redirects_carry_cors_headers(client):
+    shorten(client, "cors", "https://example.com/cors")
+    origin = {"origin": "http://localhost:4200"}
+    hit = client.get("/cors", headers=origin)
+    assert hit.status_code == 302
+    assert hit.headers["access-control-allow-origin"] == "http://localhost:4200"
+    miss = client.get("/missing", headers=origin)
+    assert miss.status_code == 404
+    assert miss.headers["access-control-allow-origin"] == "http://localhost:4200"
+    # Other origins get nothing, as on the API routes
+    assert "access-control-allow-origin" not in client.get("/cors", headers={"origin": "https://evil.test"}).headers
+
+
+def test_head_on_a_short_path_is_not_allowed(client):
+    shorten(client, "head", "https://example.com/head")
+    assert client.request("HEAD", "/head").status_code == 405
+
+
+@pytest.mark.parametrize("store_backend", ["local", "sqlite"])
+def test_stats_counts_redirects(client):
+    shorten(client, "popular", "https://example.com/popular")
+    shorten(client, "quiet", "https://example.com/quiet")
+    for _ in range(3):
+        client.get("/popular", headers={"referer": "https://news.example.org/item", "user-agent": "Mozilla/5.0 Firefox/120.0"})
+    client.get("/quiet")
+
+    response = client.get("/stats?n=1")
+    assert response.status_code == 200
+    assert response.json() == {"top": [{"short_path": "popular", "clicks": 3}]}
+
+    response = client.get("/stats/popular")
+    assert response.status_code == 200
+    assert response.json()["clicks"] == 3
+    assert response.json()["referrers"] == {"news.example.org": 3}
+    assert response.json()["user_agents"] == {"firefox": 3}
+    assert client.get("/stats/unknown").status_code == 404
+
+
+def test_fixed_routes_are_not_shadowed_by_short_paths(links, client):
+    for route in links.api.routes:
+        if "{" in route.path or "GET" not in getattr(route, "methods", ()):
+            continue
+        response = client.get(route.path)
+        assert not (response.status_code == 404 and b"Short URL path" in response.body), route.path
+
+
+@pytest.mark.parametrize("store_backend", ["local", "sqlite"])
+def test_metrics_endpoint_reports_requests(client):
+    shorten(client, "measured", "https://example.com/measured")
+    client.get("/measured")
+    client.get("/unmeasured")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# TYPE links_request_duration_seconds histogram" in text
+    assert 'links_responses_total{route="/shorten",status="200"} 1' in text
+    assert 'links_responses_total{route="/{short_path}",status="302"} 1' in text
+    assert 'links_redirects_total{result="hit"} 1' in text
+    assert 'links_redirects_total{result="miss"} 1' in text
+    assert 'links_request_duration_seconds_count{route="/{short_path}",method="GET"} 2' in text
+    assert "links_mappings 1" in text
+    assert "links_writer_queue_depth" in text
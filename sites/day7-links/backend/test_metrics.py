@@ -0,0 +1,123 @@
+import sqlite3
+import time
+
+import pytest
+
+from metrics import Metrics, SharedMetrics
+
+
+def registry(queue_depth=0, mappings=0):
+    metrics = Metrics()
+    metrics.counter("requests_total", "Requests", ("status",))
+    metrics.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    metrics.gauge_callback("queue_depth", "Queue depth", lambda: queue_depth)
+    metrics.gauge_callback("mappings", "Mappings", lambda: mappings, aggregate="max")
+    return metrics
+
+
+def test_render_in_text_format():
+    metrics = registry(queue_depth=3)
+    metrics._families["requests_total"].inc("200", amount=2)
+    metrics._families["latency_seconds"].observe(0.05)
+    metrics._families["latency_seconds"].observe(0.5)
+    text = metrics.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{status="200"} 2' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert "queue_depth 3" in text
+
+
+def test_duplicate_names_are_rejected():
+    metrics = registry()
+    with pytest.raises(ValueError):
+        metrics.counter("requests_total", "Again")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "links.db")
+
+
+def worker(db_path, **kwargs):
+    metrics = registry(**kwargs)
+    shared = SharedMetrics(metrics, db_path)
+    shared.load()
+    return metrics, shared
+
+
+def rows(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(worker for worker, in conn.execute("SELECT worker FROM metrics_workers"))
+
+
+def test_scrape_sums_every_worker(db_path):
+    first, first_shared = worker(db_path, queue_depth=2, mappings=10)
+    second, second_shared = worker(db_path, queue_depth=5, mappings=10)
+    first._families["requests_total"].inc("200")
+    second._families["requests_total"].inc("200", amount=3)
+    second._families["requests_total"].inc("404")
+    second._families["latency_seconds"].observe(0.5)
+    second_shared.publish()
+
+    text = first_shared.render()
+    assert 'requests_total{status="200"} 4' in text
+    assert 'requests_total{status="404"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    assert "queue_depth 7" in text
+    assert "mappings 10" in text
+    first_shared.close()
+    second_shared.close()
+
+
+def test_exited_workers_keep_counters_but_not_gauges(db_path, monkeypatch):
+    first, first_shared = worker(db_path, queue_depth=2)
+    gone, gone_shared = worker(db_path, queue_depth=5)
+    gone._families["requests_total"].inc("200", amount=3)
+    gone_shared.close()
+
+    later = time.time() + 60
+    monkeypatch.setattr(time, "time", lambda: later)
+    text = first_shared.render()
+    assert 'requests_total{status="200"} 3' in text
+    assert "queue_depth 2" in text
+    # The exited worker's row was folded into the aggregate
+    assert rows(db_path) == sorted([SharedMetrics.AGGREGATE, first_shared.worker])
+    first_shared.close()
+
+
+def test_reused_pids_get_their_own_rows(db_path):
+    first, first_shared = worker(db_path)
+    second, second_shared = worker(db_path)
+    assert first_shared.pid == second_shared.pid
+    assert first_shared.worker != second_shared.worker
+    first._families["requests_total"].inc("200")
+    second._families["requests_total"].inc("200", amount=2)
+    first_shared.publish()
+    assert 'requests_total{status="200"} 3' in second_shared.render()
+    first_shared.close()
+    second_shared.close()
+
+
+def test_rows_of_dead_workers_are_folded(db_path, monkeypatch):
+    first, first_shared = worker(db_path)
+    crashed, crashed_shared = worker(db_path)
+    crashed._families["requests_total"].inc("200", amount=4)
+    crashed._families["latency_seconds"].observe(0.5)
+    crashed_shared.boot_id = "an earlier boot"
+    crashed_shared.publish()
+    # Still fresh: counted as a live worker
+    assert 'requests_total{status="200"} 4' in first_shared.render()
+    assert rows(db_path) == sorted([first_shared.worker, crashed_shared.worker])
+
+    later = time.time() + 60
+    monkeypatch.setattr(time, "time", lambda: later)
+    first._families["requests_total"].inc("200")
+    text = first_shared.render()
+    assert rows(db_path) == sorted([SharedMetrics.AGGREGATE, first_shared.worker])
+    assert 'requests_total{status="200"} 5' in text
+    assert 'latency_seconds_bucket{le="1.0"} 1' in text
+    # Folding twice doesn't double count
+    assert 'requests_total{status="200"} 5' in first_shared.render()
+    first_shared.close()
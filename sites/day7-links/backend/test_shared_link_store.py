@@ -0,0 +1,137 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from link_store import LinkStore
+from shared_link_store import LinkExistsError, SharedLinkStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "links.db")
+
+
+def open_store(db_path, **kwargs):
+    store = SharedLinkStore(db_path, **kwargs)
+    store.load()
+    return store
+
+
+def test_creates_are_unique_across_workers(db_path):
+    first, second = open_store(db_path), open_store(db_path)
+    assert first.reserve("same", "https://example.com/a")
+    assert second.reserve("same", "https://example.com/b")
+    first.append("same", "https://example.com/a")
+    with pytest.raises(LinkExistsError):
+        second.append("same", "https://example.com/b")
+    assert second.stats()["create_conflicts"] == 1
+    first.close()
+    second.close()
+
+
+def test_cached_lookups_never_query_sqlite(db_path, monkeypatch):
+    store = open_store(db_path)
+    store.add("known", "https://example.com/known")
+    assert store.get("missing") is None
+
+    def fail(*args, **kwargs):
+        raise AssertionError("SQLite used on the lookup path")
+
+    monkeypatch.setattr(store, "_conn", fail)
+    monkeypatch.setattr(store, "refresh", fail)
+    assert store.get("known") == "https://example.com/known"
+    assert store.get("missing") is None
+    assert asyncio.run(store.lookup("known")) == "https://example.com/known"
+    assert not store.reserve("known", "https://example.com/other")
+    assert store.reserve("fresh", "https://example.com/fresh")
+    store.discard("fresh")
+    monkeypatch.undo()
+    store.close()
+
+
+def test_cache_is_bounded_and_misses_read_sqlite(db_path):
+    store = open_store(db_path, cache_size=2)
+    store.append_many([(f"k{i}", f"https://example.com/{i}") for i in range(5)])
+    assert list(store._hits) == ["k3", "k4"]
+    assert asyncio.run(store.lookup("k0")) == "https://example.com/0"
+    assert list(store._hits) == ["k4", "k0"]
+    assert store.stats()["db_reads"] == 1
+    store.refresh()
+    assert len(store) == 5
+    store.close()
+
+
+def test_refresh_forgets_cached_misses_after_other_workers_create(db_path):
+    reader, writer = open_store(db_path), open_store(db_path)
+    assert reader.get("a") is None
+    writer.append_many([("a", "https://example.com/a"), ("b", "https://example.com/b")])
+    # The miss is cached until the reader notices the commit
+    assert reader.get("a") is None
+    assert reader.refresh()
+    assert reader.get("a") == "https://example.com/a"
+    assert len(reader) == 2
+    # Nothing committed since: the refresh is one pragma
+    assert not reader.refresh()
+    reader.close()
+    writer.close()
+
+
+def test_close_closes_every_connection(db_path):
+    store = open_store(db_path)
+    store.add("a", "https://example.com/a")
+    exporting = store.items()
+    assert next(exporting) == ("a", "https://example.com/a")
+    asyncio.run(store.lookup("missing"))
+    conns = list(store._conns)
+    # Main thread, watcher, reader thread and the export
+    assert len(conns) == 4
+    exporting.close()
+    assert len(store._conns) == 3
+    store.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+
+
+def test_background_refresh(db_path):
+    reader, writer = open_store(db_path, refresh_interval=0.01), open_store(db_path)
+    reader.start()
+    writer.add("later", "https://example.com/later")
+    deadline = time.monotonic() + 2
+    while reader.get("later") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reader.get("later") == "https://example.com/later"
+    reader.close()
+    writer.close()
+
+
+def test_batch_conflicts_are_reported_and_the_rest_are_visible(db_path):
+    first, second = open_store(db_path), open_store(db_path)
+    first.add("taken", "https://example.com/first")
+    assert second.append_many([("taken", "https://example.com/x"), ("free", "https://example.com/free")]) == ["taken"]
+    assert second.get("free") == "https://example.com/free"
+    first.close()
+    second.close()
+
+
+def test_seeded_once_from_local_store(tmp_path, db_path):
+    data_dir = str(tmp_path / "data")
+    local = LinkStore(data_dir)
+    local.load()
+    local.add("old", "https://example.com/old")
+    local.close()
+
+    store = SharedLinkStore(db_path)
+    store.load(seed=LinkStore(data_dir))
+    assert store.get("old") == "https://example.com/old"
+    store.close()
+
+    logs = sorted(p.name for p in (tmp_path / "data").iterdir())
+    # Later starts neither re-import nor open the local store again
+    again = SharedLinkStore(db_path)
+    again.load(seed=LinkStore(data_dir))
+    assert len(again) == 1
+    assert sorted(p.name for p in (tmp_path / "data").iterdir()) == logs
+    again.close()